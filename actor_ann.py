@@ -0,0 +1,366 @@
+"""
+Índices de búsqueda aproximada (ANN) para galerías de actores muy grandes
+"""
+
+import os
+import time
+import logging
+import numpy as np
+from utils import log_print
+from actor_gallery import ENCODING_SIZE, encoding_distances
+
+# Dependencia opcional para el backend HNSW
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+ANN_BACKENDS = ("brute", "ivf", "hnsw")
+
+# Parámetros predeterminados
+DEFAULT_NPROBE = 8
+DEFAULT_KMEANS_ITERATIONS = 10
+DEFAULT_HNSW_M = 16
+DEFAULT_HNSW_EF_CONSTRUCTION = 200
+DEFAULT_HNSW_EF = 64
+
+class BruteForceIndex:
+    """Búsqueda exacta contra todos los encodings (referencia para el benchmark)"""
+
+    backend = "brute"
+
+    def __init__(self, encodings):
+        self.encodings = encodings
+        self.rows = len(encodings)
+
+    def search(self, queries, k=1):
+        """
+        Busca los k encodings más cercanos a cada consulta
+
+        Args:
+            queries: Matriz F x 128 de encodings
+            k: Número de vecinos por consulta
+
+        Returns:
+            (filas, distancias), matrices F x k; las filas sin vecino valen -1
+        """
+        distances = encoding_distances(queries, self.encodings)
+        k_eff = min(k, self.rows)
+        rows = np.argsort(distances, axis=1)[:, :k_eff]
+        return _pad_results(rows, np.take_along_axis(distances, rows, axis=1), k)
+
+class IVFIndex:
+    """
+    Índice de ficheros invertidos (IVF) implementado solo con NumPy
+
+    Los encodings se reparten en listas mediante k-means; cada consulta solo
+    se compara con los encodings de las nprobe listas más cercanas.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, encodings, centroids, order, offsets, nprobe=DEFAULT_NPROBE):
+        self.encodings = encodings
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self.rows = len(encodings)
+
+    @classmethod
+    def build(cls, encodings, n_lists=None, iterations=DEFAULT_KMEANS_ITERATIONS, nprobe=DEFAULT_NPROBE, seed=0):
+        """
+        Construye el índice agrupando los encodings con k-means
+
+        Args:
+            encodings: Matriz N x 128 de la galería
+            n_lists: Número de listas (por defecto raíz cuadrada de N)
+            iterations: Iteraciones de k-means
+            nprobe: Listas revisadas por consulta
+            seed: Semilla para que el índice sea reproducible
+
+        Returns:
+            Instancia de IVFIndex
+        """
+        data = np.asarray(encodings, dtype=np.float32)
+        n_lists = max(1, min(len(data), n_lists or int(np.sqrt(len(data)))))
+
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = encoding_distances(data, centroids).argmin(axis=1)
+            for list_id in range(n_lists):
+                members = data[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+
+        assignment = encoding_distances(data, centroids).argmin(axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]).astype(np.int64)
+
+        return cls(encodings, centroids, order, offsets, nprobe)
+
+    def search(self, queries, k=1, nprobe=None):
+        """
+        Busca los k encodings más cercanos a cada consulta (aproximado)
+
+        Args:
+            queries: Matriz F x 128 de encodings
+            k: Número de vecinos por consulta
+            nprobe: Listas revisadas por consulta (por defecto la del índice)
+
+        Returns:
+            (filas, distancias), matrices F x k; las filas sin vecino valen -1
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+
+        centroid_distances = encoding_distances(queries, self.centroids)
+        probes = np.argsort(centroid_distances, axis=1)[:, :nprobe]
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+            if not len(candidates):
+                continue
+
+            candidate_distances = encoding_distances(queries[i:i + 1], self.encodings[candidates])[0]
+            best = np.argsort(candidate_distances)[:k]
+            rows[i, :len(best)] = candidates[best]
+            distances[i, :len(best)] = candidate_distances[best]
+
+        return rows, distances
+
+    def save(self, index_file):
+        """Guarda el índice (centroides y listas) en un archivo .npz"""
+        with open(index_file, 'wb') as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                     rows=np.int64(self.rows), nprobe=np.int64(self.nprobe))
+
+    @classmethod
+    def load(cls, index_file, encodings):
+        """Carga un índice guardado con save sobre la matriz de la galería"""
+        with np.load(index_file) as data:
+            if int(data["rows"]) != len(encodings):
+                return None
+            return cls(encodings, data["centroids"], data["order"], data["offsets"], int(data["nprobe"]))
+
+class HNSWIndex:
+    """Índice de grafo HNSW (requiere hnswlib)"""
+
+    backend = "hnsw"
+
+    def __init__(self, index, rows, ef=DEFAULT_HNSW_EF):
+        self.index = index
+        self.rows = rows
+        self.ef = ef
+        index.set_ef(ef)
+
+    @classmethod
+    def build(cls, encodings, m=DEFAULT_HNSW_M, ef_construction=DEFAULT_HNSW_EF_CONSTRUCTION, ef=DEFAULT_HNSW_EF):
+        """
+        Construye el grafo HNSW de la galería
+
+        Args:
+            encodings: Matriz N x 128 de la galería
+            m: Conexiones por nodo
+            ef_construction: Amplitud de búsqueda al construir
+            ef: Amplitud de búsqueda al consultar
+
+        Returns:
+            Instancia de HNSWIndex
+        """
+        index = hnswlib.Index(space="l2", dim=ENCODING_SIZE)
+        index.init_index(max_elements=max(1, len(encodings)), ef_construction=ef_construction, M=m, random_seed=0)
+        index.add_items(np.asarray(encodings, dtype=np.float32), np.arange(len(encodings)))
+        return cls(index, len(encodings), ef)
+
+    def search(self, queries, k=1, ef=None):
+        """
+        Busca los k encodings más cercanos a cada consulta (aproximado)
+
+        Args:
+            queries: Matriz F x 128 de encodings
+            k: Número de vecinos por consulta
+            ef: Amplitud de búsqueda (por defecto la del índice)
+
+        Returns:
+            (filas, distancias), matrices F x k; las filas sin vecino valen -1
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        k_eff = min(k, self.rows)
+        if ef is not None:
+            self.index.set_ef(max(ef, k_eff))
+
+        labels, squared = self.index.knn_query(queries, k=k_eff)
+
+        if ef is not None:
+            self.index.set_ef(self.ef)
+
+        # hnswlib devuelve distancias euclídeas al cuadrado
+        return _pad_results(labels.astype(np.int64), np.sqrt(np.maximum(squared, 0.0)), k)
+
+    def save(self, index_file):
+        """Guarda el grafo en un archivo binario de hnswlib"""
+        self.index.save_index(index_file)
+
+    @classmethod
+    def load(cls, index_file, encodings):
+        """Carga un grafo guardado con save"""
+        index = hnswlib.Index(space="l2", dim=ENCODING_SIZE)
+        index.load_index(index_file, max_elements=max(1, len(encodings)))
+        if index.get_current_count() != len(encodings):
+            return None
+        return cls(index, len(encodings))
+
+def _pad_results(rows, distances, k):
+    """Completa con -1/inf los resultados cuando hay menos de k encodings"""
+    if rows.shape[1] == k:
+        return rows, distances.astype(np.float32)
+
+    padded_rows = np.full((len(rows), k), -1, dtype=np.int64)
+    padded_distances = np.full((len(rows), k), np.inf, dtype=np.float32)
+    padded_rows[:, :rows.shape[1]] = rows
+    padded_distances[:, :rows.shape[1]] = distances
+    return padded_rows, padded_distances
+
+def get_index_file(gallery_file, backend):
+    """Devuelve la ruta del índice ANN asociado a una galería"""
+    return os.path.splitext(gallery_file)[0] + f".{backend}.idx"
+
+def build_ann_index(gallery, backend, gallery_file=None):
+    """
+    Construye (y opcionalmente guarda) el índice ANN de una galería
+
+    Args:
+        gallery: Galería de actores (ver actor_gallery.build_gallery)
+        backend: "ivf", "hnsw" o "brute"
+        gallery_file: Ruta de la galería; si se indica, el índice se guarda junto a ella
+
+    Returns:
+        Índice construido o None si el backend no está disponible
+    """
+    encodings = gallery["encodings"] if gallery else None
+    if encodings is None or not len(encodings):
+        return None
+
+    if backend == "brute":
+        return BruteForceIndex(encodings)
+
+    if backend == "hnsw" and not HNSWLIB_AVAILABLE:
+        log_print("hnswlib no disponible. No se puede crear el índice HNSW.", logging.WARNING)
+        return None
+
+    if backend not in ANN_BACKENDS:
+        log_print(f"Tipo de índice desconocido: {backend}", logging.ERROR)
+        return None
+
+    start = time.time()
+    index = IVFIndex.build(encodings) if backend == "ivf" else HNSWIndex.build(encodings)
+    log_print(f"Índice {backend} creado para {len(encodings)} encodings en {time.time() - start:.2f}s")
+
+    if gallery_file:
+        try:
+            index_file = get_index_file(gallery_file, backend)
+            index.save(index_file + ".tmp")
+            os.replace(index_file + ".tmp", index_file)
+        except Exception as e:
+            log_print(f"Error guardando índice {backend}: {e}", logging.ERROR)
+
+    return index
+
+def load_ann_index(gallery, backend, gallery_file):
+    """
+    Carga el índice ANN guardado junto a una galería
+
+    Args:
+        gallery: Galería de actores ya cargada
+        backend: "ivf", "hnsw" o "brute" (sin índice)
+        gallery_file: Ruta de la galería
+
+    Returns:
+        Índice cargado o None si no existe, no coincide con la galería o es "brute"
+    """
+    if backend in (None, "brute") or not gallery:
+        return None
+
+    if backend == "hnsw" and not HNSWLIB_AVAILABLE:
+        log_print("hnswlib no disponible. Se usará la búsqueda exacta.", logging.WARNING)
+        return None
+
+    index_file = get_index_file(gallery_file, backend)
+    if not os.path.exists(index_file):
+        log_print(f"No existe el índice {backend} de la galería. Se usará la búsqueda exacta.", logging.WARNING)
+        return None
+
+    try:
+        loader = IVFIndex if backend == "ivf" else HNSWIndex
+        index = loader.load(index_file, gallery["encodings"])
+        if index is None:
+            log_print(f"El índice {backend} no corresponde a la galería actual. Regenéralo.", logging.WARNING)
+        return index
+    except Exception as e:
+        log_print(f"Error cargando índice {backend}: {e}", logging.ERROR)
+        return None
+
+def benchmark_ann(gallery, backend, n_queries=500, noise=0.03, settings=None, seed=0):
+    """
+    Compara un índice ANN con la búsqueda exacta (recall@1 y tiempo por consulta)
+
+    Las consultas son encodings de la galería con ruido gaussiano, para
+    simular fotos nuevas de actores conocidos.
+
+    Args:
+        gallery: Galería de actores
+        backend: "ivf" o "hnsw"
+        n_queries: Número de consultas
+        noise: Desviación típica del ruido añadido a cada encoding
+        settings: Valores de nprobe (IVF) o ef (HNSW) a evaluar
+        seed: Semilla de las consultas
+
+    Returns:
+        Lista de diccionarios con parametro, recall, ms_consulta y ms_exacta
+    """
+    index = build_ann_index(gallery, backend)
+    if index is None:
+        return []
+
+    encodings = np.asarray(gallery["encodings"], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(encodings), min(n_queries, len(encodings)), replace=False)
+    queries = encodings[sample] + rng.normal(0.0, noise, (len(sample), ENCODING_SIZE)).astype(np.float32)
+
+    start = time.time()
+    exact_rows, _ = BruteForceIndex(encodings).search(queries, k=1)
+    exact_ms = (time.time() - start) * 1000 / len(queries)
+
+    if settings is None:
+        settings = [1, 2, 4, 8, 16, 32] if backend == "ivf" else [16, 32, 64, 128]
+
+    results = []
+    for value in settings:
+        start = time.time()
+        if backend == "ivf":
+            rows, _ = index.search(queries, k=1, nprobe=value)
+        else:
+            rows, _ = index.search(queries, k=1, ef=value)
+        elapsed_ms = (time.time() - start) * 1000 / len(queries)
+
+        # Acierto si devuelve la misma fila o un encoding del mismo actor
+        labels = np.asarray(gallery["labels"])
+        same_row = rows[:, 0] == exact_rows[:, 0]
+        same_actor = (rows[:, 0] >= 0) & (labels[np.maximum(rows[:, 0], 0)] == labels[exact_rows[:, 0]])
+
+        results.append({
+            "parametro": value,
+            "recall": float(same_row.mean()),
+            "recall_actor": float(same_actor.mean()),
+            "ms_consulta": elapsed_ms,
+            "ms_exacta": exact_ms
+        })
+
+    return results
@@ -4,11 +4,18 @@ Gestión de base de datos de actores
 
 import os
 import csv
-import json
-import requests
 import shutil
+import hashlib
 import logging
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from config import ACTOR_IDS_FILE
 from utils import log_print
+from tmdb_client import tmdb_get, get_session
+from actor_ids import save_actor_ids
+from actor_gallery import save_gallery, build_gallery, load_gallery, compute_prototypes, save_prototypes, get_prototypes_file
+from actor_ann import build_ann_index, get_index_file
 
 # Verificar dependencias opcionales
 try:
@@ -26,6 +33,9 @@ except ImportError:
 # Configuración para TMDb
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
 
+# Hilos para descargar actores en paralelo (se solapan red y disco)
+DEFAULT_DOWNLOAD_WORKERS = 8
+
 def download_image(url, destination_path):
     """
     Descarga una imagen desde URL y la guarda en la ruta especificada
@@ -38,7 +48,7 @@ def download_image(url, destination_path):
         True si se descarga correctamente, False si hay error
     """
     try:
-        response = requests.get(url, stream=True, timeout=15)
+        response = get_session().get(url, stream=True, timeout=15)
         if response.status_code == 200:
             with open(destination_path, 'wb') as f:
                 response.raw.decode_content = True
@@ -63,12 +73,9 @@ def search_actor_tmdb(actor_name, config):
         Diccionario con información del actor o None si no se encuentra
     """
     try:
-        api_key = config["api_keys"]["tmdb"]
-        url = f"https://api.themoviedb.org/3/search/person?api_key={api_key}&query={actor_name}&language=en-US"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get("/search/person", config, {"query": actor_name, "language": "en-US"})
         
-        if response.status_code == 200:
-            data = response.json()
+        if status == 200:
             if data.get("results") and len(data["results"]) > 0:
                 # Retornar el primer resultado
                 return data["results"][0]
@@ -92,12 +99,9 @@ def get_actor_images(actor_id, config, max_images=5):
         Lista de URLs de imágenes
     """
     try:
-        api_key = config["api_keys"]["tmdb"]
-        url = f"https://api.themoviedb.org/3/person/{actor_id}/images?api_key={api_key}"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get(f"/person/{actor_id}/images", config)
         
-        if response.status_code == 200:
-            data = response.json()
+        if status == 200:
             if "profiles" in data and data["profiles"]:
                 # Tomar las primeras max_images o todas si hay menos
                 images = data["profiles"][:max_images]
@@ -109,7 +113,7 @@ def get_actor_images(actor_id, config, max_images=5):
         log_print(f"Error obteniendo imágenes: {e}", logging.ERROR)
         return []
 
-def create_actor_entry(actor_name, actors_dir, config, max_images=5):
+def create_actor_entry(actor_name, actors_dir, config, max_images=5, ids_file=ACTOR_IDS_FILE):
     """
     Crea entrada en la base de datos para un actor
     
@@ -118,6 +122,7 @@ def create_actor_entry(actor_name, actors_dir, config, max_images=5):
         actors_dir: Directorio base para actores
         config: Configuración con API key
         max_images: Número máximo de imágenes a descargar
+        ids_file: Archivo del mapa nombre -> ID de TMDb
         
     Returns:
         True si se crea correctamente, False si hay error
@@ -130,6 +135,9 @@ def create_actor_entry(actor_name, actors_dir, config, max_images=5):
     actor_id = actor_info["id"]
     professional_name = actor_info.get("name", actor_name)
     
+    # Guardar el ID para no tener que buscar al actor al identificar videos
+    save_actor_ids(ids_file, {actor_name: actor_id, professional_name: actor_id})
+    
     # Crear directorio para el actor si no existe
     actor_dir = os.path.join(actors_dir, professional_name.replace(" ", "_"))
     os.makedirs(actor_dir, exist_ok=True)
@@ -171,22 +179,91 @@ def create_actors_db_from_list(actor_list, actors_dir, config):
     # Crear directorio principal si no existe
     os.makedirs(actors_dir, exist_ok=True)
     
-    processed_actors = 0
-    for actor in actor_list:
-        log_print(f"Procesando actor: {actor}")
-        if create_actor_entry(actor, actors_dir, config):
-            processed_actors += 1
+    workers = config.get("tmdb", {}).get("pool_size", DEFAULT_DOWNLOAD_WORKERS)
+    
+    # Las búsquedas en TMDb y las descargas de varios actores se solapan; el
+    # limitador global sigue controlando el ritmo de peticiones a la API
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="actores") as executor:
+        created = executor.map(lambda actor: create_actor_entry(actor, actors_dir, config), actor_list)
+        processed_actors = sum(1 for ok in tqdm(created, total=len(actor_list),
+                                                desc="Descargando actores", unit="actor") if ok)
     
     log_print(f"Base de datos creada con {processed_actors} de {len(actor_list)} actores")
     return processed_actors
 
-def generate_encodings_db(actors_dir, db_file):
+def _image_hash(img_path):
+    """Calcula el SHA-1 del contenido de una imagen"""
+    sha1 = hashlib.sha1()
+    with open(img_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def encode_actor_image(img_path):
+    """
+    Extrae el encoding facial de una imagen de actor
+    
+    Args:
+        img_path: Ruta a la imagen
+        
+    Returns:
+        Lista con el encoding (128 valores) o None si no se detecta ningún rostro
+    """
+    try:
+        # Cargar imagen
+        image = face_recognition.load_image_file(img_path)
+        
+        # Extraer encoding
+        face_encodings = face_recognition.face_encodings(image)
+        
+        if face_encodings:
+            # Guardar el primer encoding (asumiendo una sola cara por imagen)
+            return face_encodings[0].tolist()
+    except Exception as e:
+        log_print(f"Error procesando {img_path}: {e}", logging.ERROR)
+    
+    return None
+
+def _previous_sources(db_file):
+    """
+    Obtiene los encodings ya calculados de la galería existente
+    
+    Returns:
+        Diccionario {ruta_relativa: {"sha1", "mtime", "size", "encoding"}}; las
+        imágenes sin rostro tienen encoding None
+    """
+    gallery = load_gallery(db_file, mmap=False, extra=True)
+    if not gallery:
+        return {}
+    
+    sources = gallery["extra"].get("sources", [])
+    if len(sources) != len(gallery["encodings"]):
+        # Galería creada sin datos de origen: se regenera completa
+        return {}
+    
+    previous = {}
+    for source, encoding in zip(sources, gallery["encodings"]):
+        previous[source["path"]] = dict(source, encoding=encoding.tolist())
+    
+    for path, source in gallery["extra"].get("skipped", {}).items():
+        previous[path] = dict(source, path=path, encoding=None)
+    
+    return previous
+
+def generate_encodings_db(actors_dir, db_file, ann_backend=None, processes=None, prototypes=False):
     """
-    Genera archivo JSON con encodings faciales de actores
+    Genera la galería binaria con encodings faciales de actores
+    
+    La generación es incremental: la galería guarda el hash, la fecha y el
+    tamaño de cada imagen, y solo se codifican las imágenes nuevas o
+    modificadas. Las imágenes eliminadas desaparecen de la galería.
     
     Args:
         actors_dir: Directorio con imágenes de actores
-        db_file: Ruta donde guardar la base de datos
+        db_file: Ruta de la galería (.npy) donde guardar la base de datos
+        ann_backend: Índice aproximado a crear junto a la galería ("ivf" o "hnsw")
+        processes: Procesos para codificar imágenes (por defecto, todos los núcleos)
+        prototypes: True para calcular centroides/prototipos y umbrales por actor
         
     Returns:
         True si se genera correctamente, False si hay error
@@ -199,53 +276,119 @@ def generate_encodings_db(actors_dir, db_file):
         log_print(f"No se encontró el directorio {actors_dir}", logging.ERROR)
         return False
     
-    db_actors = {}
+    previous = _previous_sources(db_file)
     
-    # Recorrer directorio de actores
-    for actor_dir in os.listdir(actors_dir):
+    # 1. Recorrer directorio de actores (en orden, para que la galería sea estable)
+    entries = []
+    pending = []
+    reused = 0
+    restamped = 0
+    
+    for actor_dir in sorted(os.listdir(actors_dir)):
         actor_path = os.path.join(actors_dir, actor_dir)
         
-        if os.path.isdir(actor_path):
-            actor_name = actor_dir.replace("_", " ")
-            db_actors[actor_name] = []
+        if not os.path.isdir(actor_path):
+            continue
+        
+        actor_name = actor_dir.replace("_", " ")
+        
+        for img_file in sorted(os.listdir(actor_path)):
+            if not img_file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                continue
             
-            # Procesar cada imagen del actor
-            processed_images = 0
-            for img_file in os.listdir(actor_path):
-                if img_file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    img_path = os.path.join(actor_path, img_file)
-                    
-                    try:
-                        # Cargar imagen
-                        image = face_recognition.load_image_file(img_path)
-                        
-                        # Extraer encoding
-                        face_encodings = face_recognition.face_encodings(image)
-                        
-                        if face_encodings:
-                            # Guardar el primer encoding (asumiendo una sola cara por imagen)
-                            db_actors[actor_name].append(face_encodings[0].tolist())
-                            processed_images += 1
-                    except Exception as e:
-                        log_print(f"Error procesando {img_path}: {e}", logging.ERROR)
+            img_path = os.path.join(actor_path, img_file)
+            rel_path = f"{actor_dir}/{img_file}"
             
-            log_print(f"Procesadas {processed_images} imágenes para {actor_name}")
+            try:
+                stat = os.stat(img_path)
+            except OSError as e:
+                log_print(f"Error procesando {img_path}: {e}", logging.ERROR)
+                continue
             
-            # Si no se pudo procesar ninguna imagen, eliminar entrada
-            if processed_images == 0:
-                del db_actors[actor_name]
+            source = {"path": rel_path, "mtime": stat.st_mtime, "size": stat.st_size}
+            old = previous.get(rel_path)
+            entry = {"actor": actor_name, "source": source, "encoding": None}
+            
+            if old and old["mtime"] == stat.st_mtime and old["size"] == stat.st_size:
+                # Sin cambios: reutilizar sin leer la imagen
+                source["sha1"] = old["sha1"]
+                entry["encoding"] = old["encoding"]
+                reused += 1
+            else:
+                source["sha1"] = _image_hash(img_path)
+                if old and old["sha1"] == source["sha1"]:
+                    # Solo cambió la fecha (copia, restauración...)
+                    entry["encoding"] = old["encoding"]
+                    reused += 1
+                    restamped += 1
+                else:
+                    pending.append((entry, img_path))
+            
+            entries.append(entry)
     
-    # Guardar base de datos en archivo JSON
-    try:
-        os.makedirs(os.path.dirname(db_file), exist_ok=True)
-        with open(db_file, 'w', encoding='utf-8') as f:
-            json.dump(db_actors, f)
+    # 2. Codificar las imágenes nuevas o modificadas en todos los núcleos
+    encoded = len(pending)
+    if pending:
+        img_paths = [img_path for _, img_path in pending]
+        processes = max(1, min(processes or os.cpu_count() or 1, len(img_paths)))
         
-        log_print(f"Base de datos de encodings creada con {len(db_actors)} actores")
+        if processes == 1:
+            encodings = map(encode_actor_image, img_paths)
+            for (entry, _), encoding in zip(pending, tqdm(encodings, total=len(img_paths),
+                                                        desc="Generando encodings", unit="img")):
+                entry["encoding"] = encoding
+        else:
+            with Pool(processes=processes) as pool:
+                # imap conserva el orden de entrada: la galería es determinista
+                encodings = pool.imap(encode_actor_image, img_paths, chunksize=4)
+                for (entry, _), encoding in zip(pending, tqdm(encodings, total=len(img_paths),
+                                                            desc="Generando encodings", unit="img")):
+                    entry["encoding"] = encoding
+    
+    # 3. Agrupar por actor
+    db_actors = {}
+    sources = []
+    skipped = {}
+    
+    for entry in entries:
+        source = entry["source"]
+        if entry["encoding"] is None:
+            skipped[source["path"]] = {"sha1": source["sha1"], "mtime": source["mtime"], "size": source["size"]}
+        else:
+            db_actors.setdefault(entry["actor"], []).append(entry["encoding"])
+            sources.append(source)
+    
+    removed = len(set(previous) - {source["path"] for source in sources} - set(skipped))
+    log_print(f"Encodings: {encoded} imágenes nuevas o modificadas, {reused} reutilizadas, "
+              f"{removed} eliminadas")
+    
+    up_to_date = previous and not encoded and not removed and not restamped and os.path.exists(db_file)
+    if up_to_date and prototypes and not os.path.exists(get_prototypes_file(db_file)):
+        up_to_date = False
+    if up_to_date and ann_backend and ann_backend != "brute" and not os.path.exists(get_index_file(db_file, ann_backend)):
+        up_to_date = False
+    
+    if up_to_date:
+        log_print("La galería de actores ya está actualizada")
         return True
-    except Exception as e:
-        log_print(f"Error guardando base de datos: {e}", logging.ERROR)
+    
+    # Guardar galería binaria (matriz float32 + nombres + origen de cada fila)
+    gallery = build_gallery(db_actors)
+    gallery["extra"] = {"sources": sources, "skipped": skipped}
+    
+    if not save_gallery(gallery, db_file):
         return False
+    
+    # Prototipos y umbrales por actor para el filtro previo
+    if prototypes:
+        save_prototypes(compute_prototypes(gallery), gallery, db_file)
+    
+    # Índice de búsqueda aproximada para galerías grandes
+    if ann_backend and ann_backend != "brute":
+        build_ann_index(gallery, ann_backend, db_file)
+    
+    log_print(f"Base de datos de encodings creada con {len(db_actors)} actores")
+    return True
 
 def create_actors_csv(csv_file):
     """
@@ -337,16 +480,13 @@ def get_popular_actors(config, count=50):
         Lista de nombres de actores
     """
     try:
-        api_key = config["api_keys"]["tmdb"]
         actors = []
         pages = (count // 20) + 1  # TMDb devuelve 20 por página
         
         for page in range(1, pages+1):
-            url = f"https://api.themoviedb.org/3/person/popular?api_key={api_key}&language=en-US&page={page}"
-            response = requests.get(url, timeout=15)
+            status, data = tmdb_get("/person/popular", config, {"language": "en-US", "page": page})
             
-            if response.status_code == 200:
-                data = response.json()
+            if status == 200:
                 if "results" in data:
                     for actor in data["results"]:
                         if len(actors) < count:
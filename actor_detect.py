@@ -4,9 +4,44 @@ Funciones para reconocimiento facial de actores
 
 import os
 import json
+import math
 import logging
 import numpy as np
 from utils import log_print
+from config import ACTORS_DB_FILE
+from actor_gallery import ENCODING_SIZE, build_gallery, load_gallery, encoding_distances, get_actor_offsets
+from video_analysis import get_frame_timestamp, load_frame_image, get_frame_name
+from face_cache import get_cached_faces, store_faces
+
+# Actores cuyos encodings se revisan por rostro tras el filtro de prototipos
+DEFAULT_PREFILTER_TOP = 5
+
+# Agregación entre fotogramas: distancia para agrupar rostros de la misma
+# persona y fotogramas mínimos en los que debe aparecer un actor
+DEFAULT_CLUSTER_DISTANCE = 0.5
+DEFAULT_MIN_VOTES = 2
+
+# Detector de rostros: modelo ("hog" o "cnn"), ampliaciones de dlib, lado
+# mayor al que se reducen los fotogramas y fotogramas por lote
+DEFAULT_DETECTION_MODEL = "hog"
+DEFAULT_DETECTION_UPSAMPLE = 1
+DEFAULT_DETECTION_MAX_DIMENSION = 1280
+DEFAULT_DETECTION_BATCH_SIZE = 8
+
+# Filtro previo: descarta fotogramas sin candidatos a rostro antes del detector
+# ("haar", "luminance" u "off"); el modo auditoría pasa el detector también
+# por los descartados para medir cuántos rostros se pierden
+DEFAULT_PRESCREEN = "haar"
+PRESCREEN_THUMBNAIL_SIZE = 320
+# Ventana mínima del clasificador Haar y rostro mínimo que encuentra el
+# detector de dlib sin ampliar (píxeles de la imagen analizada)
+HAAR_MIN_WINDOW = 24
+DETECTOR_MIN_FACE = 80
+PRESCREEN_MIN_BRIGHTNESS = 20
+PRESCREEN_MIN_CONTRAST = 10
+
+# Clasificador Haar del filtro previo (se carga una vez por proceso)
+_haar_cascade = None
 
 # Verificar dependencias
 try:
@@ -23,33 +58,331 @@ except ImportError:
     FACE_RECOGNITION_AVAILABLE = False
     log_print("face_recognition no disponible. Reconocimiento facial desactivado.", logging.WARNING)
 
-def load_actors_db(db_file):
+def load_actors_db(db_file, legacy_file=ACTORS_DB_FILE):
     """
     Carga la base de datos de encodings faciales de actores
     
+    Se usa la galería binaria (.npy, proyectada en memoria); si aún no existe
+    se recurre a la base de datos JSON anterior.
+    
     Args:
-        db_file: Ruta al archivo de base de datos
+        db_file: Ruta a la galería binaria (o a un JSON de encodings)
+        legacy_file: JSON de encodings usado si no existe la galería binaria
         
     Returns:
-        Diccionario con el formato {nombre_actor: [lista_de_encodings]}
+        Galería de actores (ver build_gallery) o diccionario vacío si no existe
     """
+    if db_file.endswith(".npy"):
+        gallery = load_gallery(db_file)
+        if gallery:
+            return gallery
+        
+        if not legacy_file or not os.path.exists(legacy_file):
+            log_print(f"Base de datos de actores {db_file} no encontrada", logging.WARNING)
+            return {}
+        
+        log_print(f"Usando la base de datos JSON {legacy_file}; conviértela con --convert-actors-db "
+                  f"para cargarla más rápido", logging.WARNING)
+        db_file = legacy_file
+    
     if not os.path.exists(db_file):
         log_print(f"Base de datos de actores {db_file} no encontrada", logging.WARNING)
         return {}
     
     try:
         with open(db_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            return build_gallery(json.load(f))
     except Exception as e:
         log_print(f"Error cargando base de datos de actores: {e}", logging.ERROR)
         return {}
 
-def detect_faces(image):
+def _prefilter_matches(faces, gallery, top):
+    """
+    Compara los rostros con los prototipos y solo con los encodings de los mejores actores
+    
+    Args:
+        faces: Matriz F x 128 de encodings de rostros
+        gallery: Galería con prototipos (ver actor_gallery.compute_prototypes)
+        top: Número de actores candidatos por rostro
+        
+    Returns:
+        (filas, distancias) con el mejor encoding de cada rostro
+    """
+    prototypes = gallery["prototypes"]
+    encodings = gallery["encodings"]
+    offsets = prototypes["offsets"]
+    
+    # Distancia de cada rostro a cada actor = mínima a sus prototipos
+    labels, starts = np.unique(prototypes["prototype_labels"], return_index=True)
+    proto_distances = encoding_distances(faces, prototypes["prototypes"])
+    actor_distances = np.minimum.reduceat(proto_distances, starts, axis=1)
+    
+    top = min(top, len(labels))
+    candidates = np.argpartition(actor_distances, top - 1, axis=1)[:, :top]
+    
+    best_rows = np.full(len(faces), -1, dtype=np.int64)
+    best_distances = np.full(len(faces), np.inf, dtype=np.float32)
+    
+    for i, candidate_actors in enumerate(candidates):
+        rows = np.concatenate([
+            np.arange(offsets[label], offsets[label + 1]) for label in labels[candidate_actors]
+        ])
+        distances = encoding_distances(faces[i:i + 1], encodings[rows])[0]
+        best = distances.argmin()
+        best_rows[i] = rows[best]
+        best_distances[i] = distances[best]
+    
+    return best_rows, best_distances
+
+def match_faces(face_encodings, gallery, tolerance=0.6, ann_index=None, prefilter_top=DEFAULT_PREFILTER_TOP):
+    """
+    Compara todos los rostros con toda la galería en una sola operación matricial
+    
+    Si la galería tiene prototipos por actor, primero se compara con ellos y
+    solo se revisan los encodings de los `prefilter_top` actores más cercanos;
+    además cada actor usa su propio umbral calibrado (nunca mayor que
+    `tolerance`).
+    
+    Args:
+        face_encodings: Lista o matriz (F x 128) de encodings de rostros
+        gallery: Galería de actores (ver build_gallery)
+        tolerance: Distancia máxima para considerar una coincidencia
+        ann_index: Índice aproximado de la galería (ver actor_ann); si es None
+                   se compara con todos los encodings
+        prefilter_top: Actores candidatos por rostro tras el filtro de prototipos
+        
+    Returns:
+        Lista con (nombre_actor, distancia) por rostro; el nombre es None si la
+        mejor distancia supera la tolerancia
+    """
+    if len(face_encodings) == 0:
+        return []
+    
+    if not gallery or not len(gallery["encodings"]):
+        return [(None, float("inf"))] * len(face_encodings)
+    
+    faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    prototypes = gallery.get("prototypes")
+    
+    if ann_index is not None:
+        rows, distances = ann_index.search(faces, k=1)
+        best_rows = rows[:, 0]
+        best_distances = distances[:, 0]
+    elif prototypes is not None and len(prototypes["prototypes"]):
+        best_rows, best_distances = _prefilter_matches(faces, gallery, prefilter_top)
+    else:
+        distances = encoding_distances(faces, gallery["encodings"])
+        best_rows = distances.argmin(axis=1)
+        best_distances = distances[np.arange(len(faces)), best_rows]
+    
+    matches = []
+    for row, distance in zip(best_rows, best_distances):
+        label = gallery["labels"][row] if row >= 0 else None
+        limit = tolerance
+        if label is not None and prototypes is not None:
+            limit = min(tolerance, float(prototypes["thresholds"][label]))
+        
+        if label is not None and distance <= limit:
+            matches.append((gallery["names"][label], float(distance)))
+        else:
+            matches.append((None, float(distance)))
+    
+    return matches
+
+def get_detector_settings(config=None):
+    """
+    Obtiene los parámetros del detector de rostros desde la configuración
+    
+    Args:
+        config: Configuración del sistema (opcional)
+        
+    Returns:
+        Diccionario con model, upsample, max_dimension y batch_size
+    """
+    processing = config.get("processing", {}) if config else {}
+    return {
+        "model": processing.get("face_detection_model", DEFAULT_DETECTION_MODEL),
+        "upsample": processing.get("face_detection_upsample", DEFAULT_DETECTION_UPSAMPLE),
+        "max_dimension": processing.get("face_detection_max_dimension", DEFAULT_DETECTION_MAX_DIMENSION),
+        "batch_size": processing.get("face_detection_batch_size", DEFAULT_DETECTION_BATCH_SIZE),
+        "prescreen": processing.get("face_prescreen", DEFAULT_PRESCREEN),
+        "prescreen_audit": processing.get("face_prescreen_audit", False)
+    }
+
+def new_prescreen_stats():
+    """Crea los contadores del filtro previo de rostros"""
+    return {"fotogramas": 0, "descartados": 0, "auditados": 0, "rostros_perdidos": 0}
+
+def _get_haar_cascade():
+    """Carga el clasificador Haar de rostros frontales de OpenCV (o None)"""
+    global _haar_cascade
+    
+    if _haar_cascade is None:
+        try:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+            _haar_cascade = cascade if not cascade.empty() else False
+        except Exception:
+            _haar_cascade = False
+        
+        if _haar_cascade is False:
+            log_print("Clasificador Haar no disponible. El filtro previo solo usará la luminancia.",
+                      logging.WARNING)
+    
+    return _haar_cascade or None
+
+def prescreen_thumbnail_size(detector):
+    """
+    Calcula el lado de la miniatura del clasificador Haar para un detector
+    
+    La miniatura debe ser lo bastante grande para que el rostro más pequeño
+    que encuentra el detector (reducido a max_dimension y ampliado
+    `upsample` veces) ocupe al menos la ventana mínima del clasificador; si
+    no, el filtro descartaría fotogramas que el detector sí reconocería.
+    
+    Args:
+        detector: Parámetros del detector (ver get_detector_settings)
+        
+    Returns:
+        Lado mayor de la miniatura en píxeles (0 para la imagen completa)
+    """
+    max_dimension = detector.get("max_dimension")
+    if not max_dimension:
+        return 0
+    
+    min_face = DETECTOR_MIN_FACE / (2 ** max(0, int(detector.get("upsample", 0))))
+    return max(PRESCREEN_THUMBNAIL_SIZE, int(math.ceil(HAAR_MIN_WINDOW * max_dimension / min_face)))
+
+def _thumbnail(image, size):
+    """Reduce una imagen para que su lado mayor no supere size (0 sin reducir)"""
+    height, width = image.shape[:2]
+    scale = min(1.0, size / max(height, width)) if size else 1.0
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+def may_contain_faces(image, method=DEFAULT_PRESCREEN, haar_size=PRESCREEN_THUMBNAIL_SIZE):
+    """
+    Comprobación barata de si un fotograma puede contener rostros
+    
+    Se trabaja sobre una miniatura en escala de grises: los fotogramas casi
+    negros o planos (créditos en negro, fundidos) se descartan, y con el
+    método "haar" además debe aparecer algún candidato del clasificador Haar
+    (con parámetros permisivos para no perder rostros).
+    
+    Args:
+        image: Imagen (matriz numpy, BGR)
+        method: "haar", "luminance" u "off"
+        haar_size: Lado de la miniatura del clasificador Haar
+                   (ver prescreen_thumbnail_size)
+        
+    Returns:
+        False si se puede descartar el fotograma sin pasar el detector
+    """
+    if method == "off":
+        return True
+    
+    gray = cv2.cvtColor(_thumbnail(image, PRESCREEN_THUMBNAIL_SIZE), cv2.COLOR_BGR2GRAY)
+    
+    if gray.mean() < PRESCREEN_MIN_BRIGHTNESS or gray.std() < PRESCREEN_MIN_CONTRAST:
+        return False
+    
+    if method == "haar":
+        cascade = _get_haar_cascade()
+        if cascade is not None:
+            # Miniatura propia, lo bastante grande para los rostros pequeños
+            gray = cv2.cvtColor(_thumbnail(image, haar_size), cv2.COLOR_BGR2GRAY)
+            candidates = cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=2,
+                                                  minSize=(HAAR_MIN_WINDOW, HAAR_MIN_WINDOW))
+            return len(candidates) > 0
+    
+    return True
+
+def _downscale(rgb_image, max_dimension):
+    """
+    Reduce una imagen para que su lado mayor no supere max_dimension
+    
+    Returns:
+        (imagen_reducida, escala)
+    """
+    height, width = rgb_image.shape[:2]
+    scale = min(1.0, float(max_dimension) / max(height, width)) if max_dimension else 1.0
+    
+    if scale >= 1.0:
+        return rgb_image, 1.0
+    
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(rgb_image, size, interpolation=cv2.INTER_AREA), scale
+
+def _scale_locations(locations, scale, shape):
+    """Lleva las ubicaciones detectadas en la imagen reducida a la resolución original"""
+    if scale == 1.0:
+        return [tuple(location) for location in locations]
+    
+    height, width = shape[:2]
+    scaled = []
+    for top, right, bottom, left in locations:
+        scaled.append((
+            max(0, int(round(top / scale))),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(round(left / scale)))
+        ))
+    return scaled
+
+def detect_face_locations(rgb_images, detector=None):
+    """
+    Detecta rostros en varias imágenes sobre copias reducidas
+    
+    Las imágenes se reducen a `max_dimension` antes de detectar y las
+    ubicaciones se devuelven en la resolución original. Con el modelo "cnn"
+    las imágenes del mismo tamaño se procesan por lotes.
+    
+    Args:
+        rgb_images: Lista de imágenes RGB (matrices numpy)
+        detector: Parámetros del detector (ver get_detector_settings)
+        
+    Returns:
+        Lista con las ubicaciones (top, right, bottom, left) de cada imagen
+    """
+    detector = detector or get_detector_settings()
+    reduced = [_downscale(image, detector["max_dimension"]) for image in rgb_images]
+    detections = [None] * len(rgb_images)
+    
+    if detector["model"] == "cnn":
+        # batch_face_locations exige que todas las imágenes del lote tengan el mismo tamaño
+        by_shape = {}
+        for i, (small, _) in enumerate(reduced):
+            by_shape.setdefault(small.shape, []).append(i)
+        
+        for indices in by_shape.values():
+            for start in range(0, len(indices), detector["batch_size"]):
+                chunk = indices[start:start + detector["batch_size"]]
+                batch = face_recognition.batch_face_locations(
+                    [reduced[i][0] for i in chunk],
+                    number_of_times_to_upsample=detector["upsample"],
+                    batch_size=len(chunk)
+                )
+                for i, locations in zip(chunk, batch):
+                    detections[i] = locations
+    else:
+        for i, (small, _) in enumerate(reduced):
+            detections[i] = face_recognition.face_locations(
+                small, number_of_times_to_upsample=detector["upsample"], model=detector["model"]
+            )
+    
+    return [
+        _scale_locations(locations, scale, image.shape)
+        for locations, (_, scale), image in zip(detections, reduced, rgb_images)
+    ]
+
+def detect_faces(image, detector=None):
     """
     Detecta rostros en una imagen
     
     Args:
         image: Imagen (matriz numpy) donde buscar rostros
+        detector: Parámetros del detector (ver get_detector_settings)
         
     Returns:
         Lista de ubicaciones de rostros (top, right, bottom, left)
@@ -62,21 +395,98 @@ def detect_faces(image):
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # Detectar ubicaciones de rostros
-        face_locations = face_recognition.face_locations(rgb_image)
-        return face_locations
+        return detect_face_locations([rgb_image], detector)[0]
     
     except Exception as e:
         log_print(f"Error en detección de rostros: {e}", logging.ERROR)
         return []
 
-def recognize_actors(image, actors_db, min_confidence=0.6):
+def encode_faces_batch(images, detector=None, stats=None):
+    """
+    Detecta los rostros de varias imágenes y extrae sus encodings
+    
+    Los fotogramas que no superan el filtro previo (may_contain_faces) no
+    pasan por el detector. La detección se hace a resolución reducida y los
+    encodings sobre la imagen original, con las ubicaciones reescaladas.
+    
+    Args:
+        images: Lista de imágenes (matrices numpy, BGR)
+        detector: Parámetros del detector (ver get_detector_settings)
+        stats: Contadores del filtro previo a actualizar (ver new_prescreen_stats)
+        
+    Returns:
+        Lista de (ubicaciones, encodings) por imagen
+    """
+    detector = detector or get_detector_settings()
+    results = [([], []) for _ in images]
+    
+    haar_size = prescreen_thumbnail_size(detector)
+    passed = [may_contain_faces(image, detector["prescreen"], haar_size) for image in images]
+    candidates = [i for i, ok in enumerate(passed) if ok]
+    skipped = [i for i, ok in enumerate(passed) if not ok]
+    
+    if stats is not None:
+        stats["fotogramas"] += len(images)
+        stats["descartados"] += len(skipped)
+    
+    # En auditoría también se detecta en los descartados para medir el impacto
+    audited = set(skipped) if detector.get("prescreen_audit") else set()
+    to_detect = candidates + sorted(audited)
+    
+    if not to_detect:
+        return results
+    
+    rgb_images = [cv2.cvtColor(images[i], cv2.COLOR_BGR2RGB) for i in to_detect]
+    locations = detect_face_locations(rgb_images, detector)
+    
+    for i, rgb_image, face_locations in zip(to_detect, rgb_images, locations):
+        if i in audited:
+            if stats is not None:
+                stats["auditados"] += 1
+                stats["rostros_perdidos"] += len(face_locations)
+            continue
+        
+        if face_locations:
+            # Extraer encodings de los rostros
+            results[i] = (face_locations, face_recognition.face_encodings(rgb_image, face_locations))
+    
+    return results
+
+def log_prescreen_stats(stats, level=logging.INFO):
+    """Muestra los contadores del filtro previo de rostros"""
+    if not stats or not stats["fotogramas"]:
+        return
+    
+    message = (f"Filtro previo de rostros: {stats['descartados']} de {stats['fotogramas']} "
+               f"fotogramas descartados sin pasar el detector")
+    if stats["auditados"]:
+        message += (f" (auditoría: {stats['rostros_perdidos']} rostros en "
+                    f"{stats['auditados']} fotogramas descartados)")
+    log_print(message, level)
+
+def encode_faces(image, detector=None):
+    """
+    Detecta los rostros de una imagen y extrae sus encodings
+    
+    Args:
+        image: Imagen (matriz numpy, BGR) donde buscar rostros
+        detector: Parámetros del detector (ver get_detector_settings)
+        
+    Returns:
+        (ubicaciones, encodings): lista de (top, right, bottom, left) y lista de encodings
+    """
+    return encode_faces_batch([image], detector)[0]
+
+def recognize_actors(image, actors_db, min_confidence=0.6, ann_index=None, detector=None):
     """
     Detecta rostros en la imagen y los compara con base de datos de actores
     
     Args:
         image: Imagen (matriz numpy) donde buscar rostros
-        actors_db: Diccionario con encodings de actores
-        min_confidence: Umbral mínimo de confianza (0.0-1.0)
+        actors_db: Galería de actores (o diccionario con encodings de actores)
+        min_confidence: Distancia máxima para aceptar una coincidencia (0.0-1.0)
+        ann_index: Índice aproximado de la galería (opcional, ver actor_ann)
+        detector: Parámetros del detector de rostros (ver get_detector_settings)
         
     Returns:
         Lista de nombres de actores reconocidos
@@ -85,38 +495,17 @@ def recognize_actors(image, actors_db, min_confidence=0.6):
         return []
     
     try:
-        # Convertir imagen de OpenCV a formato face_recognition
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Detectar ubicaciones de rostros
-        face_locations = face_recognition.face_locations(rgb_image)
+        _, face_encodings = encode_faces(image, detector)
         
-        if not face_locations:
+        if not len(face_encodings):
             return []
         
-        # Extraer encodings de los rostros
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
-        
-        # Lista para almacenar actores reconocidos
+        # Mejor actor de la galería para cada rostro
         recognized_actors = []
-        
-        # Para cada rostro detectado
-        for face_encoding in face_encodings:
-            # Comparar con cada actor en la base de datos
-            for actor_name, actor_encodings in actors_db.items():
-                for actor_encoding in actor_encodings:
-                    # Convertir de lista a numpy array
-                    actor_encoding_array = np.array(actor_encoding)
-                    
-                    # Comparar rostros
-                    matches = face_recognition.compare_faces(
-                        [actor_encoding_array], face_encoding, tolerance=min_confidence
-                    )
-                    
-                    if matches[0]:
-                        if actor_name not in recognized_actors:
-                            recognized_actors.append(actor_name)
-                            break
+        for actor_name, distance in match_faces(face_encodings, build_gallery(actors_db),
+                                                min_confidence, ann_index):
+            if actor_name and actor_name not in recognized_actors:
+                recognized_actors.append(actor_name)
         
         return recognized_actors
     
@@ -124,36 +513,171 @@ def recognize_actors(image, actors_db, min_confidence=0.6):
         log_print(f"Error en reconocimiento facial: {e}", logging.ERROR)
         return []
 
-def detect_actors_in_frames(frame_files, actors_db, min_confidence=0.6):
+def cluster_faces(face_encodings, max_distance=DEFAULT_CLUSTER_DISTANCE):
     """
-    Detecta actores en múltiples fotogramas
+    Agrupa los rostros que pertenecen a la misma persona
+    
+    Cada rostro se une al grupo con el centroide más cercano si está a menos
+    de `max_distance`; si no, abre un grupo nuevo.
     
     Args:
-        frame_files: Lista de rutas a fotogramas
-        actors_db: Diccionario con encodings de actores
-        min_confidence: Umbral mínimo de confianza (0.0-1.0)
+        face_encodings: Matriz F x 128 de encodings
+        max_distance: Distancia máxima al centroide de un grupo
         
     Returns:
-        Lista de actores detectados
+        Lista de grupos (listas de índices de rostros)
     """
-    all_detected_actors = []
+    faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    clusters = []
+    centroids = []
     
-    for frame_file in frame_files:
-        try:
-            frame = cv2.imread(frame_file)
-            if frame is None:
+    for i, encoding in enumerate(faces):
+        if centroids:
+            distances = encoding_distances(encoding, np.asarray(centroids))[0]
+            nearest = int(distances.argmin())
+            if distances[nearest] <= max_distance:
+                clusters[nearest].append(i)
+                centroids[nearest] = faces[clusters[nearest]].mean(axis=0)
                 continue
-                
-            detected = recognize_actors(frame, actors_db, min_confidence)
+        
+        clusters.append([i])
+        centroids.append(encoding)
+    
+    return clusters
+
+def detect_actor_votes(frames, actors_db, min_confidence=0.6, ann_index=None,
+                       min_votes=DEFAULT_MIN_VOTES, cluster_distance=DEFAULT_CLUSTER_DISTANCE, detector=None,
+                       stats=None, fingerprint=None):
+    """
+    Detecta actores agregando los rostros de todos los fotogramas del video
+    
+    Los rostros se agrupan por persona y cada grupo se compara con la galería
+    una sola vez (por su centroide). Un actor solo se acepta si su grupo
+    aparece en al menos `min_votes` fotogramas.
+    
+    Args:
+        frames: Lista de fotogramas en memoria (segundo, imagen) o rutas a archivos
+        actors_db: Galería de actores (o diccionario con encodings de actores)
+        min_confidence: Distancia máxima para aceptar una coincidencia (0.0-1.0)
+        ann_index: Índice aproximado de la galería (opcional, ver actor_ann)
+        min_votes: Fotogramas mínimos en los que debe aparecer el actor
+        cluster_distance: Distancia máxima para agrupar dos rostros
+        detector: Parámetros del detector de rostros (ver get_detector_settings)
+        stats: Contadores del filtro previo a actualizar (ver new_prescreen_stats)
+        fingerprint: Huella del video; si se indica, los rostros de cada
+                     fotograma se guardan y reutilizan (ver face_cache)
+        
+    Returns:
+        Lista de diccionarios {"actor", "votes", "faces", "distance"} ordenada
+        por votos (fotogramas) y distancia media
+    """
+    if not FACE_RECOGNITION_AVAILABLE or not actors_db:
+        return []
+    
+    # Construir la matriz una sola vez para todos los fotogramas
+    gallery = build_gallery(actors_db)
+    
+    face_encodings = []
+    face_frames = []
+    
+    detector = detector or get_detector_settings()
+    
+    # Detectar por lotes de fotogramas (un lote completo por llamada al detector)
+    for start in range(0, len(frames), detector["batch_size"]):
+        images = []
+        pending = []
+        
+        for frame_index in range(start, min(start + detector["batch_size"], len(frames))):
+            timestamp = get_frame_timestamp(frames[frame_index]) if fingerprint else None
+            
+            # Rostros ya calculados para este video, segundo y detector
+            if timestamp is not None:
+                cached = get_cached_faces(fingerprint, timestamp, detector)
+                if cached is not None:
+                    face_encodings.extend(cached[1])
+                    face_frames.extend([frame_index] * len(cached[1]))
+                    continue
             
-            for actor in detected:
-                if actor not in all_detected_actors:
-                    all_detected_actors.append(actor)
-                    
+            image = load_frame_image(frames[frame_index])
+            if image is None:
+                continue
+            images.append(image)
+            pending.append((frame_index, timestamp))
+        
+        if not images:
+            continue
+        
+        try:
+            for (frame_index, timestamp), (locations, encodings) in zip(
+                    pending, encode_faces_batch(images, detector, stats)):
+                face_encodings.extend(encodings)
+                face_frames.extend([frame_index] * len(encodings))
+                if timestamp is not None:
+                    store_faces(fingerprint, timestamp, detector, locations, encodings)
         except Exception as e:
-            log_print(f"Error procesando {frame_file}: {e}", logging.ERROR)
+            log_print(f"Error detectando rostros en fotogramas: {e}", logging.ERROR)
+    
+    if not face_encodings:
+        return []
+    
+    faces = np.asarray(face_encodings, dtype=np.float32)
+    clusters = cluster_faces(faces, cluster_distance)
+    centroids = np.asarray([faces[members].mean(axis=0) for members in clusters])
+    
+    votes = {}
+    offsets = get_actor_offsets(gallery)
+    
+    for members, (actor_name, _) in zip(clusters, match_faces(centroids, gallery, min_confidence, ann_index)):
+        if not actor_name:
+            continue
+        
+        # Distancia media de cada rostro del grupo a las fotos del actor
+        label = gallery["names"].index(actor_name)
+        actor_rows = gallery["encodings"][offsets[label]:offsets[label + 1]]
+        member_distances = encoding_distances(faces[members], actor_rows).min(axis=1)
+        
+        entry = votes.setdefault(actor_name, {"actor": actor_name, "frames": set(), "faces": 0, "distances": []})
+        entry["frames"].update(face_frames[i] for i in members)
+        entry["faces"] += len(members)
+        entry["distances"].extend(member_distances.tolist())
+    
+    results = []
+    for entry in votes.values():
+        result = {
+            "actor": entry["actor"],
+            "votes": len(entry["frames"]),
+            "faces": entry["faces"],
+            "distance": float(np.mean(entry["distances"]))
+        }
+        if result["votes"] >= min_votes:
+            results.append(result)
+        else:
+            log_print(f"Actor descartado por pocos votos: {result['actor']} "
+                      f"({result['votes']} fotogramas, distancia {result['distance']:.3f})", logging.DEBUG)
     
-    return all_detected_actors
+    results.sort(key=lambda r: (-r["votes"], r["distance"]))
+    log_print(f"Rostros: {len(faces)} en {len(set(face_frames))} fotogramas, {len(clusters)} personas distintas",
+              logging.DEBUG)
+    
+    return results
+
+def detect_actors_in_frames(frames, actors_db, min_confidence=0.6, ann_index=None,
+                            min_votes=DEFAULT_MIN_VOTES):
+    """
+    Detecta actores en múltiples fotogramas
+    
+    Args:
+        frames: Lista de fotogramas en memoria (segundo, imagen) o rutas a archivos
+        actors_db: Galería de actores (o diccionario con encodings de actores)
+        min_confidence: Distancia máxima para aceptar una coincidencia (0.0-1.0)
+        ann_index: Índice aproximado de la galería (opcional, ver actor_ann)
+        min_votes: Fotogramas mínimos en los que debe aparecer el actor
+        
+    Returns:
+        Lista de actores detectados (ordenada por votos)
+    """
+    votes = detect_actor_votes(frames, actors_db, min_confidence, ann_index, min_votes)
+    return [entry["actor"] for entry in votes]
 
 def mark_faces_in_image(image, face_locations, recognized_names=None):
     """
@@ -186,14 +710,18 @@ def mark_faces_in_image(image, face_locations, recognized_names=None):
     
     return image_copy
 
-def save_actor_recognition_results(frame_file, actors, output_dir):
+def save_actor_recognition_results(frame, actors, output_dir, face_locations=None,
+                                   fingerprint=None, detector=None):
     """
     Guarda imagen con actores marcados y registra resultados
     
     Args:
-        frame_file: Ruta al fotograma analizado
+        frame: Fotograma analizado (segundo, imagen) o ruta a su archivo
         actors: Lista de actores detectados
         output_dir: Directorio para guardar resultados
+        face_locations: Rostros ya detectados en el fotograma (opcional)
+        fingerprint: Huella del video para reutilizar los rostros de la caché
+        detector: Parámetros del detector de rostros (ver get_detector_settings)
         
     Returns:
         Ruta al archivo generado o None si hay error
@@ -206,18 +734,27 @@ def save_actor_recognition_results(frame_file, actors, output_dir):
         os.makedirs(output_dir, exist_ok=True)
         
         # Cargar imagen
-        frame = cv2.imread(frame_file)
-        if frame is None:
+        image = load_frame_image(frame)
+        if image is None:
             return None
         
+        # Reutilizar los rostros ya detectados si es posible
+        if face_locations is None and fingerprint:
+            timestamp = get_frame_timestamp(frame)
+            cached = get_cached_faces(fingerprint, timestamp, detector or get_detector_settings()) \
+                if timestamp is not None else None
+            if cached is not None:
+                face_locations = cached[0]
+        
         # Detectar rostros
-        face_locations = detect_faces(frame)
+        if face_locations is None:
+            face_locations = detect_faces(image, detector)
         
         # Marcar rostros con nombres de actores
-        marked_frame = mark_faces_in_image(frame, face_locations, actors)
+        marked_frame = mark_faces_in_image(image, face_locations, actors)
         
         # Generar nombre de archivo
-        base_name = os.path.basename(frame_file)
+        base_name = get_frame_name(frame)
         output_file = os.path.join(output_dir, f"detected_{base_name}")
         
         # Guardar imagen
@@ -0,0 +1,499 @@
+"""
+Galería binaria de encodings faciales de actores (matriz float32 en .npy)
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import logging
+import numpy as np
+from utils import log_print
+
+# Dimensión de los encodings faciales de face_recognition
+ENCODING_SIZE = 128
+
+# Identificación y versión del formato de la galería
+GALLERY_FORMAT = "videosort-actor-gallery"
+GALLERY_VERSION = 1
+
+# Reintentos al cargar una galería que se está reescribiendo en ese momento
+LOAD_RETRIES = 5
+LOAD_RETRY_DELAY = 0.2
+
+# Marca final del .npy con el identificador de escritura (np.load la ignora)
+GENERATION_MAGIC = b"VSGEN"
+GENERATION_SIZE = 32
+
+# Prototipos por actor
+DEFAULT_MAX_PROTOTYPES = 3
+# Distancia al centroide a partir de la cual las fotos se consideran diversas
+DEFAULT_DIVERSITY = 0.3
+# Umbral por actor: distancia máxima entre sus fotos más un margen, acotada
+DEFAULT_THRESHOLD_MARGIN = 0.05
+DEFAULT_THRESHOLD_FLOOR = 0.45
+DEFAULT_THRESHOLD_CAP = 0.6
+
+def build_gallery(actors_db):
+    """
+    Convierte la base de datos de actores en una matriz contigua de encodings
+
+    Args:
+        actors_db: Diccionario con el formato {nombre_actor: [lista_de_encodings]}
+                   (si ya es una galería se devuelve tal cual)
+
+    Returns:
+        Diccionario con "names" (lista de actores), "labels" (índice del actor
+        de cada fila) y "encodings" (matriz float32 de N x 128)
+    """
+    if is_gallery(actors_db):
+        return actors_db
+
+    names = []
+    labels = []
+    rows = []
+
+    for actor_name, actor_encodings in (actors_db or {}).items():
+        if not actor_encodings:
+            continue
+        label = len(names)
+        names.append(actor_name)
+        for actor_encoding in actor_encodings:
+            labels.append(label)
+            rows.append(actor_encoding)
+
+    encodings = np.asarray(rows, dtype=np.float32).reshape(len(rows), ENCODING_SIZE)
+
+    return {
+        "names": names,
+        "labels": np.asarray(labels, dtype=np.int32),
+        "encodings": np.ascontiguousarray(encodings)
+    }
+
+def is_gallery(actors_db):
+    """Indica si actors_db ya es una galería creada con build_gallery"""
+    return isinstance(actors_db, dict) and isinstance(actors_db.get("encodings"), np.ndarray)
+
+def gallery_size(gallery):
+    """Devuelve el número de actores de una galería"""
+    return len(gallery["names"]) if gallery else 0
+
+def encoding_distances(faces, known):
+    """
+    Calcula la distancia euclídea entre dos conjuntos de encodings
+
+    Args:
+        faces: Matriz F x 128 de encodings
+        known: Matriz N x 128 de encodings
+
+    Returns:
+        Matriz float32 F x N de distancias
+    """
+    faces = np.asarray(faces, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    known = np.asarray(known, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab, sin crear la matriz F x N x 128
+    squared = (
+        np.einsum("ij,ij->i", faces, faces)[:, None] +
+        np.einsum("ij,ij->i", known, known)[None, :] -
+        2.0 * faces @ known.T
+    )
+    return np.sqrt(np.maximum(squared, 0.0))
+
+def get_actor_offsets(gallery):
+    """Devuelve el rango de filas de cada actor (las filas son contiguas por actor)"""
+    counts = np.bincount(np.asarray(gallery["labels"]), minlength=len(gallery["names"]))
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+def _select_medoids(encodings, k):
+    """
+    Elige k encodings representativos (k-medoides, fase BUILD de PAM)
+
+    Args:
+        encodings: Matriz n x 128 de un actor
+        k: Número de medoides
+
+    Returns:
+        Lista de índices de los medoides
+    """
+    distances = encoding_distances(encodings, encodings)
+    medoids = [int(distances.sum(axis=1).argmin())]
+    nearest = distances[medoids[0]].copy()
+
+    while len(medoids) < k:
+        # Añadir el encoding que más reduce la distancia total al medoide más cercano
+        gains = np.maximum(nearest[None, :] - distances, 0.0).sum(axis=1)
+        gains[medoids] = -1.0
+        candidate = int(gains.argmax())
+        if gains[candidate] <= 0:
+            break
+        medoids.append(candidate)
+        nearest = np.minimum(nearest, distances[candidate])
+
+    return medoids
+
+def compute_prototypes(gallery, max_prototypes=DEFAULT_MAX_PROTOTYPES, diversity=DEFAULT_DIVERSITY,
+                       margin=DEFAULT_THRESHOLD_MARGIN, floor=DEFAULT_THRESHOLD_FLOOR, cap=DEFAULT_THRESHOLD_CAP):
+    """
+    Calcula los prototipos, la dispersión y el umbral de cada actor
+
+    Cada actor se resume con su centroide; si sus fotos son diversas (alguna
+    se aleja del centroide más de `diversity`) se usan k-medoides. El umbral
+    de cada actor es la distancia máxima entre sus propias fotos más un
+    margen, acotado entre `floor` y `cap` (`cap` si solo hay una foto).
+
+    Args:
+        gallery: Galería de actores
+        max_prototypes: Número máximo de prototipos por actor
+        diversity: Distancia al centroide que activa los k-medoides
+        margin: Margen añadido a la dispersión del actor
+        floor: Umbral mínimo por actor
+        cap: Umbral máximo por actor
+
+    Returns:
+        Diccionario con "prototypes" (P x 128), "prototype_labels", "spread"
+        (distancia media al centroide) y "thresholds" por actor
+    """
+    encodings = np.asarray(gallery["encodings"], dtype=np.float32)
+    offsets = get_actor_offsets(gallery)
+    n_actors = len(gallery["names"])
+
+    prototypes = []
+    prototype_labels = []
+    spread = np.zeros(n_actors, dtype=np.float32)
+    thresholds = np.full(n_actors, cap, dtype=np.float32)
+
+    for label in range(n_actors):
+        actor_encodings = encodings[offsets[label]:offsets[label + 1]]
+        if not len(actor_encodings):
+            continue
+
+        centroid = actor_encodings.mean(axis=0)
+        to_centroid = encoding_distances(actor_encodings, centroid)[:, 0]
+        spread[label] = to_centroid.mean()
+
+        if len(actor_encodings) > 1:
+            intra = encoding_distances(actor_encodings, actor_encodings).max()
+            thresholds[label] = min(cap, max(floor, intra + margin))
+
+        if len(actor_encodings) > 2 and to_centroid.max() > diversity:
+            medoids = _select_medoids(actor_encodings, min(max_prototypes, len(actor_encodings)))
+            actor_prototypes = actor_encodings[medoids]
+        else:
+            actor_prototypes = centroid[None, :]
+
+        prototypes.append(actor_prototypes)
+        prototype_labels.extend([label] * len(actor_prototypes))
+
+    return {
+        "prototypes": np.concatenate(prototypes).astype(np.float32) if prototypes
+                      else np.zeros((0, ENCODING_SIZE), dtype=np.float32),
+        "prototype_labels": np.asarray(prototype_labels, dtype=np.int32),
+        "spread": spread,
+        "thresholds": thresholds
+    }
+
+def _read_generation(gallery_file):
+    """
+    Lee el identificador de escritura guardado al final del .npy de una galería
+
+    Returns:
+        Identificador o None si el archivo no lo tiene (galerías antiguas)
+    """
+    size = len(GENERATION_MAGIC) + GENERATION_SIZE
+    with open(gallery_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < size:
+            return None
+        f.seek(-size, os.SEEK_END)
+        trailer = f.read(size)
+
+    if not trailer.startswith(GENERATION_MAGIC):
+        return None
+    return trailer[len(GENERATION_MAGIC):].decode("ascii", errors="replace")
+
+def get_prototypes_file(gallery_file):
+    """Devuelve la ruta del archivo de prototipos de una galería"""
+    return os.path.splitext(gallery_file)[0] + ".prototypes.npz"
+
+def save_prototypes(prototypes, gallery, gallery_file):
+    """
+    Guarda los prototipos de una galería junto a ella
+
+    Args:
+        prototypes: Resultado de compute_prototypes
+        gallery: Galería a la que corresponden
+        gallery_file: Ruta al archivo .npy de la galería
+
+    Returns:
+        True si se guarda correctamente, False si hay error
+    """
+    prototypes_file = get_prototypes_file(gallery_file)
+
+    try:
+        tmp_file = prototypes_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, rows=np.int64(len(gallery["encodings"])),
+                     generation=np.str_(gallery.get("generation") or ""), **prototypes)
+        _replace_file(tmp_file, prototypes_file)
+
+        log_print(f"Prototipos de actores guardados: {len(prototypes['prototypes'])} "
+                  f"para {gallery_size(gallery)} actores")
+        return True
+    except Exception as e:
+        log_print(f"Error guardando prototipos de actores: {e}", logging.ERROR)
+        return False
+
+def load_prototypes(gallery_file, rows, generation=None):
+    """
+    Carga los prototipos guardados junto a una galería
+
+    Args:
+        gallery_file: Ruta al archivo .npy de la galería
+        rows: Número de filas de la galería cargada
+        generation: Identificador de escritura de la galería cargada
+
+    Returns:
+        Diccionario de prototipos o None si no existen o no corresponden a la galería
+    """
+    prototypes_file = get_prototypes_file(gallery_file)
+    if not os.path.exists(prototypes_file):
+        return None
+
+    try:
+        with np.load(prototypes_file) as data:
+            saved_generation = str(data["generation"]) if "generation" in data.files else None
+            if int(data["rows"]) != rows or (generation and saved_generation and saved_generation != generation):
+                log_print("Los prototipos no corresponden a la galería actual. Se ignoran.", logging.WARNING)
+                return None
+            return {key: data[key] for key in ("prototypes", "prototype_labels", "spread", "thresholds")}
+    except Exception as e:
+        log_print(f"Error cargando prototipos de actores: {e}", logging.ERROR)
+        return None
+
+def remove_derived_files(gallery_file):
+    """Elimina los prototipos e índices ANN calculados a partir de una galería"""
+    base = os.path.splitext(gallery_file)[0]
+    for derived_file in glob.glob(glob.escape(base) + ".*.idx") + [get_prototypes_file(gallery_file)]:
+        try:
+            os.remove(derived_file)
+        except OSError:
+            pass
+
+def get_meta_file(gallery_file):
+    """Devuelve la ruta del archivo de metadatos (nombres) de una galería"""
+    return os.path.splitext(gallery_file)[0] + ".meta.json"
+
+def get_extra_file(gallery_file):
+    """Devuelve la ruta del archivo de datos adicionales (origen de cada fila) de una galería"""
+    return os.path.splitext(gallery_file)[0] + ".extra.json"
+
+def _replace_file(tmp_file, target_file):
+    """Sustituye un archivo de forma atómica"""
+    try:
+        os.replace(tmp_file, target_file)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def save_gallery(gallery, gallery_file):
+    """
+    Guarda una galería en formato binario
+
+    La matriz se guarda en un .npy (float32, N x 128) y los nombres junto con
+    la versión del formato en un JSON de metadatos. Cada archivo se escribe
+    en un temporal y se sustituye de forma atómica, pero el par no: ambos
+    guardan un identificador de escritura y load_gallery rechaza (y
+    reintenta) una matriz que no corresponde a sus metadatos. Los datos
+    adicionales (ej. origen de cada fila) van en un JSON aparte para que los
+    workers no tengan que leerlos al cargar la galería.
+
+    Si gallery ya es una galería, se le asigna el identificador de escritura
+    ("generation") para poder guardar después sus prototipos.
+
+    Args:
+        gallery: Galería de actores (ver build_gallery) o diccionario de encodings
+        gallery_file: Ruta al archivo .npy de la galería
+
+    Returns:
+        True si se guarda correctamente, False si hay error
+    """
+    source = gallery
+    gallery = build_gallery(gallery)
+    labels = np.asarray(gallery["labels"])
+    generation = uuid.uuid4().hex
+
+    # Las filas de cada actor deben ser contiguas para guardar solo los recuentos
+    if len(labels) and np.any(np.diff(labels) < 0):
+        order = np.argsort(labels, kind="stable")
+        labels = labels[order]
+        gallery = dict(gallery, labels=labels, encodings=np.asarray(gallery["encodings"])[order])
+
+    meta = {
+        "format": GALLERY_FORMAT,
+        "version": GALLERY_VERSION,
+        "dim": ENCODING_SIZE,
+        "rows": int(len(labels)),
+        "names": list(gallery["names"]),
+        "counts": np.bincount(labels, minlength=len(gallery["names"])).tolist(),
+        "generation": generation
+    }
+
+    meta_file = get_meta_file(gallery_file)
+    extra_file = get_extra_file(gallery_file)
+
+    try:
+        os.makedirs(os.path.dirname(gallery_file) or ".", exist_ok=True)
+
+        # Los prototipos e índices de la galería anterior ya no son válidos; se
+        # eliminan antes de sustituirla para que nadie los combine con la nueva
+        remove_derived_files(gallery_file)
+
+        # Conservar los datos adicionales de la galería (ej. origen de cada fila)
+        tmp_extra = extra_file + ".tmp"
+        with open(tmp_extra, 'w', encoding='utf-8') as f:
+            json.dump(dict(gallery.get("extra", {}), generation=generation), f, ensure_ascii=False)
+        _replace_file(tmp_extra, extra_file)
+
+        tmp_file = gallery_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            np.save(f, np.ascontiguousarray(gallery["encodings"], dtype=np.float32))
+            f.write(GENERATION_MAGIC + generation.encode("ascii"))
+        _replace_file(tmp_file, gallery_file)
+
+        tmp_meta = meta_file + ".tmp"
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        _replace_file(tmp_meta, meta_file)
+
+        if is_gallery(source):
+            source["generation"] = generation
+
+        log_print(f"Galería de actores guardada: {len(meta['names'])} actores, {meta['rows']} encodings")
+        return True
+    except Exception as e:
+        log_print(f"Error guardando galería de actores: {e}", logging.ERROR)
+        return False
+
+def load_gallery(gallery_file, mmap=True, extra=False):
+    """
+    Carga una galería binaria
+
+    Con mmap la matriz se proyecta en memoria sin copiarla, de modo que todos
+    los workers comparten las mismas páginas del sistema operativo.
+
+    Args:
+        gallery_file: Ruta al archivo .npy de la galería
+        mmap: True para proyectar la matriz en memoria (solo lectura)
+        extra: True para cargar también los datos adicionales (ver save_gallery)
+
+    Returns:
+        Galería de actores o diccionario vacío si no existe o no es válida
+    """
+    meta_file = get_meta_file(gallery_file)
+
+    if not os.path.exists(gallery_file) or not os.path.exists(meta_file):
+        return {}
+
+    try:
+        for attempt in range(LOAD_RETRIES):
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            if meta.get("format") != GALLERY_FORMAT or meta.get("version") != GALLERY_VERSION:
+                log_print(f"Formato de galería no compatible en {meta_file}", logging.ERROR)
+                return {}
+
+            generation = meta.get("generation")
+            before = _read_generation(gallery_file)
+            encodings = np.load(gallery_file, mmap_mode="r" if mmap else None)
+
+            # Matriz y metadatos de la misma escritura (las galerías antiguas
+            # no tienen identificador y solo se comprueban las dimensiones);
+            # se relee el identificador por si el .npy se sustituyó al cargarlo
+            if (encodings.shape == (meta["rows"], meta["dim"]) and sum(meta["counts"]) == meta["rows"]
+                    and before == generation and _read_generation(gallery_file) == generation):
+                break
+
+            # Probablemente otra escritura está sustituyendo los archivos
+            if attempt < LOAD_RETRIES - 1:
+                time.sleep(LOAD_RETRY_DELAY)
+        else:
+            log_print(f"Galería de actores incompleta o dañada: {gallery_file}", logging.ERROR)
+            return {}
+
+        labels = np.repeat(np.arange(len(meta["names"]), dtype=np.int32), meta["counts"])
+
+        gallery = {
+            "names": meta["names"],
+            "labels": labels,
+            "encodings": encodings,
+            "extra": load_extra(gallery_file, generation) if extra else {},
+            "generation": generation
+        }
+
+        prototypes = load_prototypes(gallery_file, meta["rows"], generation)
+        if prototypes is not None:
+            prototypes["offsets"] = get_actor_offsets(gallery)
+            gallery["prototypes"] = prototypes
+
+        return gallery
+    except Exception as e:
+        log_print(f"Error cargando galería de actores: {e}", logging.ERROR)
+        return {}
+
+def load_extra(gallery_file, generation=None):
+    """
+    Carga los datos adicionales guardados junto a una galería
+
+    Args:
+        gallery_file: Ruta al archivo .npy de la galería
+        generation: Identificador de escritura de la galería cargada
+
+    Returns:
+        Diccionario de datos adicionales (vacío si no existen o no corresponden a la galería)
+    """
+    extra_file = get_extra_file(gallery_file)
+    if not os.path.exists(extra_file):
+        return {}
+
+    try:
+        with open(extra_file, 'r', encoding='utf-8') as f:
+            extra = json.load(f)
+    except Exception as e:
+        log_print(f"Error cargando datos adicionales de la galería: {e}", logging.WARNING)
+        return {}
+
+    if extra.pop("generation", None) != generation:
+        log_print("Los datos adicionales no corresponden a la galería actual. Se ignoran.", logging.WARNING)
+        return {}
+    return extra
+
+def convert_json_to_gallery(json_file, gallery_file):
+    """
+    Convierte la base de datos JSON de encodings al formato binario
+
+    Args:
+        json_file: Ruta al JSON {nombre_actor: [lista_de_encodings]}
+        gallery_file: Ruta al archivo .npy de la galería
+
+    Returns:
+        Número de actores convertidos (0 si hay error)
+    """
+    if not os.path.exists(json_file):
+        log_print(f"No se encontró la base de datos {json_file}", logging.ERROR)
+        return 0
+
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            gallery = build_gallery(json.load(f))
+    except Exception as e:
+        log_print(f"Error leyendo {json_file}: {e}", logging.ERROR)
+        return 0
+
+    if not save_gallery(gallery, gallery_file):
+        return 0
+
+    return gallery_size(gallery)
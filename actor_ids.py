@@ -0,0 +1,80 @@
+"""
+Mapa de nombres de actores a IDs de persona en TMDb
+
+Módulo sin dependencias pesadas: lo usan tanto la búsqueda en TMDb como la
+gestión de la base de datos de actores.
+"""
+
+import os
+import json
+import logging
+import threading
+from utils import log_print
+
+# Mapa nombre de actor -> ID de persona en TMDb cargado en este proceso
+_actor_ids_cache = {}
+_actor_ids_mtime = None
+
+# Evita que dos hilos de descarga reescriban el mapa a la vez
+_actor_ids_lock = threading.Lock()
+
+def load_actor_ids(ids_file):
+    """
+    Carga el mapa de nombres de actores a IDs de persona en TMDb
+    
+    El mapa se mantiene en memoria y solo se vuelve a leer si el archivo cambia.
+    
+    Args:
+        ids_file: Ruta al archivo JSON del mapa
+        
+    Returns:
+        Diccionario {nombre_actor: id_tmdb}
+    """
+    global _actor_ids_cache, _actor_ids_mtime
+    
+    if not os.path.exists(ids_file):
+        return {}
+    
+    try:
+        mtime = os.path.getmtime(ids_file)
+        if mtime != _actor_ids_mtime:
+            with open(ids_file, 'r', encoding='utf-8') as f:
+                _actor_ids_cache = json.load(f)
+            _actor_ids_mtime = mtime
+        return _actor_ids_cache
+    except Exception as e:
+        log_print(f"Error cargando IDs de actores: {e}", logging.ERROR)
+        return {}
+
+def save_actor_ids(ids_file, new_ids):
+    """
+    Añade entradas al mapa de IDs de actores
+    
+    Se relee el archivo antes de escribir y se reemplaza de forma atómica
+    para no perder entradas guardadas por otros procesos.
+    
+    Args:
+        ids_file: Ruta al archivo JSON del mapa
+        new_ids: Diccionario {nombre_actor: id_tmdb} a añadir
+        
+    Returns:
+        True si se guarda correctamente, False si hay error
+    """
+    try:
+        with _actor_ids_lock:
+            actor_ids = {}
+            if os.path.exists(ids_file):
+                with open(ids_file, 'r', encoding='utf-8') as f:
+                    actor_ids = json.load(f)
+            
+            actor_ids.update(new_ids)
+            
+            os.makedirs(os.path.dirname(ids_file), exist_ok=True)
+            tmp_file = f"{ids_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(actor_ids, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_file, ids_file)
+        return True
+    except Exception as e:
+        log_print(f"Error guardando IDs de actores: {e}", logging.ERROR)
+        return False
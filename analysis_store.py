@@ -0,0 +1,141 @@
+"""
+Almacén persistente (SQLite) del análisis de cada video
+
+Cada etapa completada (contenido, estudios, actores y resultado final) se
+guarda por huella del archivo, de modo que si el procesamiento se
+interrumpe, al repetirlo solo se ejecutan las etapas pendientes. La huella
+depende del contenido, así que un archivo movido o renombrado se reconoce.
+"""
+
+import json
+import time
+import logging
+from config import ANALYSIS_STORE_FILE
+from utils import log_print, get_sqlite_connection
+
+STORE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        fingerprint TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS stages (
+        fingerprint TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        params TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (fingerprint, stage)
+    );
+"""
+
+def analysis_store_enabled(config):
+    """Indica si el almacén de análisis está activado en la configuración"""
+    if not config:
+        return False
+    return bool(config["processing"].get("analysis_store", True))
+
+def load_analysis(fingerprint, filepath=None, db_file=ANALYSIS_STORE_FILE):
+    """
+    Obtiene todas las etapas guardadas de un video
+
+    Args:
+        fingerprint: Huella del video (ver utils.file_fingerprint)
+        filepath: Ruta actual del video; si cambió (archivo movido o
+                  renombrado) se actualiza el registro
+        db_file: Ruta a la base de datos del almacén
+
+    Returns:
+        Diccionario {etapa: (parámetros, datos)} (vacío si no hay nada guardado)
+    """
+    if not fingerprint:
+        return {}
+
+    try:
+        conn = get_sqlite_connection(db_file, STORE_SCHEMA)
+        rows = conn.execute(
+            "SELECT stage, params, data FROM stages WHERE fingerprint = ?", (fingerprint,)
+        ).fetchall()
+
+        if filepath:
+            row = conn.execute("SELECT path FROM files WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if row is not None and row[0] != filepath:
+                log_print(f"Video ya analizado en otra ruta: {row[0]}", logging.DEBUG)
+            conn.execute(
+                "INSERT OR REPLACE INTO files (fingerprint, path, updated) VALUES (?, ?, ?)",
+                (fingerprint, filepath, time.time())
+            )
+
+        return {stage: (params, json.loads(data)) for stage, params, data in rows}
+    except Exception as e:
+        log_print(f"Error leyendo almacén de análisis: {e}", logging.WARNING)
+        return {}
+
+def get_stage(stored, stage, params=""):
+    """
+    Devuelve los datos de una etapa guardada si se calculó con los mismos parámetros
+
+    Args:
+        stored: Resultado de load_analysis
+        stage: Nombre de la etapa
+        params: Parámetros actuales de la etapa (ej. firma de la galería)
+
+    Returns:
+        Datos de la etapa o None si no existe o está desactualizada
+    """
+    entry = stored.get(stage)
+    if entry is None or entry[0] != params:
+        return None
+    return entry[1]
+
+def store_stage(fingerprint, stage, data, params="", db_file=ANALYSIS_STORE_FILE):
+    """
+    Guarda el resultado de una etapa del análisis
+
+    Args:
+        fingerprint: Huella del video
+        stage: Nombre de la etapa ("content", "studios", "actors", "result")
+        data: Datos serializables en JSON
+        params: Parámetros con los que se calculó (invalidan la etapa si cambian)
+        db_file: Ruta a la base de datos del almacén
+
+    Returns:
+        True si se guarda, False si hay error
+    """
+    if not fingerprint:
+        return False
+
+    try:
+        conn = get_sqlite_connection(db_file, STORE_SCHEMA)
+        conn.execute(
+            "INSERT OR REPLACE INTO stages (fingerprint, stage, params, data, updated) VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, stage, params, json.dumps(data, ensure_ascii=False), time.time())
+        )
+        return True
+    except Exception as e:
+        log_print(f"Error guardando etapa '{stage}' en el almacén de análisis: {e}", logging.WARNING)
+        return False
+
+def clear_analysis(fingerprint=None, db_file=ANALYSIS_STORE_FILE):
+    """
+    Elimina análisis guardados
+
+    Args:
+        fingerprint: Huella de un video concreto (None para vaciar todo el almacén)
+        db_file: Ruta a la base de datos del almacén
+
+    Returns:
+        Número de etapas eliminadas
+    """
+    try:
+        conn = get_sqlite_connection(db_file, STORE_SCHEMA)
+        if fingerprint is None:
+            conn.execute("DELETE FROM files")
+            cursor = conn.execute("DELETE FROM stages")
+        else:
+            conn.execute("DELETE FROM files WHERE fingerprint = ?", (fingerprint,))
+            cursor = conn.execute("DELETE FROM stages WHERE fingerprint = ?", (fingerprint,))
+        return cursor.rowcount
+    except Exception as e:
+        log_print(f"Error vaciando almacén de análisis: {e}", logging.ERROR)
+        return 0
@@ -3,6 +3,7 @@ Configuración global y funciones de carga/guardado para el sistema VideoSort
 """
 
 import os
+import copy
 import json
 import logging
 from pathlib import Path
@@ -24,10 +25,16 @@ TEMP_AUDIO_DIR = os.path.join(TEMP_DIR, "audio")
 # Archivos de configuración
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
 ACTORS_DB_FILE = os.path.join(DATA_DIR, "actors_db.json")
+ACTORS_GALLERY_FILE = os.path.join(DATA_DIR, "actors_gallery.npy")
+ACTOR_IDS_FILE = os.path.join(DATA_DIR, "actor_ids.json")
 LOGOS_DB_FILE = os.path.join(DATA_DIR, "logos_db.json")
 STUDIOS_MAPPING_FILE = os.path.join(DATA_DIR, "studios_mapping.json")
 PROCESSED_CSV_FILE = os.path.join(OUTPUT_DIR, "processed_videos.csv")
 ACTORS_CSV_FILE = os.path.join(OUTPUT_DIR, "actors_videos.csv")
+TMDB_CACHE_FILE = os.path.join(DATA_DIR, "tmdb_cache.sqlite")
+TMDB_INDEX_FILE = os.path.join(DATA_DIR, "tmdb_index.sqlite")
+FACE_CACHE_FILE = os.path.join(DATA_DIR, "face_cache.sqlite")
+ANALYSIS_STORE_FILE = os.path.join(DATA_DIR, "analysis_store.sqlite")
 
 # Configuración predeterminada
 DEFAULT_CONFIG = {
@@ -52,13 +59,52 @@ DEFAULT_CONFIG = {
         "detect_studios": True,
         "rename_files": True,
         "output_language": "en",
-        "min_confidence": 0.6
+        "min_confidence": 0.6,
+        "face_index": "brute",
+        "face_index_nprobe": 8,
+        "face_prototypes": True,
+        "face_cluster_distance": 0.5,
+        "actor_min_votes": 2,
+        "face_detection_model": "hog",
+        "face_detection_upsample": 1,
+        "face_detection_max_dimension": 1280,
+        "face_detection_batch_size": 8,
+        "face_prescreen": "haar",
+        "face_prescreen_audit": False,
+        "face_cache": True,
+        "analysis_store": True,
+        "subtitle_languages": ["spa", "eng"],
+        "subtitle_max_cues": 50,
+        "subtitle_max_seconds": 900,
+        "local_index": True,
+        "local_index_similarity": 0.92,
+        "local_index_min_popularity": 1.0,
+        "match_min_score": 0.4,
+        "fetch_episode_details": True
+    },
+    "tmdb": {
+        "timeout": 15,
+        "pool_size": 10,
+        "max_retries": 3,
+        "backoff_factor": 0.5,
+        "requests_per_second": 35,
+        "burst": 35,
+        "cache_enabled": True,
+        "cache_max_entries": 50000,
+        "cache_ttl_days": {
+            "search": 7,
+            "details": 30,
+            "person": 30,
+            "popular": 1,
+            "negative": 1
+        }
     },
     "output": {
         "movies_dir": "Movies",
         "shows_dir": "Shows",
         "unknown_dir": "Unknown",
-        "studios_dir": "ByStudio"
+        "studios_dir": "ByStudio",
+        "episode_titles": False
     }
 }
 
@@ -73,6 +119,15 @@ def create_directories():
         os.makedirs(directory, exist_ok=True)
         logging.debug(f"Directorio creado o verificado: {directory}")
 
+def merge_defaults(config, defaults):
+    """Completa la configuración con las claves predeterminadas que falten"""
+    for key, value in defaults.items():
+        if key not in config:
+            config[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(config[key], dict):
+            merge_defaults(config[key], value)
+    return config
+
 def load_config():
     """Carga la configuración desde archivo o crea una nueva si no existe"""
     if os.path.exists(CONFIG_FILE):
@@ -80,7 +135,8 @@ def load_config():
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
             logging.debug("Configuración cargada correctamente")
-            return config
+            # Configuraciones antiguas pueden no tener secciones nuevas
+            return merge_defaults(config, DEFAULT_CONFIG)
         except Exception as e:
             logging.error(f"Error cargando configuración: {e}")
     
@@ -0,0 +1,126 @@
+"""
+Caché persistente (SQLite) de rostros detectados por fotograma
+"""
+
+import json
+import time
+import logging
+import numpy as np
+from config import FACE_CACHE_FILE
+from utils import log_print, get_sqlite_connection
+from actor_gallery import ENCODING_SIZE
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS faces (
+        fingerprint TEXT NOT NULL,
+        timestamp REAL NOT NULL,
+        detector TEXT NOT NULL,
+        locations TEXT NOT NULL,
+        encodings BLOB,
+        created REAL NOT NULL,
+        PRIMARY KEY (fingerprint, timestamp, detector)
+    );
+"""
+
+def face_cache_enabled(config):
+    """Indica si la caché de rostros está activada en la configuración"""
+    if not config:
+        return False
+    return bool(config["processing"].get("face_cache", True))
+
+def detector_key(detector):
+    """
+    Genera la parte de la clave que depende del detector
+
+    Un cambio de modelo, ampliación, tamaño o filtro previo produce rostros
+    distintos, así que invalida las entradas anteriores.
+
+    Args:
+        detector: Parámetros del detector (ver actor_detect.get_detector_settings)
+
+    Returns:
+        String con los parámetros relevantes
+    """
+    return (f"{detector['model']}:{detector['upsample']}:"
+            f"{detector['max_dimension']}:{detector.get('prescreen', 'off')}")
+
+def get_cached_faces(fingerprint, timestamp, detector, db_file=FACE_CACHE_FILE):
+    """
+    Busca los rostros guardados de un fotograma
+
+    Args:
+        fingerprint: Huella del video (ver utils.file_fingerprint)
+        timestamp: Segundo del fotograma
+        detector: Parámetros del detector
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        (ubicaciones, encodings) o None si no está en caché
+    """
+    try:
+        conn = get_sqlite_connection(db_file, CACHE_SCHEMA)
+        row = conn.execute(
+            "SELECT locations, encodings FROM faces WHERE fingerprint = ? AND timestamp = ? AND detector = ?",
+            (fingerprint, round(float(timestamp), 3), detector_key(detector))
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        locations = [tuple(location) for location in json.loads(row[0])]
+        encodings = np.frombuffer(row[1], dtype=np.float32).reshape(-1, ENCODING_SIZE) if row[1] else []
+        return locations, list(encodings)
+    except Exception as e:
+        log_print(f"Error leyendo caché de rostros: {e}", logging.WARNING)
+        return None
+
+def store_faces(fingerprint, timestamp, detector, locations, encodings, db_file=FACE_CACHE_FILE):
+    """
+    Guarda los rostros detectados en un fotograma (también si no hay ninguno)
+
+    Args:
+        fingerprint: Huella del video
+        timestamp: Segundo del fotograma
+        detector: Parámetros del detector
+        locations: Lista de (top, right, bottom, left)
+        encodings: Lista de encodings de 128 valores
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        True si se guarda, False si hay error
+    """
+    try:
+        conn = get_sqlite_connection(db_file, CACHE_SCHEMA)
+        blob = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE).tobytes() if len(encodings) else None
+        conn.execute(
+            "INSERT OR REPLACE INTO faces (fingerprint, timestamp, detector, locations, encodings, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (fingerprint, round(float(timestamp), 3), detector_key(detector),
+             json.dumps([list(map(int, location)) for location in locations]), blob, time.time())
+        )
+        return True
+    except Exception as e:
+        log_print(f"Error guardando caché de rostros: {e}", logging.WARNING)
+        return False
+
+def clear_face_cache(fingerprint=None, db_file=FACE_CACHE_FILE):
+    """
+    Elimina rostros guardados
+
+    Args:
+        fingerprint: Huella de un video concreto (None para vaciar toda la caché)
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        Número de fotogramas eliminados
+    """
+    try:
+        conn = get_sqlite_connection(db_file, CACHE_SCHEMA)
+        if fingerprint is None:
+            cursor = conn.execute("DELETE FROM faces")
+        else:
+            cursor = conn.execute("DELETE FROM faces WHERE fingerprint = ?", (fingerprint,))
+        return cursor.rowcount
+    except Exception as e:
+        log_print(f"Error vaciando caché de rostros: {e}", logging.ERROR)
+        return 0
@@ -134,7 +134,7 @@ def create_movie_path(base_dir, title, year, quality, extension):
     
     return movie_dir, movie_file
 
-def create_tv_path(base_dir, title, year, season, episode, quality, extension):
+def create_tv_path(base_dir, title, year, season, episode, quality, extension, episode_title=None):
     """
     Crea la ruta para un episodio de serie siguiendo una estructura estándar
     
@@ -146,6 +146,7 @@ def create_tv_path(base_dir, title, year, season, episode, quality, extension):
         episode: Número de episodio
         quality: Calidad del video (1080p, etc.)
         extension: Extensión del archivo (.mp4, etc.)
+        episode_title: Título del episodio en TMDb (opcional)
         
     Returns:
         Tupla (ruta_directorio, ruta_archivo)
@@ -160,7 +161,10 @@ def create_tv_path(base_dir, title, year, season, episode, quality, extension):
     # Crear nombres de carpetas y archivo
     series_folder = f"{safe_title} ({year})"
     season_folder = f"Season {season_str}"
-    file_name = f"{safe_title} S{season_str}E{episode_str} [{quality}]{extension}"
+    if episode_title:
+        file_name = f"{safe_title} S{season_str}E{episode_str} - {sanitize_filename(episode_title)} [{quality}]{extension}"
+    else:
+        file_name = f"{safe_title} S{season_str}E{episode_str} [{quality}]{extension}"
     
     # Rutas completas
     season_dir = os.path.join(base_dir, "Shows", series_folder, season_folder)
@@ -193,7 +197,7 @@ def create_studio_path(base_dir, studio_name, original_filename):
     
     return studio_dir, file_path
 
-def process_file_operation(source_path, result_info, output_dir, backup_file):
+def process_file_operation(source_path, result_info, output_dir, backup_file, episode_titles=False):
     """
     Procesa una operación de archivo completa (mover y registrar)
     
@@ -202,6 +206,8 @@ def process_file_operation(source_path, result_info, output_dir, backup_file):
         result_info: Diccionario con información de identificación y destino
         output_dir: Directorio base para la salida
         backup_file: Archivo CSV para respaldo
+        episode_titles: True para añadir el título del episodio al nombre
+                        ("Serie S01E02 - Título [calidad]")
         
     Returns:
         Diccionario con resultado de la operación
@@ -243,7 +249,13 @@ def process_file_operation(source_path, result_info, output_dir, backup_file):
                 season = result_info.get("season", 1)
                 episode = result_info.get("episode", 1)
                 
-                dest_dir, dest_file = create_tv_path(output_dir, title, year, season, episode, quality, extension)
+                # Título del episodio (opcional) solo si TMDb confirma que existe
+                episode_title = None
+                if episode_titles:
+                    episode_title = (result_info.get("episode_info") or {}).get("name")
+                
+                dest_dir, dest_file = create_tv_path(output_dir, title, year, season, episode, quality, extension,
+                                                     episode_title)
         else:
             # No identificado, organizar por estudio
             studio = result_info.get("detected_studios", ["Unknown"])[0] if result_info.get("detected_studios") else None
@@ -10,18 +10,77 @@ import subprocess
 from pathlib import Path
 from multiprocessing import Pool
 from functools import partial
+from dataclasses import asdict
 from tqdm import tqdm
 from datetime import datetime
 
 # Importar módulos del sistema
-from config import load_config, TEMP_DIR, ACTORS_DB_FILE, LOGOS_DIR, STUDIOS_MAPPING_FILE, PROCESSED_CSV_FILE, ACTORS_CSV_FILE
-from utils import log_print, clean_filename, is_valid_video
+from config import load_config, TEMP_DIR, LOGOS_DIR, PROCESSED_CSV_FILE, ACTORS_CSV_FILE
+from utils import log_print, clean_filename, is_valid_video, file_fingerprint
 from video_analysis import get_video_quality, analyze_video_content, extract_season_episode_from_filename, extract_year_from_filename
-from tmdb_api import search_tmdb_multilang, search_by_actors
-from studio_detect import load_studios_mapping, detect_studios_in_frames
-from actor_detect import load_actors_db, detect_actors_in_frames
+from video_analysis import read_frames, restore_probe
+from tmdb_api import search_tmdb_queries, search_by_actors, get_season_details, get_episode_from_season
+from tmdb_index import index_enabled, lookup_local_title, add_result_to_index
+from studio_detect import detect_studios_in_frames
+from actor_detect import detect_actor_votes, get_detector_settings, new_prescreen_stats, log_prescreen_stats
 from actor_db import register_actors_for_video
+from face_cache import face_cache_enabled, detector_key
+from analysis_store import analysis_store_enabled, load_analysis, get_stage, store_stage
+from tmdb_cache import cache_enabled
 from files_ops import process_file_operation, append_to_backup
+from tmdb_client import set_rate_limiter
+from rate_limit import create_rate_limiter, log_rate_limiter_stats
+from resources import preload_resources, get_actors_gallery, get_actors_ann_index, get_studios_mapping, get_logo_templates
+from resources import get_actors_signature, get_studios_signature
+
+def init_worker(rate_limiter, config=None):
+    """
+    Inicializa un worker del Pool
+    
+    Args:
+        rate_limiter: Limitador de peticiones a TMDb compartido por todos los workers
+        config: Configuración del sistema (si se indica, se cargan los recursos
+                de detección una sola vez para todo el worker)
+    """
+    set_rate_limiter(rate_limiter)
+    
+    if config is not None:
+        preload_resources(config)
+
+def get_stage_params(config):
+    """
+    Calcula los parámetros de cada etapa guardada en el almacén de análisis
+    
+    Una etapa guardada solo se reutiliza si sus parámetros no han cambiado;
+    el resultado final depende también de los de las etapas anteriores.
+    
+    Args:
+        config: Configuración del sistema
+        
+    Returns:
+        Diccionario {etapa: parámetros}
+    """
+    processing = config["processing"]
+    params = {
+        "content": repr((
+            processing["capture_frames"], processing.get("subtitle_languages"),
+            processing.get("subtitle_max_cues"), processing.get("subtitle_max_seconds")
+        )),
+        "studios": repr(get_studios_signature()),
+        "actors": repr((
+            get_actors_signature(), processing["min_confidence"],
+            processing.get("actor_min_votes", 2), processing.get("face_cluster_distance", 0.5),
+            processing.get("face_index", "brute"), detector_key(get_detector_settings(config))
+        ))
+    }
+    params["result"] = repr((
+        processing["output_language"], processing.get("match_min_score"),
+        processing.get("local_index"), processing.get("local_index_similarity"),
+        params["content"],
+        params["studios"] if processing["detect_studios"] else None,
+        params["actors"] if processing["detect_actors"] else None
+    ))
+    return params
 
 def process_single_video(filepath, config, temp_dir=None):
     """
@@ -47,6 +106,22 @@ def process_single_video(filepath, config, temp_dir=None):
     original_filename = os.path.basename(filepath)
     log_print(f"Procesando video: {original_filename}")
     
+    # Etapas completadas en ejecuciones anteriores (por huella del contenido,
+    # así que también se reconocen archivos movidos o renombrados)
+    fingerprint = file_fingerprint(filepath)
+    store_enabled = analysis_store_enabled(config) and fingerprint is not None
+    stored = load_analysis(fingerprint, filepath) if store_enabled else {}
+    stage_params = get_stage_params(config)
+    
+    # Con --no-cache o --refresh-cache se repite la identificación en TMDb
+    previous = None
+    if cache_enabled(config) and not config["tmdb"].get("cache_revalidate", False):
+        previous = get_stage(stored, "result", stage_params["result"])
+    if previous is not None:
+        log_print(f"Video ya identificado en una ejecución anterior: {original_filename}")
+        previous["face_prescreen"] = new_prescreen_stats()
+        return previous
+    
     # Crear directorio temporal
     if temp_dir is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -55,9 +130,28 @@ def process_single_video(filepath, config, temp_dir=None):
     os.makedirs(temp_dir, exist_ok=True)
     
     try:
-        # 1. Analizar contenido del video
-        log_print("Analizando contenido del video...")
-        content_results = analyze_video_content(filepath, temp_dir, config)
+        # 1. Analizar contenido del video (o recuperarlo del almacén)
+        content_params = stage_params["content"]
+        content_results = get_stage(stored, "content", content_params)
+        content_restored = content_results is not None
+        
+        if content_restored:
+            log_print("Contenido del video ya analizado anteriormente", logging.DEBUG)
+            if content_results.get("probe"):
+                restore_probe(filepath, content_results["probe"])
+            content_results["frames"] = []
+        else:
+            log_print("Analizando contenido del video...")
+            content_results = analyze_video_content(filepath, temp_dir, config)
+            probe = content_results.get("probe")
+            if store_enabled and probe:
+                store_stage(fingerprint, "content", {
+                    "quality": content_results["quality"],
+                    "duration": content_results["duration"],
+                    "subtitles_text": content_results["subtitles_text"],
+                    "ocr_text": content_results["ocr_text"],
+                    "probe": asdict(probe)
+                }, content_params)
         
         # 2. Obtener calidad
         quality = content_results.get("quality", "Unknown")
@@ -68,79 +162,105 @@ def process_single_video(filepath, config, temp_dir=None):
         
         result = None
         is_movie = None
+        found_by_name = False
+        
+        # Datos del video para puntuar los candidatos de TMDb
+        year = extract_year_from_filename(original_filename)
+        hints = {"year": year, "duration": content_results.get("duration")}
         
-        # Intentar primero como película
-        result, is_movie = search_tmdb_multilang(cleaned_name, config, is_series=False)
+        # Consultar primero el índice local (sin red)
+        if index_enabled(config):
+            result, is_movie = lookup_local_title(cleaned_name, config, year=year,
+                                                  duration=content_results.get("duration"))
+            if result:
+                log_print(f"Encontrado en índice local: {result.get('title' if is_movie else 'name', 'Sin título')}")
         
-        # Si no hay resultado, intentar como serie
+        # Película y serie, en todos los idiomas, en una sola tanda concurrente
         if not result:
-            result, is_movie = search_tmdb_multilang(cleaned_name, config, is_series=True)
+            result, is_movie = search_tmdb_queries([cleaned_name], config, hints=hints)
+            found_by_name = bool(result)
         
-        # 4. Si no hay resultado, intentar con texto extraído
+        # 4-5. Si no hay resultado, intentar con texto extraído (OCR y subtítulos)
         if not result and content_results.get("ocr_text"):
-            log_print("Buscando por texto OCR...")
-            ocr_text = content_results["ocr_text"]
-            
             # Dividir en fragmentos significativos (líneas o bloques)
             fragments = []
-            for line in ocr_text.split('\n'):
+            for line in content_results["ocr_text"].split('\n'):
                 if len(line.strip()) > 15:  # Solo líneas con suficiente texto
                     fragments.append(line.strip())
+            ocr_queries = fragments[:5]  # Limitar a los primeros 5
             
-            # Buscar con fragmentos
-            for fragment in fragments[:5]:  # Limitar a los primeros 5
-                result, is_movie = search_tmdb_multilang(fragment, config, is_series=False)
-                if result:
-                    break
-                
-                result, is_movie = search_tmdb_multilang(fragment, config, is_series=True)
-                if result:
-                    break
+            if ocr_queries:
+                # Los fragmentos de OCR se buscan a la vez, en una sola tanda
+                log_print(f"Buscando por texto OCR ({len(ocr_queries)} textos)...")
+                result, is_movie = search_tmdb_queries(ocr_queries, config, hints=hints)
         
-        # 5. Si no hay resultado, intentar con subtítulos
+        # Los subtítulos solo se consultan si el OCR no dio ningún resultado
         if not result and content_results.get("subtitles_text"):
-            log_print("Buscando por subtítulos...")
-            subtitle_text = content_results["subtitles_text"]
+            # Un cue por bloque (ya sin números ni tiempos)
+            blocks = content_results["subtitles_text"].split('\n\n')
+            subtitle_queries = [block.strip() for block in blocks[:5] if block.strip()]  # Limitar a los primeros 5
             
-            # Dividir en bloques
-            blocks = subtitle_text.split('\n\n')
-            for block in blocks[:5]:  # Limitar a los primeros 5
-                # Eliminar líneas de tiempo
-                lines = [l for l in block.split('\n') if not l.strip().startswith('-->')]
-                if lines:
-                    search_text = ' '.join(lines)
-                    
-                    result, is_movie = search_tmdb_multilang(search_text, config, is_series=False)
-                    if result:
-                        break
-                    
-                    result, is_movie = search_tmdb_multilang(search_text, config, is_series=True)
-                    if result:
-                        break
+            if subtitle_queries:
+                log_print(f"Buscando por texto de subtítulos ({len(subtitle_queries)} textos)...")
+                result, is_movie = search_tmdb_queries(subtitle_queries, config, hints=hints)
         
-        # 6. Extraer fotogramas para análisis de actores y estudios
-        frame_files = []
-        if config["processing"]["capture_frames"] and (
-            config["processing"]["detect_actors"] or config["processing"]["detect_studios"]):
-            # Ya tenemos fotogramas extraídos durante el análisis
-            frame_files = [f for f in os.listdir(temp_dir) if f.startswith('frame_') and f.endswith('.png')]
-            frame_files = [os.path.join(temp_dir, f) for f in frame_files]
+        # 6. Estudios y actores guardados con los mismos datos y parámetros
+        detect_studios = config["processing"]["detect_studios"]
+        detect_actors = config["processing"]["detect_actors"]
+        detector = get_detector_settings(config)
+        
+        detected_studios = None
+        studios_params = stage_params["studios"]
+        if detect_studios:
+            detected_studios = get_stage(stored, "studios", studios_params)
+        
+        actor_votes = None
+        actors_params = stage_params["actors"]
+        if detect_actors:
+            actor_votes = get_stage(stored, "actors", actors_params)
+        
+        # Fotogramas ya decodificados en memoria durante el análisis; si el
+        # contenido venía del almacén solo se decodifican si falta alguna etapa
+        frames = content_results.get("frames", [])
+        if content_restored and config["processing"]["capture_frames"] and (
+                (detect_studios and detected_studios is None) or (detect_actors and actor_votes is None)):
+            frames = read_frames(filepath, duration=content_results.get("duration"))
         
         # 7. Detectar estudios
-        detected_studios = []
-        if config["processing"]["detect_studios"] and frame_files:
-            log_print("Detectando estudios/cadenas...")
-            studios_mapping = load_studios_mapping(STUDIOS_MAPPING_FILE)
-            detected_studios = detect_studios_in_frames(frame_files, studios_mapping, LOGOS_DIR)
+        if detected_studios is None:
+            detected_studios = []
+            if detect_studios and frames:
+                log_print("Detectando estudios/cadenas...")
+                detected_studios = detect_studios_in_frames(
+                    frames, get_studios_mapping(), LOGOS_DIR, get_logo_templates()
+                )
+                if store_enabled:
+                    store_stage(fingerprint, "studios", detected_studios, studios_params)
         
         # 8. Detectar actores
-        detected_actors = []
-        if config["processing"]["detect_actors"] and frame_files:
-            log_print("Detectando actores...")
-            actors_db = load_actors_db(ACTORS_DB_FILE)
-            detected_actors = detect_actors_in_frames(
-                frame_files, actors_db, config["processing"]["min_confidence"]
-            )
+        prescreen_stats = new_prescreen_stats()
+        if actor_votes is None:
+            actor_votes = []
+            if detect_actors and frames:
+                log_print("Detectando actores...")
+                actors_db = get_actors_gallery()
+                actor_votes = detect_actor_votes(
+                    frames, actors_db, config["processing"]["min_confidence"],
+                    ann_index=get_actors_ann_index(config),
+                    min_votes=config["processing"].get("actor_min_votes", 2),
+                    cluster_distance=config["processing"].get("face_cluster_distance", 0.5),
+                    detector=detector,
+                    stats=prescreen_stats,
+                    fingerprint=fingerprint if face_cache_enabled(config) else None
+                )
+                log_prescreen_stats(prescreen_stats, logging.DEBUG)
+                if store_enabled:
+                    store_stage(fingerprint, "actors", actor_votes, actors_params)
+        
+        detected_actors = [entry["actor"] for entry in actor_votes]
+        for entry in actor_votes:
+            log_print(f"  - {entry['actor']}: {entry['votes']} fotogramas, "
+                      f"distancia media {entry['distance']:.3f}")
         
         # 9. Si aún no hay resultado y hay actores detectados, buscar por actores
         if not result and detected_actors:
@@ -152,15 +272,21 @@ def process_single_video(filepath, config, temp_dir=None):
         
         # 10. Preparar resultado
         if result:
+            # Guardar en el índice local para los próximos videos del mismo título
+            if index_enabled(config):
+                add_result_to_index(result, is_movie, config, aliases=[cleaned_name] if found_by_name else None)
+            
             # Obtener información de temporada/episodio para series
             season = None
             episode = None
+            episode_guessed = False
             
             if not is_movie:
                 # Intentar extraer de nombre de archivo
                 season, episode = extract_season_episode_from_filename(original_filename)
                 
                 # Si no se pudo extraer, usar valores predeterminados
+                episode_guessed = season is None or episode is None
                 if season is None:
                     season = 1
                 if episode is None:
@@ -174,16 +300,25 @@ def process_single_video(filepath, config, temp_dir=None):
                 )
             
             # Resultado exitoso
-            return {
+            response = {
                 "identificado": True,
                 "es_pelicula": is_movie,
                 "info": result,
                 "quality": quality,
                 "season": season,
                 "episode": episode,
+                "episode_guessed": episode_guessed,
                 "detected_studios": detected_studios,
-                "detected_actors": detected_actors
+                "detected_actors": detected_actors,
+                "actor_votes": actor_votes,
+                "face_prescreen": prescreen_stats
             }
+            
+            # Al repetir el procesamiento este video ya no se vuelve a analizar
+            if store_enabled:
+                store_stage(fingerprint, "result", response, stage_params["result"])
+            
+            return response
         else:
             # No identificado
             return {
@@ -192,6 +327,8 @@ def process_single_video(filepath, config, temp_dir=None):
                 "quality": quality,
                 "detected_studios": detected_studios,
                 "detected_actors": detected_actors,
+                "actor_votes": actor_votes,
+                "face_prescreen": prescreen_stats,
                 "mensaje": "No se pudo identificar"
             }
     
@@ -211,6 +348,51 @@ def process_single_video(filepath, config, temp_dir=None):
             except Exception as e:
                 log_print(f"Error eliminando directorio temporal: {e}", logging.ERROR)
 
+def attach_episode_details(result, config, seasons):
+    """
+    Añade los datos del episodio a un resultado identificado como serie
+    
+    Los episodios de una misma serie y temporada comparten una sola llamada
+    a get_season_details (guardada en `seasons` durante todo el lote) en
+    lugar de una llamada por episodio. No se consulta nada si la temporada y
+    el episodio no salen del nombre de archivo (valores predeterminados).
+    
+    Args:
+        result: Resultado de process_single_video (se modifica)
+        config: Configuración del sistema
+        seasons: Diccionario {(id_serie, temporada): datos} compartido por el lote
+        
+    Returns:
+        Datos del episodio o None si no se encuentra
+    """
+    if not result.get("identificado") or result.get("es_pelicula") or not result.get("info"):
+        return None
+    if result.get("episode_guessed") or result.get("season") is None:
+        return None
+    
+    tv_id = result["info"].get("id")
+    if tv_id is None:
+        return None
+    
+    key = (tv_id, result["season"])
+    if key not in seasons:
+        seasons[key] = get_season_details(tv_id, result["season"], config)
+    season_data = seasons[key]
+    if not season_data:
+        return None
+    
+    episode_info = get_episode_from_season(season_data, result.get("episode"))
+    if episode_info:
+        result["episode_info"] = episode_info
+    else:
+        # La temporada existe pero no tiene ese episodio: el SxxEyy del nombre
+        # no corresponde a esta serie
+        result["episode_missing"] = True
+        log_print(f"La temporada {result['season']} de {result['info'].get('name', tv_id)} "
+                  f"no tiene episodio {result.get('episode')}", logging.WARNING)
+    
+    return episode_info
+
 def process_batch(video_files, config, output_dir, batch_num=1):
     """
     Procesa un lote de videos
@@ -238,75 +420,66 @@ def process_batch(video_files, config, output_dir, batch_num=1):
         "errores": 0
     }
     
+    # Limitador global de peticiones a TMDb para todos los procesos del lote
+    rate_limiter = create_rate_limiter(config)
+    
+    # Datos de temporadas consultados en este lote (una llamada por temporada)
+    seasons = {}
+    prescreen_stats = new_prescreen_stats()
+    
+    def handle_result(video, result):
+        """Completa el episodio y mueve/registra el archivo en cuanto se identifica"""
+        stats["procesados"] += 1
+        
+        for key, value in result.get("face_prescreen", {}).items():
+            prescreen_stats[key] += value
+        
+        if result["identificado"]:
+            stats["identificados"] += 1
+        elif "mensaje" in result and result["mensaje"].startswith("Error"):
+            stats["errores"] += 1
+        else:
+            stats["no_identificados"] += 1
+        
+        if config["processing"].get("fetch_episode_details", True):
+            attach_episode_details(result, config, seasons)
+        
+        # Procesar operación de archivo
+        if config["processing"]["rename_files"]:
+            process_file_operation(video, result, output_dir, batch_backup_file,
+                                   episode_titles=config["output"].get("episode_titles", False))
+        else:
+            # Solo registrar sin mover
+            append_to_backup(batch_backup_file, {
+                "nombre_original": os.path.basename(video),
+                "ruta_original": video,
+                "nombre_nuevo": "",
+                "ruta_nueva": "",
+                "status": "no_action"
+            })
+    
     # Decidir entre procesamiento en paralelo o secuencial
     if config["processing"]["debug"]:
+        init_worker(rate_limiter, config)
+        
         # En modo debug, procesar secuencialmente
-        results = []
         for video in tqdm(video_files, desc=f"Procesando lote {batch_num}", unit="video"):
-            result = process_single_video(video, config)
-            stats["procesados"] += 1
-            
-            if result["identificado"]:
-                stats["identificados"] += 1
-            elif "mensaje" in result and result["mensaje"].startswith("Error"):
-                stats["errores"] += 1
-            else:
-                stats["no_identificados"] += 1
-            
-            # Procesar operación de archivo
-            if config["processing"]["rename_files"]:
-                file_op_result = process_file_operation(video, result, output_dir, batch_backup_file)
-            else:
-                # Solo registrar sin mover
-                file_op_result = {
-                    "nombre_original": os.path.basename(video),
-                    "ruta_original": video,
-                    "nombre_nuevo": "",
-                    "ruta_nueva": "",
-                    "status": "no_action"
-                }
-                append_to_backup(batch_backup_file, file_op_result)
-            
-            results.append((result, file_op_result))
+            handle_result(video, process_single_video(video, config))
     else:
         # En modo normal, usar multiprocesamiento
-        with Pool(processes=config["processing"]["max_processes"]) as pool:
-            # Procesar videos
+        with Pool(processes=config["processing"]["max_processes"],
+                  initializer=init_worker, initargs=(rate_limiter, config)) as pool:
+            # Procesar videos (imap conserva el orden para asociar cada resultado a su video)
             process_func = partial(process_single_video, config=config)
-            results_iter = pool.imap_unordered(process_func, video_files)
+            results_iter = pool.imap(process_func, video_files)
             
             # Crear barra de progreso
-            results = []
-            for result in tqdm(results_iter, total=len(video_files), desc=f"Procesando lote {batch_num}", unit="video"):
-                stats["procesados"] += 1
-                
-                if result["identificado"]:
-                    stats["identificados"] += 1
-                elif "mensaje" in result and result["mensaje"].startswith("Error"):
-                    stats["errores"] += 1
-                else:
-                    stats["no_identificados"] += 1
-                
-                # Obtener ruta del video original (necesitamos buscarla ya que imap_unordered no mantiene orden)
-                video_idx = stats["procesados"] - 1  # Índice en la lista original
-                if video_idx < len(video_files):
-                    video = video_files[video_idx]
-                    
-                    # Procesar operación de archivo
-                    if config["processing"]["rename_files"]:
-                        file_op_result = process_file_operation(video, result, output_dir, batch_backup_file)
-                    else:
-                        # Solo registrar sin mover
-                        file_op_result = {
-                            "nombre_original": os.path.basename(video),
-                            "ruta_original": video,
-                            "nombre_nuevo": "",
-                            "ruta_nueva": "",
-                            "status": "no_action"
-                        }
-                        append_to_backup(batch_backup_file, file_op_result)
-                    
-                    results.append((result, file_op_result))
+            for video, result in tqdm(zip(video_files, results_iter), total=len(video_files),
+                                      desc=f"Procesando lote {batch_num}", unit="video"):
+                handle_result(video, result)
+    
+    if seasons:
+        log_print(f"Detalles de episodios: {len(seasons)} temporadas consultadas", logging.DEBUG)
     
     # Mostrar estadísticas
     log_print(f"Estadísticas del lote {batch_num}:")
@@ -314,6 +487,8 @@ def process_batch(video_files, config, output_dir, batch_num=1):
     log_print(f"  - Identificados: {stats['identificados']}")
     log_print(f"  - No identificados: {stats['no_identificados']}")
     log_print(f"  - Errores: {stats['errores']}")
+    log_rate_limiter_stats(rate_limiter)
+    log_prescreen_stats(prescreen_stats)
     
     return stats
 
@@ -0,0 +1,163 @@
+"""
+Limitador de peticiones (token bucket) compartido entre procesos
+"""
+
+import time
+import logging
+import multiprocessing
+from utils import log_print
+
+DEFAULT_REQUESTS_PER_SECOND = 35
+DEFAULT_BURST = 35
+
+# Espera usada si un 429 no incluye cabecera Retry-After (segundos)
+DEFAULT_RETRY_AFTER = 2.0
+
+class RateLimiter:
+    """
+    Token bucket en memoria compartida
+
+    Todos los workers del Pool reciben la misma instancia (a través del
+    inicializador), de modo que el presupuesto de peticiones a TMDb se
+    respeta de forma global y no por proceso. Un 429 bloquea el bucket para
+    todos los procesos hasta que vence el Retry-After.
+    """
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST):
+        self.rate = float(requests_per_second)
+        self.burst = float(burst)
+
+        self._lock = multiprocessing.Lock()
+        self._tokens = multiprocessing.RawValue('d', self.burst)
+        self._last_refill = multiprocessing.RawValue('d', time.time())
+        self._blocked_until = multiprocessing.RawValue('d', 0.0)
+
+        # Métricas
+        self._requests = multiprocessing.RawValue('l', 0)
+        self._waits = multiprocessing.RawValue('l', 0)
+        self._wait_total = multiprocessing.RawValue('d', 0.0)
+        self._wait_max = multiprocessing.RawValue('d', 0.0)
+        self._throttled = multiprocessing.RawValue('l', 0)
+
+    def _refill(self, now):
+        """Añade los tokens generados desde la última recarga (requiere el lock)"""
+        # Tras un 429 la última recarga queda en el futuro: durante la pausa
+        # no se generan tokens ni se adelanta la referencia
+        elapsed = max(0.0, now - self._last_refill.value)
+        self._tokens.value = min(self.burst, self._tokens.value + elapsed * self.rate)
+        self._last_refill.value = max(self._last_refill.value, now)
+
+    def acquire(self):
+        """
+        Espera hasta disponer de un token para hacer una petición
+
+        Returns:
+            Segundos esperados en la cola
+        """
+        start = time.time()
+
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+
+                if now < self._blocked_until.value:
+                    wait = self._blocked_until.value - now
+                elif self._tokens.value >= 1.0:
+                    self._tokens.value -= 1.0
+                    waited = now - start
+                    self._requests.value += 1
+                    if waited > 0.001:
+                        self._waits.value += 1
+                        self._wait_total.value += waited
+                        self._wait_max.value = max(self._wait_max.value, waited)
+                    return waited
+                else:
+                    wait = (1.0 - self._tokens.value) / self.rate
+
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """
+        Bloquea el bucket tras recibir un 429
+
+        Args:
+            retry_after: Segundos indicados por la cabecera Retry-After
+        """
+        delay = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+
+        with self._lock:
+            now = time.time()
+            self._blocked_until.value = max(self._blocked_until.value, now + delay)
+            self._tokens.value = 0.0
+            self._last_refill.value = now + delay
+            self._throttled.value += 1
+
+        log_print(f"TMDb limitó las peticiones (429). Pausa global de {delay:.1f}s", logging.WARNING)
+
+    def get_stats(self):
+        """
+        Obtiene las métricas acumuladas de la cola
+
+        Returns:
+            Diccionario con peticiones, esperas y respuestas 429
+        """
+        with self._lock:
+            return {
+                "peticiones": self._requests.value,
+                "esperas": self._waits.value,
+                "espera_total": self._wait_total.value,
+                "espera_maxima": self._wait_max.value,
+                "espera_media": (self._wait_total.value / self._waits.value) if self._waits.value else 0.0,
+                "limitadas_429": self._throttled.value
+            }
+
+def create_rate_limiter(config):
+    """
+    Crea un limitador a partir de la configuración
+
+    Args:
+        config: Configuración del sistema
+
+    Returns:
+        Instancia de RateLimiter
+    """
+    settings = config.get("tmdb", {}) if config else {}
+    return RateLimiter(
+        settings.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND),
+        settings.get("burst", DEFAULT_BURST)
+    )
+
+def parse_retry_after(value):
+    """
+    Interpreta la cabecera Retry-After (en segundos)
+
+    Args:
+        value: Valor de la cabecera o None
+
+    Returns:
+        Segundos a esperar o None si no se puede interpretar
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+def log_rate_limiter_stats(limiter):
+    """Muestra las métricas de espera del limitador"""
+    stats = limiter.get_stats()
+    log_print(f"  - Peticiones a TMDb: {stats['peticiones']}")
+    log_print(f"  - Esperas en cola: {stats['esperas']} "
+              f"(total {stats['espera_total']:.1f}s, media {stats['espera_media']:.2f}s, "
+              f"máxima {stats['espera_maxima']:.2f}s)")
+    if stats["limitadas_429"]:
+        log_print(f"  - Respuestas 429: {stats['limitadas_429']}", logging.WARNING)
@@ -0,0 +1,124 @@
+"""
+Registro de recursos por proceso (galería de actores, mapeo de estudios y logos)
+
+Cada worker del Pool carga estos recursos una sola vez y los reutiliza para
+todos sus videos. Si el archivo de origen cambia (mtime) se vuelven a cargar.
+"""
+
+import os
+import logging
+from config import ACTORS_GALLERY_FILE, ACTORS_DB_FILE, STUDIOS_MAPPING_FILE, LOGOS_DIR
+from utils import log_print
+from actor_gallery import get_meta_file, get_prototypes_file
+from actor_detect import load_actors_db
+from actor_ann import get_index_file, load_ann_index
+from studio_detect import load_studios_mapping, load_logo_templates
+
+# Recursos cargados en este proceso: {clave: (firma_de_archivos, valor)}
+_registry = {}
+
+def _path_signature(path):
+    """Devuelve la fecha de modificación de un archivo o None si no existe"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def _dir_signature(directory):
+    """Devuelve los archivos de un directorio con su fecha de modificación"""
+    if not os.path.isdir(directory):
+        return None
+
+    signature = []
+    for filename in sorted(os.listdir(directory)):
+        signature.append((filename, _path_signature(os.path.join(directory, filename))))
+    return tuple(signature)
+
+def get_resource(key, signature, loader):
+    """
+    Obtiene un recurso del registro, cargándolo si no existe o ha cambiado
+
+    Args:
+        key: Nombre del recurso
+        signature: Firma actual de los archivos de origen (ej. mtimes)
+        loader: Función sin argumentos que carga el recurso
+
+    Returns:
+        Recurso cargado
+    """
+    cached = _registry.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    value = loader()
+    _registry[key] = (signature, value)
+    log_print(f"Recurso '{key}' cargado en el proceso {os.getpid()}", logging.DEBUG)
+    return value
+
+def get_actors_signature(gallery_file=ACTORS_GALLERY_FILE, legacy_file=ACTORS_DB_FILE):
+    """
+    Devuelve la firma (mtimes) de los archivos de la galería de actores
+
+    Incluye el JSON antiguo, que load_actors_db usa si no hay galería binaria.
+    """
+    return (_path_signature(gallery_file), _path_signature(get_meta_file(gallery_file)),
+            _path_signature(get_prototypes_file(gallery_file)), _path_signature(legacy_file))
+
+def get_studios_signature(mapping_file=STUDIOS_MAPPING_FILE, logos_dir=LOGOS_DIR):
+    """Devuelve la firma (mtimes) del mapeo de estudios y de los logos"""
+    return (_path_signature(mapping_file), _dir_signature(logos_dir))
+
+def get_actors_gallery(gallery_file=ACTORS_GALLERY_FILE):
+    """Obtiene la galería de actores del proceso actual"""
+    return get_resource(("actors", gallery_file), get_actors_signature(gallery_file),
+                        lambda: load_actors_db(gallery_file))
+
+def get_actors_ann_index(config, gallery_file=ACTORS_GALLERY_FILE):
+    """
+    Obtiene el índice aproximado de la galería de actores del proceso actual
+    
+    Returns:
+        Índice ANN o None si se usa la búsqueda exacta
+    """
+    backend = config["processing"].get("face_index", "brute")
+    if backend in (None, "brute"):
+        return None
+    
+    gallery = get_actors_gallery(gallery_file)
+    index_file = get_index_file(gallery_file, backend)
+    signature = (_path_signature(gallery_file), _path_signature(index_file))
+    index = get_resource(("actors_ann", gallery_file, backend), signature,
+                         lambda: load_ann_index(gallery, backend, gallery_file))
+    
+    if index is not None and hasattr(index, "nprobe"):
+        index.nprobe = config["processing"].get("face_index_nprobe", index.nprobe)
+    
+    return index
+
+def get_studios_mapping(mapping_file=STUDIOS_MAPPING_FILE):
+    """Obtiene el mapeo de patrones de texto a estudios del proceso actual"""
+    return get_resource(("studios", mapping_file), _path_signature(mapping_file),
+                        lambda: load_studios_mapping(mapping_file))
+
+def get_logo_templates(logos_dir=LOGOS_DIR):
+    """Obtiene las imágenes de logos (ya decodificadas) del proceso actual"""
+    return get_resource(("logos", logos_dir), _dir_signature(logos_dir),
+                        lambda: load_logo_templates(logos_dir))
+
+def preload_resources(config):
+    """
+    Carga por adelantado los recursos que usará el procesamiento
+
+    Args:
+        config: Configuración del sistema
+    """
+    if config["processing"].get("detect_actors"):
+        get_actors_gallery()
+        get_actors_ann_index(config)
+    if config["processing"].get("detect_studios"):
+        get_studios_mapping()
+        get_logo_templates()
+
+def clear_resources():
+    """Descarta todos los recursos cargados en este proceso"""
+    _registry.clear()
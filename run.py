@@ -9,6 +9,7 @@ import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
+import time
 import argparse
 import logging
 from datetime import datetime
@@ -17,13 +18,18 @@ from datetime import datetime
 
 # Importar módulos del sistema
 from config import load_config, save_config, create_directories, DEFAULT_CONFIG
-from config import ACTORS_DIR, LOGOS_DIR, ACTORS_DB_FILE, STUDIOS_MAPPING_FILE, LOGOS_DB_FILE, PROCESSED_CSV_FILE
+from config import ACTORS_DIR, LOGOS_DIR, ACTORS_DB_FILE, ACTORS_GALLERY_FILE, STUDIOS_MAPPING_FILE, LOGOS_DB_FILE, PROCESSED_CSV_FILE
 from config import DATA_DIR, CONFIG_FILE
 from utils import log_print, setup_logging, connect_network_drive, check_dependencies
 from actor_db import create_actors_db_from_list, generate_encodings_db, get_popular_actors, import_actors_from_file
 from logo_db import download_all_logos, create_logos_directory, organize_logos
 from process import process_single_video, process_directory
 from files_ops import restore_from_backup
+from tmdb_cache import clear_cache
+from analysis_store import clear_analysis
+from tmdb_index import refresh_index_from_exports
+from actor_gallery import convert_json_to_gallery, load_gallery, compute_prototypes, save_prototypes
+from actor_ann import build_ann_index, benchmark_ann
 
 
 def show_header():
@@ -62,7 +68,7 @@ def check_system():
     # Comprobar bases de datos
     print("\nBases de datos:")
     dbs_to_check = [
-        ("Actores", ACTORS_DB_FILE),
+        ("Actores", ACTORS_GALLERY_FILE),
         ("Logos", LOGOS_DB_FILE)
     ]
     
@@ -276,24 +282,22 @@ def menu_actores():
         elif opcion == "4":
             # Generar encodings
             print("Generando encodings faciales (puede tardar varios minutos)...")
-            generate_encodings_db(ACTORS_DIR, ACTORS_DB_FILE)
+            generate_encodings_db(ACTORS_DIR, ACTORS_GALLERY_FILE,
+                                  ann_backend=config["processing"].get("face_index"),
+                                  prototypes=config["processing"].get("face_prototypes", False))
         
         elif opcion == "5":
             # Ver actores en base de datos
-            if os.path.exists(ACTORS_DB_FILE):
-                import json
-                try:
-                    with open(ACTORS_DB_FILE, 'r', encoding='utf-8') as f:
-                        db = json.load(f)
-                    print(f"\nActores en base de datos ({len(db)} total):")
-                    for i, actor in enumerate(sorted(db.keys()), 1):
-                        if i % 5 == 0:  # 5 por línea
-                            print(f"{actor}")
-                        else:
-                            print(f"{actor}", end=", ")
-                    print()
-                except Exception as e:
-                    print(f"Error cargando base de datos: {e}")
+            gallery = load_gallery(ACTORS_GALLERY_FILE)
+            if gallery:
+                names = gallery["names"]
+                print(f"\nActores en base de datos ({len(names)} total):")
+                for i, actor in enumerate(sorted(names), 1):
+                    if i % 5 == 0:  # 5 por línea
+                        print(f"{actor}")
+                    else:
+                        print(f"{actor}", end=", ")
+                print()
             else:
                 print("La base de datos de actores aún no existe.")
         
@@ -491,6 +495,35 @@ def menu_procesamiento():
         else:
             print("Opción no válida.")
 
+def show_ann_benchmark(backend):
+    """Muestra el recall y la velocidad de un índice ANN frente a la búsqueda exacta"""
+    gallery = load_gallery(ACTORS_GALLERY_FILE)
+    if not gallery:
+        print("La galería de actores aún no existe.")
+        return
+    
+    results = benchmark_ann(gallery, backend)
+    if not results:
+        print(f"No se pudo crear el índice {backend}.")
+        return
+    
+    parametro = "nprobe" if backend == "ivf" else "ef"
+    print(f"\nÍndice {backend} sobre {len(gallery['encodings'])} encodings "
+          f"(búsqueda exacta: {results[0]['ms_exacta']:.3f} ms/consulta)")
+    print(f"{parametro:>8} {'recall@1':>10} {'actor@1':>10} {'ms/consulta':>12}")
+    for r in results:
+        print(f"{r['parametro']:>8} {r['recall']:>10.3f} {r['recall_actor']:>10.3f} {r['ms_consulta']:>12.3f}")
+
+def apply_cli_overrides(config, args):
+    """Aplica a la configuración las opciones de línea de comandos (sin guardarlas)"""
+    if args.no_cache:
+        config["tmdb"]["cache_enabled"] = False
+    if args.refresh_cache:
+        # Revalidar (petición condicional) todo lo guardado antes de esta ejecución
+        config["tmdb"]["cache_revalidate"] = True
+        config["tmdb"]["cache_revalidate_since"] = time.time()
+    return config
+
 def menu_principal():
     """Menú principal del programa"""
     show_header()
@@ -536,9 +569,53 @@ if __name__ == "__main__":
     parser.add_argument('-d', '--directory', help="Procesar un directorio")
     parser.add_argument('-r', '--recursive', action='store_true', help="Procesar directorios recursivamente")
     parser.add_argument('-b', '--batch', action='store_true', help="Procesar por lotes")
+    parser.add_argument('--no-cache', action='store_true', help="Ignorar la caché de TMDb en esta ejecución")
+    parser.add_argument('--clear-cache', action='store_true', help="Vaciar la caché de TMDb antes de continuar")
+    parser.add_argument('--refresh-cache', action='store_true', help="Revalidar con TMDb las respuestas guardadas (ETag)")
+    parser.add_argument('--clear-analysis', action='store_true',
+                        help="Vaciar el almacén de análisis para volver a analizar todos los videos")
+    parser.add_argument('--refresh-index', action='store_true', help="Actualizar el índice local con los exports diarios de TMDb")
+    parser.add_argument('--convert-actors-db', nargs='?', const=ACTORS_DB_FILE, metavar='JSON',
+                        help="Convertir la base de datos JSON de encodings a la galería binaria")
+    parser.add_argument('--benchmark-face-index', choices=['ivf', 'hnsw'],
+                        help="Medir recall y velocidad de un índice ANN frente a la búsqueda exacta")
     
     args = parser.parse_args()
     
+    if args.clear_cache:
+        eliminadas = clear_cache()
+        print(f"Caché de TMDb vaciada ({eliminadas} entradas)")
+        if not (args.check or args.file or args.directory or args.refresh_index or args.clear_analysis):
+            sys.exit(0)
+    
+    if args.clear_analysis:
+        eliminadas = clear_analysis()
+        print(f"Almacén de análisis vaciado ({eliminadas} etapas)")
+        if not (args.check or args.file or args.directory or args.refresh_index):
+            sys.exit(0)
+    
+    if args.refresh_index:
+        importados = refresh_index_from_exports(load_config())
+        print(f"Índice local actualizado ({importados} títulos importados)")
+        if not (args.check or args.file or args.directory):
+            sys.exit(0)
+    
+    if args.convert_actors_db:
+        convertidos = convert_json_to_gallery(args.convert_actors_db, ACTORS_GALLERY_FILE)
+        print(f"Galería de actores creada ({convertidos} actores)")
+        processing = load_config()["processing"]
+        gallery = load_gallery(ACTORS_GALLERY_FILE, mmap=False) if convertidos else {}
+        if gallery and processing.get("face_prototypes", False):
+            save_prototypes(compute_prototypes(gallery), gallery, ACTORS_GALLERY_FILE)
+        if gallery and processing.get("face_index") not in (None, "brute"):
+            build_ann_index(gallery, processing["face_index"], ACTORS_GALLERY_FILE)
+        if not (args.check or args.file or args.directory):
+            sys.exit(0)
+    
+    if args.benchmark_face_index:
+        show_ann_benchmark(args.benchmark_face_index)
+        sys.exit(0)
+    
     if args.check:
         show_header()
         check_system()
@@ -546,14 +623,14 @@ if __name__ == "__main__":
     
     if args.file:
         show_header()
-        config = load_config()
+        config = apply_cli_overrides(load_config(), args)
         print(f"Procesando archivo: {args.file}")
         process_single_video(args.file, config)
         sys.exit(0)
     
     if args.directory:
         show_header()
-        config = load_config()
+        config = apply_cli_overrides(load_config(), args)
         mode = "batch" if args.batch else ("default" if args.recursive else "direct")
         print(f"Procesando directorio: {args.directory} (modo: {mode})")
         process_directory(args.directory, config, recursive=args.recursive, mode=mode)
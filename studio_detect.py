@@ -7,6 +7,7 @@ import json
 import logging
 import numpy as np
 from utils import log_print
+from video_analysis import load_frame_image, get_frame_name
 
 # Verificar dependencias
 try:
@@ -122,7 +123,29 @@ def get_logo_files(logos_dir):
     
     return logo_files
 
-def detect_studio_from_logo(image, logos_dir, threshold=0.7):
+def load_logo_templates(logos_dir):
+    """
+    Carga en memoria las imágenes de todos los logos
+    
+    Args:
+        logos_dir: Directorio donde se almacenan los logos
+        
+    Returns:
+        Lista de tuplas (nombre_estudio, imagen_logo)
+    """
+    if not CV2_AVAILABLE:
+        return []
+    
+    templates = []
+    
+    for studio, logo_path in get_logo_files(logos_dir):
+        logo_img = cv2.imread(logo_path)
+        if logo_img is not None:
+            templates.append((studio, logo_img))
+    
+    return templates
+
+def detect_studio_from_logo(image, logos_dir, threshold=0.7, logo_templates=None):
     """
     Detecta estudio/cadena basado en reconocimiento de logos
     
@@ -130,29 +153,28 @@ def detect_studio_from_logo(image, logos_dir, threshold=0.7):
         image: Imagen (matriz numpy) donde buscar logos
         logos_dir: Directorio con imágenes de logos
         threshold: Umbral de coincidencia (0.0-1.0)
+        logo_templates: Logos ya cargados con load_logo_templates (opcional)
         
     Returns:
         Nombre del estudio o None si no se detecta
     """
-    if not CV2_AVAILABLE or not os.path.exists(logos_dir):
+    if not CV2_AVAILABLE:
         return None
     
     try:
-        logo_files = get_logo_files(logos_dir)
+        if logo_templates is None:
+            if not os.path.exists(logos_dir):
+                return None
+            logo_templates = load_logo_templates(logos_dir)
         
-        if not logo_files:
+        if not logo_templates:
             return None
         
         # Para cada logo, intentar reconocimiento
         matches = []
         
-        for studio, logo_path in logo_files:
-            # Cargar imagen del logo
-            logo_img = cv2.imread(logo_path)
-            
-            if logo_img is None:
-                continue
-            
+        for studio, logo_img in logo_templates:
+
             # Verificar que la imagen del logo sea más pequeña que la imagen del video
             if (logo_img.shape[0] > image.shape[0] or 
                 logo_img.shape[1] > image.shape[1]):
@@ -188,7 +210,7 @@ def detect_studio_from_logo(image, logos_dir, threshold=0.7):
     
     return None
 
-def analyze_frame_for_studios(frame, studios_mapping, logos_dir):
+def analyze_frame_for_studios(frame, studios_mapping, logos_dir, logo_templates=None):
     """
     Analiza un fotograma para detectar estudios (por texto y logo)
     
@@ -196,6 +218,7 @@ def analyze_frame_for_studios(frame, studios_mapping, logos_dir):
         frame: Imagen (matriz numpy) del fotograma
         studios_mapping: Diccionario de mapeo de patrones de texto a estudios
         logos_dir: Directorio con imágenes de logos
+        logo_templates: Logos ya cargados con load_logo_templates (opcional)
         
     Returns:
         Lista de estudios detectados
@@ -212,7 +235,7 @@ def analyze_frame_for_studios(frame, studios_mapping, logos_dir):
         
         # 2. Detectar por comparación de logos
         if CV2_AVAILABLE:
-            studio = detect_studio_from_logo(frame, logos_dir)
+            studio = detect_studio_from_logo(frame, logos_dir, logo_templates=logo_templates)
             if studio and studio not in detected_studios:
                 detected_studios.append(studio)
                 
@@ -221,33 +244,38 @@ def analyze_frame_for_studios(frame, studios_mapping, logos_dir):
     
     return detected_studios
 
-def detect_studios_in_frames(frame_files, studios_mapping, logos_dir):
+def detect_studios_in_frames(frames, studios_mapping, logos_dir, logo_templates=None):
     """
     Detecta estudios en múltiples fotogramas
     
     Args:
-        frame_files: Lista de rutas a fotogramas
+        frames: Lista de fotogramas en memoria (segundo, imagen) o rutas a archivos
         studios_mapping: Diccionario de mapeo de patrones de texto a estudios
         logos_dir: Directorio con imágenes de logos
+        logo_templates: Logos ya cargados con load_logo_templates (opcional)
         
     Returns:
         Lista de estudios detectados
     """
     all_detected_studios = []
     
-    for frame_file in frame_files:
+    # Cargar los logos una sola vez para todos los fotogramas
+    if logo_templates is None and CV2_AVAILABLE and os.path.exists(logos_dir):
+        logo_templates = load_logo_templates(logos_dir)
+    
+    for frame_entry in frames:
         try:
-            frame = cv2.imread(frame_file)
+            frame = load_frame_image(frame_entry)
             if frame is None:
                 continue
                 
-            detected = analyze_frame_for_studios(frame, studios_mapping, logos_dir)
+            detected = analyze_frame_for_studios(frame, studios_mapping, logos_dir, logo_templates)
             
             for studio in detected:
                 if studio not in all_detected_studios:
                     all_detected_studios.append(studio)
                     
         except Exception as e:
-            log_print(f"Error procesando {frame_file}: {e}", logging.ERROR)
+            log_print(f"Error procesando {get_frame_name(frame_entry)}: {e}", logging.ERROR)
     
     return all_detected_studios
\ No newline at end of file
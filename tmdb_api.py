@@ -2,12 +2,153 @@
 Funciones para búsqueda en TMDb (The Movie Database)
 """
 
-import requests
-import time
+import asyncio
 import logging
 from utils import log_print
+from config import ACTOR_IDS_FILE
+from tmdb_client import tmdb_get, tmdb_get_async
+from actor_ids import load_actor_ids, save_actor_ids
+from tmdb_ranking import rank_candidates, DEFAULT_MIN_SCORE
 
-def search_tmdb_multilang(query, config, is_series=False, attempts=3):
+# Idiomas de búsqueda, en orden de preferencia
+SEARCH_LANGUAGES = ["es", "en"]
+
+# Pausa antes de reintentar una búsqueda fallida (segundos)
+RETRY_DELAY = 2
+
+def _min_score(config):
+    """Puntuación mínima para aceptar un candidato"""
+    return config["processing"].get("match_min_score", DEFAULT_MIN_SCORE)
+
+def run_async(coro):
+    """Ejecuta una corutina desde código síncrono y devuelve su resultado"""
+    return asyncio.run(coro)
+
+async def _search_language_async(query, lang, is_series, config, attempts):
+    """
+    Busca un texto en un idioma concreto
+
+    Returns:
+        (idioma, lista_de_resultados) con todos los candidatos devueltos
+    """
+    endpoint = "/search/tv" if is_series else "/search/movie"
+    
+    for attempt in range(attempts):
+        try:
+            status, data = await tmdb_get_async(endpoint, config, {"query": query, "language": lang})
+            
+            if status == 200 and data.get("results"):
+                return lang, data["results"]
+            return lang, []
+        except Exception as e:
+            log_print(f"Error buscando en TMDb para '{query}' en {lang}: {e}", logging.ERROR)
+            if attempt < attempts - 1:
+                await asyncio.sleep(RETRY_DELAY)  # Esperar sin bloquear las demás búsquedas
+    
+    return lang, []
+
+async def _search_candidates_async(query, config, is_series, attempts, hints=None):
+    """
+    Busca en todos los idiomas a la vez y puntúa todos los candidatos
+
+    Returns:
+        (puntuación, resultado, idioma) del mejor candidato o (0.0, None, None)
+    """
+    found = await asyncio.gather(*[
+        _search_language_async(query, lang, is_series, config, attempts)
+        for lang in SEARCH_LANGUAGES
+    ])
+    
+    ranked = rank_candidates(query, found, is_series, hints,
+                             preferred_lang=config["processing"]["output_language"])
+    if not ranked:
+        return 0.0, None, None
+    
+    score, result, lang = ranked[0]
+    name_key = 'title' if not is_series else 'name'
+    log_print(f"Mejor candidato en {lang}: {result.get(name_key, 'Sin título')} "
+              f"(puntuación {score:.2f} de {len(ranked)} candidatos)", logging.DEBUG)
+    return score, result, lang
+
+async def _finalize_result_async(result, lang, is_series, config):
+    """
+    Obtiene los datos en inglés si el resultado se encontró en otro idioma
+    y la salida debe estar en inglés
+    """
+    if lang == "en" or config["processing"]["output_language"] != "en":
+        return result
+    
+    try:
+        detail_status, detail_data = await tmdb_get_async(
+            f"/{'tv' if is_series else 'movie'}/{result['id']}", config, {"language": "en"}
+        )
+        if detail_status == 200:
+            return detail_data
+    except Exception as e:
+        log_print(f"Error obteniendo detalles en inglés de {result.get('id')}: {e}", logging.ERROR)
+    
+    return result
+
+async def search_tmdb_multilang_async(query, config, is_series=False, attempts=3, hints=None):
+    """
+    Versión asíncrona de search_tmdb_multilang (todos los idiomas en paralelo)
+    
+    Returns:
+        (resultado, tipo) donde tipo es True para película, False para serie
+    """
+    score, result, lang = await _search_candidates_async(query, config, is_series, attempts, hints)
+    if not result or score < _min_score(config):
+        return None, None
+    
+    result = await _finalize_result_async(result, lang, is_series, config)
+    return result, not is_series
+
+async def search_tmdb_queries_async(queries, config, attempts=3, hints=None):
+    """
+    Busca varios textos como película y como serie en una sola tanda concurrente
+    
+    Todas las combinaciones texto/tipo/idioma se lanzan a la vez y todos los
+    candidatos devueltos se puntúan (título, año, duración y popularidad).
+    Los textos se recorren en orden de prioridad; para cada texto se elige el
+    mejor candidato entre película y serie, siempre que supere la puntuación
+    mínima.
+    
+    Args:
+        queries: Lista de textos de búsqueda en orden de prioridad
+        config: Configuración con la API key
+        attempts: Número de intentos si hay errores
+        hints: Diccionario opcional con "year" y "duration" (segundos) del video
+        
+    Returns:
+        (resultado, tipo) donde tipo es True para película, False para serie
+    """
+    queries = [q for q in queries if q and q.strip()]
+    if not queries:
+        return None, None
+    
+    variants = [(query, is_series) for query in queries for is_series in (False, True)]
+    found = await asyncio.gather(*[
+        _search_candidates_async(query, config, is_series, attempts, hints)
+        for query, is_series in variants
+    ])
+    
+    min_score = _min_score(config)
+    
+    for i in range(0, len(variants), 2):
+        # Película y serie del mismo texto; a igualdad gana la película
+        movie, tv = found[i], found[i + 1]
+        is_series = tv[0] > movie[0]
+        score, result, lang = tv if is_series else movie
+        
+        if result and score >= min_score:
+            name_key = 'title' if not is_series else 'name'
+            log_print(f"Encontrado en {lang}: {result.get(name_key, 'Sin título')} (puntuación {score:.2f})")
+            result = await _finalize_result_async(result, lang, is_series, config)
+            return result, not is_series
+    
+    return None, None
+
+def search_tmdb_multilang(query, config, is_series=False, attempts=3, hints=None):
     """
     Busca en TMDb con soporte para múltiples idiomas
     
@@ -16,53 +157,68 @@ def search_tmdb_multilang(query, config, is_series=False, attempts=3):
         config: Configuración con la API key
         is_series: True para buscar series, False para películas
         attempts: Número de intentos si hay errores
+        hints: Diccionario opcional con "year" y "duration" (segundos) del video
         
     Returns:
         (resultado, tipo) donde tipo es True para película, False para serie
     """
-    api_key = config["api_keys"]["tmdb"]
-    languages = ["es", "en"]  # Primero español, luego inglés
+    return run_async(search_tmdb_multilang_async(query, config, is_series, attempts, hints))
+
+def search_tmdb_queries(queries, config, attempts=3, hints=None):
+    """
+    Busca varios textos como película y serie en paralelo (envoltorio síncrono)
     
-    best_result = None
-    result_type = None
+    Args:
+        queries: Lista de textos de búsqueda en orden de prioridad
+        config: Configuración con la API key
+        attempts: Número de intentos si hay errores
+        hints: Diccionario opcional con "year" y "duration" (segundos) del video
+        
+    Returns:
+        (resultado, tipo) donde tipo es True para película, False para serie
+    """
+    return run_async(search_tmdb_queries_async(queries, config, attempts, hints))
+
+def get_person_id(actor_name, config):
+    """
+    Obtiene el ID de persona en TMDb de un actor
     
-    for lang in languages:
-        try:
-            if is_series:
-                url = f"https://api.themoviedb.org/3/search/tv?api_key={api_key}&query={query}&language={lang}"
-            else:
-                url = f"https://api.themoviedb.org/3/search/movie?api_key={api_key}&query={query}&language={lang}"
-                
-            response = requests.get(url, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("results") and len(data["results"]) > 0:
-                    result = data["results"][0]
-                    name_key = 'title' if not is_series else 'name'
-                    log_print(f"Encontrado en {lang}: {result.get(name_key, 'Sin título')}")
-                    
-                    # Si es la primera vez o tiene mejor puntuación
-                    if best_result is None or result.get('popularity', 0) > best_result.get('popularity', 0):
-                        # Si idioma no es inglés y estamos pidiendo salida en inglés
-                        if lang != "en" and config["processing"]["output_language"] == "en":
-                            # Buscar detalles en inglés
-                            id_result = result['id']
-                            detail_url = f"https://api.themoviedb.org/3/{'tv' if is_series else 'movie'}/{id_result}?api_key={api_key}&language=en"
-                            detail_response = requests.get(detail_url, timeout=15)
-                            
-                            if detail_response.status_code == 200:
-                                result = detail_response.json()
-                        
-                        best_result = result
-                        result_type = not is_series  # True si es película, False si es serie
-        except Exception as e:
-            log_print(f"Error buscando en TMDb para '{query}' en {lang}: {e}", logging.ERROR)
-            if attempts > 1:
-                time.sleep(2)  # Esperar antes de reintentar
-                return search_tmdb_multilang(query, config, is_series, attempts-1)
+    Se consulta primero el mapa local generado al crear la galería de actores;
+    solo si el actor no está se busca en TMDb (y se guarda para la próxima vez).
+    
+    Args:
+        actor_name: Nombre del actor
+        config: Configuración con la API key
+        
+    Returns:
+        ID del actor en TMDb o None si no se encuentra
+    """
+    actor_ids = load_actor_ids(ACTOR_IDS_FILE)
+    if actor_name in actor_ids:
+        return actor_ids[actor_name]
     
-    return best_result, result_type
+    status, data = tmdb_get("/search/person", config, {"query": actor_name, "language": "en-US"})
+    
+    if status == 200 and data.get("results"):
+        # Tomar el primer resultado
+        person_id = data["results"][0]["id"]
+        save_actor_ids(ACTOR_IDS_FILE, {actor_name: person_id})
+        return person_id
+    
+    return None
+
+async def _get_combined_credits_async(person_id, config):
+    """Obtiene los créditos de película y serie de un actor en una sola petición"""
+    try:
+        status, data = await tmdb_get_async(f"/person/{person_id}/combined_credits", config, {"language": "en-US"})
+        return data if status == 200 else None
+    except Exception as e:
+        log_print(f"Error obteniendo créditos del actor {person_id}: {e}", logging.ERROR)
+        return None
+
+async def _get_all_credits_async(person_ids, config):
+    """Obtiene en paralelo los créditos combinados de varios actores"""
+    return await asyncio.gather(*[_get_combined_credits_async(pid, config) for pid in person_ids])
 
 def search_by_actors(actors, config, is_series=False):
     """
@@ -79,39 +235,29 @@ def search_by_actors(actors, config, is_series=False):
     if not actors or len(actors) == 0:
         return None, None
     
-    api_key = config["api_keys"]["tmdb"]
-    
     try:
-        # Primero, buscar IDs de los actores
+        # Primero, obtener IDs de los actores (normalmente del mapa local)
         actor_ids = []
         
         for actor in actors:
-            # Buscar actor en TMDb
-            url = f"https://api.themoviedb.org/3/search/person?api_key={api_key}&query={actor}&language=en-US"
-            response = requests.get(url, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("results") and len(data["results"]) > 0:
-                    # Tomar el primer resultado
-                    actor_ids.append(data["results"][0]["id"])
+            person_id = get_person_id(actor, config)
+            if person_id is not None:
+                actor_ids.append(person_id)
         
         if not actor_ids:
             return None, None
         
-        # Ahora, buscar películas o series con estos actores
+        # Ahora, buscar películas o series con estos actores. Los créditos
+        # combinados sirven para películas y series, así que la segunda
+        # búsqueda (serie) sale de la caché.
+        media_type = 'tv' if is_series else 'movie'
         all_results = []
         
-        for actor_id in actor_ids:
-            # Buscar créditos del actor
-            url = f"https://api.themoviedb.org/3/person/{actor_id}/{'tv_credits' if is_series else 'movie_credits'}?api_key={api_key}&language=en-US"
-            response = requests.get(url, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Añadir a resultados
-                if "cast" in data:
-                    for item in data["cast"]:
+        for data in run_async(_get_all_credits_async(actor_ids, config)):
+            # Añadir a resultados
+            if data and "cast" in data:
+                for item in data["cast"]:
+                    if item.get("media_type") == media_type:
                         all_results.append(item)
         
         # Contar frecuencia de cada película/serie
@@ -154,16 +300,16 @@ def get_movie_details(movie_id, config):
     Returns:
         Diccionario con detalles completos
     """
-    api_key = config["api_keys"]["tmdb"]
-    
     try:
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={api_key}&append_to_response=credits,images,videos,release_dates&language={config['processing']['output_language']}"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get(f"/movie/{movie_id}", config, {
+            "append_to_response": "credits,images,videos,release_dates",
+            "language": config["processing"]["output_language"]
+        })
         
-        if response.status_code == 200:
-            return response.json()
+        if status == 200:
+            return data
         else:
-            log_print(f"Error obteniendo detalles de película {movie_id}: {response.status_code}", logging.ERROR)
+            log_print(f"Error obteniendo detalles de película {movie_id}: {status}", logging.ERROR)
             return None
     except Exception as e:
         log_print(f"Error en get_movie_details: {e}", logging.ERROR)
@@ -180,16 +326,16 @@ def get_tv_details(tv_id, config):
     Returns:
         Diccionario con detalles completos
     """
-    api_key = config["api_keys"]["tmdb"]
-    
     try:
-        url = f"https://api.themoviedb.org/3/tv/{tv_id}?api_key={api_key}&append_to_response=credits,images,videos,content_ratings&language={config['processing']['output_language']}"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get(f"/tv/{tv_id}", config, {
+            "append_to_response": "credits,images,videos,content_ratings",
+            "language": config["processing"]["output_language"]
+        })
         
-        if response.status_code == 200:
-            return response.json()
+        if status == 200:
+            return data
         else:
-            log_print(f"Error obteniendo detalles de serie {tv_id}: {response.status_code}", logging.ERROR)
+            log_print(f"Error obteniendo detalles de serie {tv_id}: {status}", logging.ERROR)
             return None
     except Exception as e:
         log_print(f"Error en get_tv_details: {e}", logging.ERROR)
@@ -207,21 +353,38 @@ def get_season_details(tv_id, season_number, config):
     Returns:
         Diccionario con detalles de la temporada
     """
-    api_key = config["api_keys"]["tmdb"]
-    
     try:
-        url = f"https://api.themoviedb.org/3/tv/{tv_id}/season/{season_number}?api_key={api_key}&language={config['processing']['output_language']}"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get(f"/tv/{tv_id}/season/{season_number}", config, {"language": config["processing"]["output_language"]})
         
-        if response.status_code == 200:
-            return response.json()
+        if status == 200:
+            return data
         else:
-            log_print(f"Error obteniendo detalles de temporada {season_number}: {response.status_code}", logging.ERROR)
+            log_print(f"Error obteniendo detalles de temporada {season_number}: {status}", logging.ERROR)
             return None
     except Exception as e:
         log_print(f"Error en get_season_details: {e}", logging.ERROR)
         return None
 
+def get_episode_from_season(season_data, episode_number):
+    """
+    Obtiene un episodio de la respuesta de get_season_details
+    
+    Args:
+        season_data: Diccionario con detalles de la temporada
+        episode_number: Número de episodio
+        
+    Returns:
+        Diccionario con detalles del episodio o None si no está en la temporada
+    """
+    if not season_data or episode_number is None:
+        return None
+    
+    for episode in season_data.get("episodes", []):
+        if episode.get("episode_number") == int(episode_number):
+            return episode
+    
+    return None
+
 def get_episode_details(tv_id, season_number, episode_number, config):
     """
     Obtiene detalles de un episodio específico
@@ -235,16 +398,13 @@ def get_episode_details(tv_id, season_number, episode_number, config):
     Returns:
         Diccionario con detalles del episodio
     """
-    api_key = config["api_keys"]["tmdb"]
-    
     try:
-        url = f"https://api.themoviedb.org/3/tv/{tv_id}/season/{season_number}/episode/{episode_number}?api_key={api_key}&language={config['processing']['output_language']}"
-        response = requests.get(url, timeout=15)
+        status, data = tmdb_get(f"/tv/{tv_id}/season/{season_number}/episode/{episode_number}", config, {"language": config["processing"]["output_language"]})
         
-        if response.status_code == 200:
-            return response.json()
+        if status == 200:
+            return data
         else:
-            log_print(f"Error obteniendo detalles de episodio {season_number}x{episode_number}: {response.status_code}", logging.ERROR)
+            log_print(f"Error obteniendo detalles de episodio {season_number}x{episode_number}: {status}", logging.ERROR)
             return None
     except Exception as e:
         log_print(f"Error en get_episode_details: {e}", logging.ERROR)
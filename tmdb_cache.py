@@ -0,0 +1,326 @@
+"""
+Caché persistente (SQLite) de respuestas de la API de TMDb
+"""
+
+import json
+import time
+import hashlib
+import logging
+from config import TMDB_CACHE_FILE
+from utils import log_print, get_sqlite_connection
+
+# Tiempo de vida predeterminado por tipo de endpoint (en días)
+DEFAULT_TTL_DAYS = {
+    "search": 7,
+    "details": 30,
+    "person": 30,
+    "popular": 1,
+    "negative": 1
+}
+
+DEFAULT_MAX_ENTRIES = 50000
+
+# Cada cuántas escrituras se comprueba el límite de tamaño
+EVICTION_CHECK_INTERVAL = 100
+
+# Escrituras de este proceso desde la última comprobación de tamaño
+_writes_since_check = 0
+
+# Bases de datos cuyo esquema ya se ha comprobado en este proceso
+_schema_checked = set()
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        endpoint TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        body TEXT,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL,
+        etag TEXT,
+        last_modified TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed);
+"""
+
+def _cache_settings(config):
+    """Devuelve la sección de configuración del cliente TMDb (o vacía)"""
+    if config and isinstance(config.get("tmdb"), dict):
+        return config["tmdb"]
+    return {}
+
+def cache_enabled(config):
+    """Indica si la caché de TMDb está activada en la configuración"""
+    return bool(_cache_settings(config).get("cache_enabled", True))
+
+def _get_connection(db_file=TMDB_CACHE_FILE):
+    """Obtiene la conexión a la caché del hilo y proceso actual"""
+    conn = get_sqlite_connection(db_file, CACHE_SCHEMA)
+
+    if db_file not in _schema_checked:
+        # Cachés creadas antes de guardar ETag/Last-Modified
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+        for column in ("etag", "last_modified"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+        _schema_checked.add(db_file)
+
+    return conn
+
+def make_cache_key(path, params):
+    """
+    Genera la clave de caché para un endpoint y sus parámetros
+
+    Args:
+        path: Ruta del endpoint (ej. "/search/movie")
+        params: Diccionario de parámetros (se ignora la API key)
+
+    Returns:
+        String con el hash de la petición
+    """
+    relevant = {k: str(v) for k, v in (params or {}).items() if k != "api_key"}
+    raw = path + "?" + json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def endpoint_category(path):
+    """Clasifica un endpoint para decidir su tiempo de vida en caché"""
+    if path.startswith("/search/"):
+        return "search"
+    if path == "/person/popular":
+        return "popular"
+    if path.startswith("/person/"):
+        return "person"
+    return "details"
+
+def is_negative_result(status, data):
+    """Indica si una respuesta representa 'no encontrado'"""
+    if status == 404:
+        return True
+    return status == 200 and isinstance(data, dict) and "results" in data and not data["results"]
+
+def get_ttl(path, status, data, config):
+    """
+    Calcula el tiempo de vida (en segundos) de una respuesta
+
+    Args:
+        path: Ruta del endpoint
+        status: Código HTTP de la respuesta
+        data: Datos JSON de la respuesta
+        config: Configuración del sistema
+
+    Returns:
+        Segundos que la respuesta se considera válida
+    """
+    ttl_days = dict(DEFAULT_TTL_DAYS)
+    ttl_days.update(_cache_settings(config).get("cache_ttl_days", {}))
+
+    category = "negative" if is_negative_result(status, data) else endpoint_category(path)
+    return float(ttl_days.get(category, DEFAULT_TTL_DAYS["details"])) * 86400
+
+def is_fresh(created, ttl, config):
+    """
+    Indica si un dato guardado sigue vigente
+
+    Args:
+        created: Momento (timestamp) en que se guardó
+        ttl: Tiempo de vida en segundos (ver get_ttl)
+        config: Configuración del sistema
+
+    Returns:
+        False si ha caducado o si --refresh-cache obliga a revalidarlo
+    """
+    fresh = time.time() - created <= ttl
+    if _cache_settings(config).get("cache_revalidate", False):
+        # Forzar la revalidación de todo lo guardado antes de esta ejecución
+        fresh = fresh and created >= _cache_settings(config).get("cache_revalidate_since", time.time())
+    return fresh
+
+def get_cache_entry(path, params, config, db_file=TMDB_CACHE_FILE):
+    """
+    Busca una respuesta en la caché, vigente o caducada
+
+    Las entradas caducadas se devuelven igualmente para poder revalidarlas
+    con una petición condicional (ETag / Last-Modified).
+
+    Args:
+        path: Ruta del endpoint
+        params: Parámetros de la petición
+        config: Configuración del sistema
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        Diccionario con status, data, fresh, etag y last_modified, o None si no existe
+    """
+    try:
+        conn = _get_connection(db_file)
+        key = make_cache_key(path, params)
+        row = conn.execute(
+            "SELECT status, body, created, etag, last_modified FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        status, body, created, etag, last_modified = row
+        data = json.loads(body) if body else None
+
+        fresh = is_fresh(created, get_ttl(path, status, data, config), config)
+
+        if fresh:
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        return {
+            "status": status,
+            "data": data,
+            "fresh": fresh,
+            "etag": etag,
+            "last_modified": last_modified
+        }
+    except Exception as e:
+        log_print(f"Error leyendo caché de TMDb: {e}", logging.WARNING)
+        return None
+
+def mark_revalidated(path, params, db_file=TMDB_CACHE_FILE):
+    """
+    Renueva una entrada tras un 304 Not Modified (el contenido no cambió)
+
+    Args:
+        path: Ruta del endpoint
+        params: Parámetros de la petición
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        True si se actualiza, False si hay error
+    """
+    try:
+        conn = _get_connection(db_file)
+        now = time.time()
+        conn.execute(
+            "UPDATE responses SET created = ?, accessed = ? WHERE key = ?",
+            (now, now, make_cache_key(path, params))
+        )
+        return True
+    except Exception as e:
+        log_print(f"Error actualizando caché de TMDb: {e}", logging.WARNING)
+        return False
+
+def store_response(path, params, status, data, config, etag=None, last_modified=None, db_file=TMDB_CACHE_FILE):
+    """
+    Guarda una respuesta en la caché
+
+    Solo se guardan respuestas correctas (200) y negativas (404); los errores
+    transitorios no se almacenan.
+
+    Args:
+        path: Ruta del endpoint
+        params: Parámetros de la petición
+        status: Código HTTP de la respuesta
+        data: Datos JSON de la respuesta
+        config: Configuración del sistema
+        etag: Cabecera ETag de la respuesta (opcional)
+        last_modified: Cabecera Last-Modified de la respuesta (opcional)
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        True si se guarda, False en caso contrario
+    """
+    global _writes_since_check
+
+    if status not in (200, 404):
+        return False
+
+    try:
+        conn = _get_connection(db_file)
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(key, endpoint, status, body, created, accessed, etag, last_modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (make_cache_key(path, params), path, status,
+             json.dumps(data, ensure_ascii=False) if data is not None else None, now, now,
+             etag, last_modified)
+        )
+
+        _writes_since_check += 1
+        if _writes_since_check >= EVICTION_CHECK_INTERVAL:
+            _writes_since_check = 0
+            max_entries = _cache_settings(config).get("cache_max_entries", DEFAULT_MAX_ENTRIES)
+            evict_entries(max_entries, db_file)
+
+        return True
+    except Exception as e:
+        log_print(f"Error guardando en caché de TMDb: {e}", logging.WARNING)
+        return False
+
+def evict_entries(max_entries, db_file=TMDB_CACHE_FILE):
+    """
+    Elimina las entradas usadas hace más tiempo si se supera el límite (LRU)
+
+    Args:
+        max_entries: Número máximo de entradas a conservar
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    try:
+        conn = _get_connection(db_file)
+        count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - max_entries
+
+        if excess <= 0:
+            return 0
+
+        conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)", (excess,)
+        )
+        log_print(f"Caché de TMDb: eliminadas {excess} entradas antiguas", logging.DEBUG)
+        return excess
+    except Exception as e:
+        log_print(f"Error limpiando caché de TMDb: {e}", logging.WARNING)
+        return 0
+
+def clear_cache(db_file=TMDB_CACHE_FILE):
+    """
+    Vacía completamente la caché de TMDb
+
+    Args:
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    try:
+        conn = _get_connection(db_file)
+        count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        conn.execute("DELETE FROM responses")
+        conn.execute("VACUUM")
+        log_print(f"Caché de TMDb vaciada ({count} entradas)")
+        return count
+    except Exception as e:
+        log_print(f"Error vaciando caché de TMDb: {e}", logging.ERROR)
+        return 0
+
+def get_cache_stats(db_file=TMDB_CACHE_FILE):
+    """
+    Obtiene estadísticas de la caché
+
+    Args:
+        db_file: Ruta a la base de datos de caché
+
+    Returns:
+        Diccionario con número de entradas por tipo de endpoint
+    """
+    stats = {"total": 0}
+
+    try:
+        conn = _get_connection(db_file)
+        for endpoint, count in conn.execute("SELECT endpoint, COUNT(*) FROM responses GROUP BY endpoint"):
+            category = endpoint_category(endpoint)
+            stats[category] = stats.get(category, 0) + count
+            stats["total"] += count
+    except Exception as e:
+        log_print(f"Error obteniendo estadísticas de caché: {e}", logging.ERROR)
+
+    return stats
@@ -0,0 +1,218 @@
+"""
+Cliente HTTP compartido para la API de TMDb (sesión persistente con pool de conexiones)
+"""
+
+import os
+import asyncio
+import logging
+import requests
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils import log_print
+from tmdb_cache import cache_enabled, get_cache_entry, mark_revalidated, store_response
+from rate_limit import create_rate_limiter, parse_retry_after
+
+TMDB_API_URL = "https://api.themoviedb.org/3"
+
+# Valores usados si la configuración no define la sección "tmdb"
+DEFAULT_TIMEOUT = 15
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+
+# Sesión del proceso actual (cada worker del Pool crea la suya)
+_session = None
+_session_pid = None
+
+# Hilos para las peticiones concurrentes del cliente asíncrono
+_executor = None
+_executor_pid = None
+
+# Limitador de peticiones (compartido con los demás workers si se instala uno)
+_rate_limiter = None
+
+def _tmdb_settings(config):
+    """Devuelve la sección de configuración del cliente TMDb (o vacía)"""
+    if config and isinstance(config.get("tmdb"), dict):
+        return config["tmdb"]
+    return {}
+
+def create_session(config=None):
+    """
+    Crea una sesión HTTP con pool de conexiones y reintentos automáticos
+
+    Args:
+        config: Configuración del sistema (opcional)
+
+    Returns:
+        Objeto requests.Session configurado
+    """
+    settings = _tmdb_settings(config)
+    pool_size = settings.get("pool_size", DEFAULT_POOL_SIZE)
+
+    retries = Retry(
+        total=settings.get("max_retries", DEFAULT_MAX_RETRIES),
+        backoff_factor=settings.get("backoff_factor", DEFAULT_BACKOFF_FACTOR),
+        # Los 429 los gestiona el limitador global, no cada proceso por su cuenta
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept": "application/json"})
+    return session
+
+def get_session(config=None):
+    """
+    Obtiene la sesión HTTP compartida del proceso actual
+
+    La sesión se crea una sola vez por proceso; tras un fork (workers del Pool)
+    se crea una nueva para no compartir sockets con el proceso padre.
+
+    Args:
+        config: Configuración del sistema (opcional)
+
+    Returns:
+        Objeto requests.Session reutilizable
+    """
+    global _session, _session_pid
+
+    if _session is None or _session_pid != os.getpid():
+        _session = create_session(config)
+        _session_pid = os.getpid()
+        log_print(f"Sesión TMDb creada para el proceso {_session_pid}", logging.DEBUG)
+
+    return _session
+
+def close_session():
+    """Cierra la sesión HTTP del proceso actual (si existe)"""
+    global _session, _session_pid
+
+    if _session is not None and _session_pid == os.getpid():
+        _session.close()
+    _session = None
+    _session_pid = None
+
+def set_rate_limiter(limiter):
+    """
+    Instala el limitador de peticiones del proceso actual
+
+    Args:
+        limiter: Instancia de RateLimiter (compartida entre procesos) o None
+    """
+    global _rate_limiter
+    _rate_limiter = limiter
+
+def get_rate_limiter(config=None):
+    """Obtiene el limitador instalado o crea uno local para este proceso"""
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        _rate_limiter = create_rate_limiter(config)
+
+    return _rate_limiter
+
+def tmdb_get(path, config, params=None, use_cache=True):
+    """
+    Realiza una petición GET a la API de TMDb usando la sesión compartida
+
+    Si la caché está activada se devuelve la respuesta guardada mientras siga
+    vigente, y las respuestas nuevas se guardan para las siguientes ejecuciones.
+    Las entradas caducadas con ETag o Last-Modified se revalidan con una
+    petición condicional: si TMDb responde 304 solo se transfieren cabeceras.
+
+    Args:
+        path: Ruta del endpoint (ej. "/search/movie")
+        config: Configuración con la API key
+        params: Diccionario de parámetros de la consulta
+        use_cache: False para ignorar la caché en esta petición
+
+    Returns:
+        (codigo_estado, datos) donde datos es el JSON de la respuesta o None si no es 200
+    """
+    params = dict(params or {})
+    use_cache = use_cache and cache_enabled(config)
+
+    cached = None
+    headers = {}
+
+    if use_cache:
+        cached = get_cache_entry(path, params, config)
+        if cached is not None:
+            if cached["fresh"]:
+                return cached["status"], cached["data"]
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+    query = dict(params)
+    query["api_key"] = config["api_keys"]["tmdb"]
+    settings = _tmdb_settings(config)
+    timeout = settings.get("timeout", DEFAULT_TIMEOUT)
+    limiter = get_rate_limiter(config)
+
+    for attempt in range(settings.get("max_retries", DEFAULT_MAX_RETRIES) + 1):
+        limiter.acquire()
+        response = get_session(config).get(f"{TMDB_API_URL}{path}", params=query,
+                                           headers=headers, timeout=timeout)
+
+        if response.status_code != 429:
+            break
+
+        # Pausar a todos los procesos durante el tiempo indicado por TMDb
+        limiter.penalize(parse_retry_after(response.headers.get("Retry-After")))
+
+    if response.status_code == 304 and cached is not None:
+        # Sin cambios: renovar la entrada guardada
+        mark_revalidated(path, params)
+        return cached["status"], cached["data"]
+
+    data = response.json() if response.status_code == 200 else None
+
+    if use_cache:
+        store_response(path, params, response.status_code, data, config,
+                       etag=response.headers.get("ETag"),
+                       last_modified=response.headers.get("Last-Modified"))
+
+    return response.status_code, data
+
+def _get_executor(config=None):
+    """Obtiene el pool de hilos del proceso actual para peticiones concurrentes"""
+    global _executor, _executor_pid
+
+    if _executor is None or _executor_pid != os.getpid():
+        workers = _tmdb_settings(config).get("pool_size", DEFAULT_POOL_SIZE)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tmdb")
+        _executor_pid = os.getpid()
+
+    return _executor
+
+async def tmdb_get_async(path, config, params=None, use_cache=True):
+    """
+    Versión asíncrona de tmdb_get
+
+    La petición se ejecuta en un hilo sobre la misma sesión con pool, de modo
+    que varias corutinas pueden tener peticiones en vuelo a la vez sin perder
+    la caché ni la reutilización de conexiones.
+
+    Args:
+        path: Ruta del endpoint (ej. "/search/movie")
+        config: Configuración con la API key
+        params: Diccionario de parámetros de la consulta
+        use_cache: False para ignorar la caché en esta petición
+
+    Returns:
+        (codigo_estado, datos) igual que tmdb_get
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(config), partial(tmdb_get, path, config, params, use_cache)
+    )
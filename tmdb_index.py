@@ -0,0 +1,411 @@
+"""
+Índice local de títulos de TMDb para identificar videos sin consultar la red
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import logging
+import difflib
+from datetime import datetime, timedelta
+from config import TMDB_INDEX_FILE, TEMP_DIR
+from utils import log_print, normalize_title, get_sqlite_connection
+from tmdb_client import get_session
+from tmdb_api import get_movie_details, get_tv_details
+from tmdb_cache import cache_enabled, get_ttl, is_fresh
+from tmdb_ranking import EPISODE_MAX_DURATION
+
+TMDB_EXPORTS_URL = "http://files.tmdb.org/p/exports"
+
+# Similitud mínima para aceptar una coincidencia aproximada
+DEFAULT_MIN_SIMILARITY = 0.92
+
+# Números romanos reconocidos en títulos (secuelas, partes, temporadas)
+ROMAN_NUMERALS = {
+    "i": 1, "ii": 2, "iii": 3, "iv": 4, "v": 5, "vi": 6, "vii": 7, "viii": 8,
+    "ix": 9, "x": 10, "xi": 11, "xii": 12, "xiii": 13
+}
+
+# Popularidad mínima de los títulos importados desde los exports diarios
+DEFAULT_EXPORT_MIN_POPULARITY = 1.0
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS titles (
+        media_type TEXT NOT NULL,
+        tmdb_id INTEGER NOT NULL,
+        title TEXT,
+        year INTEGER,
+        popularity REAL DEFAULT 0,
+        language TEXT,
+        data TEXT,
+        updated REAL NOT NULL,
+        PRIMARY KEY (media_type, tmdb_id)
+    );
+    CREATE TABLE IF NOT EXISTS title_keys (
+        norm_key TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        tmdb_id INTEGER NOT NULL,
+        PRIMARY KEY (norm_key, media_type, tmdb_id)
+    );
+    CREATE TABLE IF NOT EXISTS index_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+def _get_connection(db_file=TMDB_INDEX_FILE):
+    """Obtiene la conexión al índice del hilo y proceso actual"""
+    return get_sqlite_connection(db_file, INDEX_SCHEMA)
+
+def index_enabled(config):
+    """Indica si la búsqueda en el índice local está activada"""
+    return bool(config["processing"].get("local_index", True))
+
+def _year_from_result(result, is_movie):
+    """Extrae el año de estreno de un resultado de TMDb"""
+    date = result.get("release_date" if is_movie else "first_air_date") or ""
+    return int(date[:4]) if date[:4].isdigit() else None
+
+def _add_keys(conn, keys, media_type, tmdb_id):
+    """Registra las claves normalizadas de un título"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO title_keys (norm_key, media_type, tmdb_id) VALUES (?, ?, ?)",
+        [(key, media_type, tmdb_id) for key in keys if key]
+    )
+
+def add_result_to_index(result, is_movie, config, aliases=None, db_file=TMDB_INDEX_FILE):
+    """
+    Añade al índice un resultado ya obtenido de TMDb
+
+    Args:
+        result: Diccionario del resultado (búsqueda o detalles)
+        is_movie: True si es película, False si es serie
+        config: Configuración del sistema
+        aliases: Textos adicionales que deben resolver a este título
+                 (ej. el nombre de archivo limpio que lo encontró)
+        db_file: Ruta al índice
+
+    Returns:
+        True si se añade correctamente, False si hay error
+    """
+    if not result or "id" not in result:
+        return False
+
+    media_type = "movie" if is_movie else "tv"
+    title = result.get("title" if is_movie else "name")
+    original = result.get("original_title" if is_movie else "original_name")
+
+    try:
+        conn = _get_connection(db_file)
+        conn.execute(
+            "INSERT OR REPLACE INTO titles "
+            "(media_type, tmdb_id, title, year, popularity, language, data, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (media_type, result["id"], title, _year_from_result(result, is_movie),
+             result.get("popularity", 0), config["processing"]["output_language"],
+             json.dumps(result, ensure_ascii=False), time.time())
+        )
+        keys = {normalize_title(title), normalize_title(original)}
+        keys.update(normalize_title(alias) for alias in (aliases or []))
+        _add_keys(conn, keys, media_type, result["id"])
+        return True
+    except Exception as e:
+        log_print(f"Error añadiendo título al índice local: {e}", logging.WARNING)
+        return False
+
+def _candidate_keys(name, year):
+    """Genera las variantes normalizadas de un nombre a buscar"""
+    norm = normalize_title(name)
+    keys = [norm]
+
+    # Los nombres de archivo suelen terminar en el año ("Titulo 2019")
+    match = re.match(r'^(.*) ((?:19|20)\d{2})$', norm)
+    if match and (year is None or match.group(2) == str(year)):
+        keys.append(match.group(1))
+
+    return [k for k in keys if k]
+
+def _number_tokens(key):
+    """
+    Devuelve los números de un título normalizado (cifras y romanos)
+
+    Sirven para distinguir secuelas y partes que la similitud de caracteres
+    confunde ("rocky ii" frente a "rocky iii", "part 1" frente a "part 2").
+    """
+    numbers = set()
+    for token in key.split(' '):
+        if token.isdigit():
+            numbers.add(int(token))
+        elif token in ROMAN_NUMERALS:
+            numbers.add(ROMAN_NUMERALS[token])
+    return numbers
+
+def _fetch_rows(conn, key, fuzzy, min_similarity):
+    """Obtiene las filas que corresponden a una clave (exacta o aproximada)"""
+    rows = conn.execute(
+        "SELECT t.media_type, t.tmdb_id, t.year, t.popularity, t.language, t.data, t.updated, k.norm_key "
+        "FROM title_keys k JOIN titles t ON t.media_type = k.media_type AND t.tmdb_id = k.tmdb_id "
+        "WHERE k.norm_key = ?", (key,)
+    ).fetchall()
+
+    if rows or not fuzzy:
+        return [(row, 1.0) for row in rows]
+
+    # Coincidencia aproximada: solo claves con el mismo prefijo (rango del índice)
+    prefix = key.split(' ')[0][:4]
+    rows = conn.execute(
+        "SELECT t.media_type, t.tmdb_id, t.year, t.popularity, t.language, t.data, t.updated, k.norm_key "
+        "FROM title_keys k JOIN titles t ON t.media_type = k.media_type AND t.tmdb_id = k.tmdb_id "
+        "WHERE k.norm_key >= ? AND k.norm_key < ?", (prefix, prefix + "\uffff")
+    ).fetchall()
+
+    numbers = _number_tokens(key)
+    scored = []
+    for row in rows:
+        # Otra secuela u otra parte del mismo título no es una coincidencia
+        if _number_tokens(row[7]) != numbers:
+            continue
+        matcher = difflib.SequenceMatcher(None, key, row[7])
+        # Las cotas rápidas descartan la mayoría de candidatos sin calcular ratio()
+        if matcher.real_quick_ratio() < min_similarity or matcher.quick_ratio() < min_similarity:
+            continue
+        similarity = matcher.ratio()
+        if similarity >= min_similarity:
+            scored.append((row, similarity))
+    return scored
+
+def _media_type_preference(media_type, duration):
+    """
+    Indica si el tipo de un título encaja con la duración del video
+
+    Los videos de duración de episodio prefieren series; el resto (o sin
+    duración) prefiere películas.
+    """
+    if duration and duration <= EPISODE_MAX_DURATION:
+        return media_type == "tv"
+    return media_type == "movie"
+
+def _stored_data_fresh(media_type, tmdb_id, data, updated, config):
+    """Indica si los datos completos guardados en el índice siguen vigentes"""
+    if not cache_enabled(config):
+        return False
+    ttl = get_ttl(f"/{media_type}/{tmdb_id}", 200, data, config)
+    return is_fresh(updated or 0, ttl, config)
+
+def lookup_local_title(name, config, year=None, duration=None, db_file=TMDB_INDEX_FILE):
+    """
+    Busca un título en el índice local
+
+    Args:
+        name: Nombre a buscar (normalmente la salida de clean_filename)
+        config: Configuración del sistema
+        year: Año extraído del nombre de archivo (opcional)
+        duration: Duración del video en segundos (desempata película y serie)
+        db_file: Ruta al índice
+
+    Returns:
+        (resultado, tipo) donde tipo es True para película, False para serie,
+        o (None, None) si no está en el índice
+    """
+    if not name or not os.path.exists(db_file):
+        return None, None
+
+    min_similarity = config["processing"].get("local_index_similarity", DEFAULT_MIN_SIMILARITY)
+    year = int(year) if year else None
+
+    try:
+        conn = _get_connection(db_file)
+        candidates = []
+
+        # Primero coincidencias exactas de todas las variantes, luego aproximadas
+        for fuzzy in (False, True):
+            for key in _candidate_keys(name, year):
+                candidates = _fetch_rows(conn, key, fuzzy, min_similarity)
+                if candidates:
+                    break
+            if candidates:
+                break
+
+        if year is not None:
+            # Descartar títulos de otro año (tolerancia de un año por estrenos tardíos)
+            candidates = [c for c in candidates if c[0][2] is None or abs(c[0][2] - year) <= 1]
+
+        if not candidates:
+            return None, None
+
+        # Mejor similitud; a igualdad, año exacto, tipo acorde a la duración y popularidad
+        def rank(candidate):
+            row, similarity = candidate
+            return (similarity, year is not None and row[2] == year,
+                    _media_type_preference(row[0], duration), row[3] or 0)
+
+        row, similarity = max(candidates, key=rank)
+        media_type, tmdb_id, _, _, language, data, updated, _ = row
+        is_movie = media_type == "movie"
+
+        stored = json.loads(data) if data and language == config["processing"]["output_language"] else None
+        if stored and _stored_data_fresh(media_type, tmdb_id, stored, updated, config):
+            return stored, is_movie
+
+        # Título importado de un export (sin datos completos), en otro idioma,
+        # caducado o pendiente de revalidar (--refresh-cache / --no-cache)
+        details = get_movie_details(tmdb_id, config) if is_movie else get_tv_details(tmdb_id, config)
+        if details:
+            add_result_to_index(details, is_movie, config, db_file=db_file)
+            return details, is_movie
+
+        # Sin red se conservan los datos guardados
+        if stored:
+            return stored, is_movie
+
+        return None, None
+    except Exception as e:
+        log_print(f"Error consultando índice local: {e}", logging.WARNING)
+        return None, None
+
+def ingest_export_file(export_file, media_type, min_popularity=DEFAULT_EXPORT_MIN_POPULARITY, db_file=TMDB_INDEX_FILE):
+    """
+    Importa un archivo de export diario de TMDb (JSON por línea, gzip)
+
+    Solo se actualizan título y popularidad; los datos completos obtenidos
+    previamente de la API se conservan.
+
+    Args:
+        export_file: Ruta al archivo .json.gz
+        media_type: "movie" o "tv"
+        min_popularity: Popularidad mínima para importar un título
+        db_file: Ruta al índice
+
+    Returns:
+        Número de títulos importados
+    """
+    title_key = "original_title" if media_type == "movie" else "original_name"
+    imported = 0
+
+    try:
+        conn = _get_connection(db_file)
+        now = time.time()
+        titles_batch = []
+        keys_batch = []
+
+        def flush():
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO titles (media_type, tmdb_id, title, popularity, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(media_type, tmdb_id) DO UPDATE SET popularity = excluded.popularity",
+                titles_batch
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO title_keys (norm_key, media_type, tmdb_id) VALUES (?, ?, ?)",
+                keys_batch
+            )
+            conn.execute("COMMIT")
+            titles_batch.clear()
+            keys_batch.clear()
+
+        with gzip.open(export_file, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+
+                if item.get("adult") or item.get("video"):
+                    continue
+                if (item.get("popularity") or 0) < min_popularity:
+                    continue
+
+                title = item.get(title_key)
+                norm = normalize_title(title)
+                if not norm:
+                    continue
+
+                titles_batch.append((media_type, item["id"], title, item.get("popularity", 0), now))
+                keys_batch.append((norm, media_type, item["id"]))
+                imported += 1
+
+                if len(titles_batch) >= 5000:
+                    flush()
+
+        if titles_batch:
+            flush()
+
+        log_print(f"Índice local: importados {imported} títulos ({media_type}) desde {export_file}")
+        return imported
+    except Exception as e:
+        log_print(f"Error importando export de TMDb {export_file}: {e}", logging.ERROR)
+        return imported
+
+def download_tmdb_export(media_type, date, dest_dir=TEMP_DIR):
+    """
+    Descarga el export diario de IDs de TMDb para una fecha
+
+    Args:
+        media_type: "movie" o "tv"
+        date: Fecha (datetime) del export
+        dest_dir: Directorio donde guardar el archivo
+
+    Returns:
+        Ruta al archivo descargado o None si hay error
+    """
+    kind = "movie" if media_type == "movie" else "tv_series"
+    filename = f"{kind}_ids_{date.strftime('%m_%d_%Y')}.json.gz"
+    dest_file = os.path.join(dest_dir, filename)
+
+    try:
+        os.makedirs(dest_dir, exist_ok=True)
+        response = get_session().get(f"{TMDB_EXPORTS_URL}/{filename}", stream=True, timeout=60)
+        if response.status_code != 200:
+            log_print(f"No se pudo descargar {filename}: {response.status_code}", logging.WARNING)
+            return None
+
+        with open(dest_file, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        return dest_file
+    except Exception as e:
+        log_print(f"Error descargando export de TMDb: {e}", logging.ERROR)
+        return None
+
+def refresh_index_from_exports(config, force=False, db_file=TMDB_INDEX_FILE):
+    """
+    Actualiza el índice con los exports diarios de TMDb (como máximo una vez al día)
+
+    Args:
+        config: Configuración del sistema
+        force: True para importar aunque ya se haya hecho hoy
+        db_file: Ruta al índice
+
+    Returns:
+        Número de títulos importados
+    """
+    # Los exports se publican durante la mañana (UTC); usar el del día anterior
+    export_date = datetime.utcnow() - timedelta(days=1)
+    date_str = export_date.strftime('%Y-%m-%d')
+    min_popularity = config["processing"].get("local_index_min_popularity", DEFAULT_EXPORT_MIN_POPULARITY)
+
+    conn = _get_connection(db_file)
+    row = conn.execute("SELECT value FROM index_meta WHERE key = 'last_export'").fetchone()
+    if row and row[0] == date_str and not force:
+        log_print(f"Índice local ya actualizado con el export del {date_str}")
+        return 0
+
+    imported = 0
+    for media_type in ("movie", "tv"):
+        export_file = download_tmdb_export(media_type, export_date)
+        if not export_file:
+            continue
+        try:
+            imported += ingest_export_file(export_file, media_type, min_popularity, db_file)
+        finally:
+            try:
+                os.remove(export_file)
+            except OSError:
+                pass
+
+    if imported:
+        conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('last_export', ?)", (date_str,))
+
+    return imported
@@ -0,0 +1,169 @@
+"""
+Puntuación de candidatos de TMDb (título, año, duración y popularidad)
+"""
+
+import math
+import difflib
+from utils import normalize_title
+
+# Peso de cada criterio en la puntuación final (suman 1.0)
+WEIGHTS = {
+    "title": 0.55,
+    "year": 0.20,
+    "duration": 0.10,
+    "popularity": 0.15
+}
+
+# Puntuación mínima para aceptar un candidato
+DEFAULT_MIN_SCORE = 0.4
+
+# Similitud de título mínima: año, duración y popularidad no bastan por sí
+# solos para aceptar un candidato cuyo título no se parece a la búsqueda
+MIN_TITLE_SIMILARITY = 0.5
+
+# Popularidad a partir de la cual se considera máxima
+POPULARITY_CAP = 1000.0
+
+# Duraciones típicas (segundos): episodios cortos frente a largometrajes
+EPISODE_MAX_DURATION = 65 * 60
+MOVIE_MIN_DURATION = 75 * 60
+
+def candidate_titles(candidate, is_series):
+    """Devuelve los títulos (localizado y original) de un candidato"""
+    if is_series:
+        return [candidate.get("name"), candidate.get("original_name")]
+    return [candidate.get("title"), candidate.get("original_title")]
+
+def candidate_year(candidate, is_series):
+    """Devuelve el año de estreno de un candidato o None"""
+    date = candidate.get("first_air_date" if is_series else "release_date") or ""
+    return int(date[:4]) if date[:4].isdigit() else None
+
+def title_similarity(query, titles):
+    """
+    Calcula la similitud entre el texto buscado y los títulos de un candidato
+
+    Combina la similitud de secuencia con la proporción de palabras en
+    común, medida en ambos sentidos (la menor), y devuelve la mejor de todos
+    los títulos. Así un título corto contenido en una frase larga (un cue de
+    subtítulos, una línea de OCR) no puntúa alto.
+
+    Args:
+        query: Texto de búsqueda
+        titles: Lista de títulos del candidato
+
+    Returns:
+        Similitud entre 0.0 y 1.0
+    """
+    norm_query = normalize_title(query)
+    if not norm_query:
+        return 0.0
+
+    query_words = set(norm_query.split())
+    best = 0.0
+
+    for title in titles:
+        norm_title = normalize_title(title)
+        if not norm_title:
+            continue
+
+        sequence = difflib.SequenceMatcher(None, norm_query, norm_title).ratio()
+        title_words = set(norm_title.split())
+        common = len(query_words & title_words)
+        coverage = min(common / len(title_words), common / len(query_words))
+        best = max(best, 0.6 * sequence + 0.4 * coverage)
+
+    return best
+
+def _year_score(candidate, is_series, year):
+    """Puntuación del año (0.5 si no hay información)"""
+    found_year = candidate_year(candidate, is_series)
+    if not year or not found_year:
+        return 0.5
+
+    difference = abs(found_year - int(year))
+    if difference == 0:
+        return 1.0
+    if difference == 1:
+        return 0.6
+    return 0.0
+
+def _duration_score(is_series, duration):
+    """Puntuación de la duración del video frente al tipo de contenido"""
+    if not duration:
+        return 0.5
+    if duration <= EPISODE_MAX_DURATION:
+        return 1.0 if is_series else 0.2
+    if duration >= MOVIE_MIN_DURATION:
+        return 0.2 if is_series else 1.0
+    return 0.5
+
+def _popularity_score(candidate):
+    """Puntuación logarítmica de la popularidad"""
+    popularity = max(0.0, float(candidate.get("popularity") or 0))
+    return min(1.0, math.log1p(popularity) / math.log1p(POPULARITY_CAP))
+
+def score_candidate(candidate, query, is_series, hints=None, titles=None):
+    """
+    Puntúa un candidato de TMDb respecto a la búsqueda
+
+    Args:
+        candidate: Diccionario del resultado de TMDb
+        query: Texto de búsqueda
+        is_series: True si el candidato es una serie
+        hints: Diccionario opcional con "year" y "duration" (segundos) del video
+        titles: Títulos adicionales del candidato (ej. en otros idiomas)
+
+    Returns:
+        Puntuación entre 0.0 y 1.0 (0.0 si el título no se parece lo suficiente)
+    """
+    hints = hints or {}
+    all_titles = candidate_titles(candidate, is_series) + list(titles or [])
+
+    similarity = title_similarity(query, all_titles)
+    if similarity < MIN_TITLE_SIMILARITY:
+        return 0.0
+
+    return (
+        WEIGHTS["title"] * similarity +
+        WEIGHTS["year"] * _year_score(candidate, is_series, hints.get("year")) +
+        WEIGHTS["duration"] * _duration_score(is_series, hints.get("duration")) +
+        WEIGHTS["popularity"] * _popularity_score(candidate)
+    )
+
+def rank_candidates(query, results_by_lang, is_series, hints=None, preferred_lang=None):
+    """
+    Ordena todos los candidatos devueltos en varios idiomas
+
+    Los candidatos repetidos entre idiomas se agrupan por ID, y sus títulos
+    en todos los idiomas cuentan para la similitud.
+
+    Args:
+        query: Texto de búsqueda
+        results_by_lang: Lista de (idioma, lista_de_resultados)
+        is_series: True si son series
+        hints: Diccionario opcional con "year" y "duration" del video
+        preferred_lang: Idioma cuyo resultado se conserva si hay repetidos
+                        (evita pedir los detalles en el idioma de salida)
+
+    Returns:
+        Lista de (puntuación, resultado, idioma) ordenada de mayor a menor
+    """
+    grouped = {}
+
+    for lang, results in results_by_lang:
+        for result in results or []:
+            if "id" not in result:
+                continue
+            entry = grouped.setdefault(result["id"], {"result": result, "lang": lang, "titles": []})
+            if lang == preferred_lang and entry["lang"] != preferred_lang:
+                entry["result"] = result
+                entry["lang"] = lang
+            entry["titles"].extend(candidate_titles(result, is_series))
+
+    ranked = [
+        (score_candidate(entry["result"], query, is_series, hints, entry["titles"]), entry["result"], entry["lang"])
+        for entry in grouped.values()
+    ]
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
@@ -4,10 +4,23 @@ Funciones de utilidad para el sistema VideoSort
 
 import os
 import logging
+import sqlite3
+import hashlib
+import threading
 import subprocess
+import unicodedata
 from datetime import datetime
 import re
 
+# Conexiones SQLite por hilo y proceso (sqlite3 no permite compartirlas)
+_sqlite_local = threading.local()
+
+# Bytes leídos al principio y al final de cada archivo para su huella
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+# Huellas ya calculadas en este proceso: {(ruta, tamaño, mtime): huella}
+_fingerprints = {}
+
 def setup_logging():
     """Configura el sistema de logging"""
     from config import LOGS_DIR
@@ -116,6 +129,32 @@ def clean_filename(filename):
     
     return name
 
+def normalize_title(title):
+    """
+    Normaliza un título para compararlo (minúsculas, sin acentos ni signos)
+    
+    Args:
+        title: Título a normalizar
+        
+    Returns:
+        Título normalizado (palabras separadas por un espacio)
+    """
+    if not title:
+        return ""
+    
+    # Eliminar acentos
+    text = unicodedata.normalize('NFKD', str(title))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    
+    text = text.replace('&', ' and ')
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    # Eliminar artículos al inicio
+    text = re.sub(r'^(el|la|los|las|un|una|unos|unas|the|a|an) ', '', text)
+    
+    return text
+
 def sanitize_filename(filename):
     """Sanitiza un nombre de archivo para que sea válido en el sistema de archivos"""
     # Eliminar caracteres inválidos en nombres de archivo
@@ -146,6 +185,78 @@ def is_valid_video(filepath, config):
             os.path.isfile(filepath) and 
             os.access(filepath, os.R_OK))
 
+def get_sqlite_connection(db_file, schema=None):
+    """
+    Obtiene la conexión SQLite del hilo y proceso actual para un archivo
+    
+    La conexión se crea una vez por hilo (y de nuevo tras un fork), en modo
+    WAL para que varios procesos puedan leer y escribir a la vez.
+    
+    Args:
+        db_file: Ruta a la base de datos
+        schema: Sentencias SQL para crear las tablas si no existen
+        
+    Returns:
+        Objeto sqlite3.Connection en modo autocommit
+    """
+    connections = getattr(_sqlite_local, "connections", None)
+    if connections is None or _sqlite_local.pid != os.getpid():
+        connections = {}
+        _sqlite_local.connections = connections
+        _sqlite_local.pid = os.getpid()
+    
+    conn = connections.get(db_file)
+    if conn is not None:
+        return conn
+    
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if schema:
+        conn.executescript(schema)
+    
+    connections[db_file] = conn
+    return conn
+
+def file_fingerprint(filepath, chunk_size=FINGERPRINT_CHUNK_SIZE):
+    """
+    Calcula una huella barata del contenido de un archivo
+    
+    Se combina el tamaño con el hash del primer y último bloque, de modo que
+    no hace falta leer el archivo completo y la huella se conserva si el
+    archivo se mueve o se renombra.
+    
+    Args:
+        filepath: Ruta al archivo
+        chunk_size: Bytes leídos al principio y al final
+        
+    Returns:
+        String con la huella o None si no se puede leer el archivo
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    
+    memo_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _fingerprints:
+        return _fingerprints[memo_key]
+    
+    try:
+        sha1 = hashlib.sha1(str(stat.st_size).encode("ascii"))
+        with open(filepath, 'rb') as f:
+            sha1.update(f.read(chunk_size))
+            if stat.st_size > chunk_size:
+                f.seek(max(chunk_size, stat.st_size - chunk_size))
+                sha1.update(f.read(chunk_size))
+    except OSError as e:
+        log_print(f"Error calculando huella de {filepath}: {e}", logging.ERROR)
+        return None
+    
+    _fingerprints[memo_key] = sha1.hexdigest()
+    return _fingerprints[memo_key]
+
 def check_dependencies():
     """Verifica dependencias del sistema y módulos opcionales"""
     dependencies = {
@@ -6,7 +6,11 @@ import os
 import subprocess
 import logging
 import re
-from utils import log_print
+import json
+import tempfile
+import numpy as np
+from dataclasses import dataclass, field
+from utils import log_print, file_fingerprint
 
 # Verificar disponibilidad de módulos opcionales
 try:
@@ -23,39 +27,193 @@ except ImportError:
     PYTESSERACT_AVAILABLE = False
     log_print("pytesseract no disponible. Reconocimiento de texto en imágenes desactivado.", logging.WARNING)
 
-def get_video_quality(filepath):
+# Códecs de subtítulos de texto (los de imagen, como PGS o VobSub, no se
+# pueden convertir a SRT)
+TEXT_SUBTITLE_CODECS = {"subrip", "srt", "ass", "ssa", "webvtt", "mov_text", "text",
+                        "microdvd", "subviewer", "subviewer1", "sami", "realtext", "jacosub"}
+
+# Lectura de subtítulos: idiomas preferidos, cues máximos y segundo del
+# video a partir del cual se deja de leer
+DEFAULT_SUBTITLE_LANGUAGES = ["spa", "eng"]
+DEFAULT_SUBTITLE_MAX_CUES = 50
+DEFAULT_SUBTITLE_MAX_SECONDS = 900
+
+# Resultados de probe_video por huella del archivo
+_probes = {}
+
+@dataclass
+class SubtitleTrack:
+    """Pista de subtítulos de un video"""
+    index: int                      # Índice del flujo en el archivo (para -map 0:<index>)
+    codec: str = ""
+    language: str = ""
+    title: str = ""
+    default: bool = False
+    forced: bool = False
+    
+    @property
+    def is_text(self):
+        """True si la pista es de texto (convertible a SRT)"""
+        return self.codec in TEXT_SUBTITLE_CODECS
+
+@dataclass
+class VideoProbe:
+    """Información técnica de un video obtenida con una sola llamada a ffprobe"""
+    duration: float = 0.0
+    width: int = 0
+    height: int = 0
+    video_codec: str = ""
+    audio_codecs: list = field(default_factory=list)
+    audio_languages: list = field(default_factory=list)
+    subtitles: list = field(default_factory=list)
+    bit_rate: int = 0
+    format_name: str = ""
+    
+    @property
+    def resolution(self):
+        """Tupla (ancho, alto) o None si no hay flujo de video"""
+        return (self.width, self.height) if self.width and self.height else None
+    
+    @property
+    def quality(self):
+        """Calidad según la resolución (2160p, 1080p, 720p, 480p, Unknown)"""
+        if not self.height:
+            return "Unknown"
+        if self.height >= 2160:
+            return "2160p"
+        elif self.height >= 1080:
+            return "1080p"
+        elif self.height >= 720:
+            return "720p"
+        return "480p"
+    
+    @property
+    def text_subtitles(self):
+        """Pistas de subtítulos de texto"""
+        return [track for track in self.subtitles if track.is_text]
+
+def _to_number(value, cast=float, default=0):
+    """Convierte un valor de ffprobe (string) a número"""
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return default
+
+def _parse_probe(data):
     """
-    Determina la calidad del video basado en su resolución
+    Convierte la salida JSON de ffprobe en un VideoProbe
+    
+    Args:
+        data: Diccionario con "format" y "streams"
+        
+    Returns:
+        VideoProbe
+    """
+    fmt = data.get("format", {})
+    probe = VideoProbe(
+        duration=_to_number(fmt.get("duration")),
+        bit_rate=_to_number(fmt.get("bit_rate"), int),
+        format_name=fmt.get("format_name", "")
+    )
+    
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        tags = stream.get("tags", {})
+        language = tags.get("language", "")
+        
+        if codec_type == "video" and not probe.video_codec:
+            # Las carátulas incrustadas también son flujos de video
+            if stream.get("disposition", {}).get("attached_pic"):
+                continue
+            probe.video_codec = stream.get("codec_name", "")
+            probe.width = int(stream.get("width") or 0)
+            probe.height = int(stream.get("height") or 0)
+            if not probe.duration:
+                probe.duration = _to_number(stream.get("duration"))
+        elif codec_type == "audio":
+            probe.audio_codecs.append(stream.get("codec_name", ""))
+            probe.audio_languages.append(language)
+        elif codec_type == "subtitle":
+            disposition = stream.get("disposition", {})
+            probe.subtitles.append(SubtitleTrack(
+                index=int(stream.get("index", 0)),
+                codec=stream.get("codec_name", ""),
+                language=language,
+                title=tags.get("title", ""),
+                default=bool(disposition.get("default")),
+                forced=bool(disposition.get("forced"))
+            ))
+    
+    return probe
+
+def restore_probe(filepath, data):
+    """
+    Registra un resultado de probe_video guardado previamente (ver analysis_store)
     
     Args:
         filepath: Ruta al archivo de video
+        data: Diccionario generado con dataclasses.asdict(VideoProbe)
         
     Returns:
-        String con la calidad (2160p, 1080p, 720p, 480p, Unknown)
+        VideoProbe reconstruido
     """
-    if not CV2_AVAILABLE:
-        return "Unknown"
+    data = dict(data)
+    data["subtitles"] = [SubtitleTrack(**track) for track in data.get("subtitles", [])]
+    probe = VideoProbe(**data)
+    
+    fingerprint = file_fingerprint(filepath)
+    if fingerprint is not None:
+        _probes[fingerprint] = probe
+    return probe
+
+def probe_video(filepath):
+    """
+    Obtiene la información técnica de un video (duración, resolución,
+    códecs, pistas de subtítulos e idiomas, bitrate)
+    
+    Se ejecuta ffprobe una sola vez por archivo; el resultado se guarda por
+    huella del contenido y lo reutilizan todas las etapas del análisis.
+    
+    Args:
+        filepath: Ruta al archivo de video
+        
+    Returns:
+        VideoProbe o None si hay error
+    """
+    fingerprint = file_fingerprint(filepath)
+    if fingerprint is not None and fingerprint in _probes:
+        return _probes[fingerprint]
     
     try:
-        cap = cv2.VideoCapture(filepath)
-        if not cap.isOpened():
-            log_print(f"No se pudo abrir el archivo {filepath}", logging.WARNING)
-            return "Unknown"
+        cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", filepath]
         
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        cap.release()
+        result = subprocess.run(cmd, capture_output=True, text=True)
         
-        if height >= 2160:
-            return "2160p"
-        elif height >= 1080:
-            return "1080p"
-        elif height >= 720:
-            return "720p"
-        return "480p"
+        if result.returncode != 0:
+            log_print(f"Error analizando {filepath} con ffprobe: {result.stderr}", logging.ERROR)
+            return None
+        
+        probe = _parse_probe(json.loads(result.stdout or "{}"))
     except Exception as e:
-        log_print(f"Error obteniendo calidad de {filepath}: {e}", logging.ERROR)
-        return "Unknown"
+        log_print(f"Error en probe_video: {e}", logging.ERROR)
+        return None
+    
+    if fingerprint is not None:
+        _probes[fingerprint] = probe
+    return probe
+
+def get_video_quality(filepath):
+    """
+    Determina la calidad del video basado en su resolución
+    
+    Args:
+        filepath: Ruta al archivo de video
+        
+    Returns:
+        String con la calidad (2160p, 1080p, 720p, 480p, Unknown)
+    """
+    probe = probe_video(filepath)
+    return probe.quality if probe else "Unknown"
 
 def get_video_duration(filepath):
     """
@@ -67,125 +225,356 @@ def get_video_duration(filepath):
     Returns:
         Duración en segundos (float) o None si hay error
     """
+    probe = probe_video(filepath)
+    return probe.duration if probe and probe.duration else None
+
+def _parse_srt_time(value):
+    """Convierte un tiempo SRT (00:01:02,500) a segundos"""
+    hours, minutes, seconds = value.strip().replace(",", ".").split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def iter_subtitle_cues(filepath, stream_index):
+    """
+    Lee una pista de subtítulos como SRT desde la salida de ffmpeg, cue a cue
+    
+    No se escribe ningún archivo: ffmpeg envía el SRT por stdout y se
+    analiza a medida que llega. Si se deja de iterar, ffmpeg se detiene.
+    
+    Args:
+        filepath: Ruta al archivo de video
+        stream_index: Índice del flujo de subtítulos en el archivo
+        
+    Yields:
+        Tuplas (inicio, fin, texto) con los tiempos en segundos
+    """
+    cmd = ["ffmpeg", "-v", "error", "-i", filepath, "-map", f"0:{stream_index}", "-f", "srt", "pipe:1"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, encoding="utf-8", errors="ignore")
+    
     try:
-        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", 
-              "-of", "default=noprint_wrappers=1:nokey=1", filepath]
+        start = end = None
+        lines = []
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        for line in process.stdout:
+            line = line.strip()
+            
+            # Línea en blanco: fin del cue actual
+            if not line:
+                if start is not None and lines:
+                    yield start, end, " ".join(lines)
+                start = end = None
+                lines = []
+                continue
+            
+            if "-->" in line:
+                try:
+                    start, end = (_parse_srt_time(part.split()[0]) for part in line.split("-->"))
+                except (ValueError, IndexError):
+                    start = end = None
+                lines = []
+                continue
+            
+            # Número del cue o texto sin tiempos
+            if start is None:
+                continue
+            
+            # Quitar etiquetas de formato (<i>, {\an8}, etc.)
+            text = re.sub(r'<[^>]+>|\{[^}]*\}', '', line).strip()
+            if text:
+                lines.append(text)
         
-        if result.returncode == 0:
-            duration = float(result.stdout.strip())
-            return duration
-        else:
-            log_print(f"Error obteniendo duración: {result.stderr}", logging.ERROR)
-            return None
-    except Exception as e:
-        log_print(f"Error en get_video_duration: {e}", logging.ERROR)
+        if start is not None and lines:
+            yield start, end, " ".join(lines)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+def select_subtitle_track(probe, languages=None):
+    """
+    Elige la pista de subtítulos de texto más adecuada
+    
+    Se prefiere el primer idioma de la lista que tenga pista, y dentro de
+    cada idioma las pistas completas (no forzadas) y las marcadas por defecto.
+    
+    Args:
+        probe: Información del video (ver probe_video)
+        languages: Códigos de idioma por orden de preferencia (ej. ["spa", "eng"])
+        
+    Returns:
+        SubtitleTrack o None si no hay pistas de texto
+    """
+    tracks = probe.text_subtitles if probe else []
+    if not tracks:
         return None
+    
+    # Las pistas forzadas solo traducen fragmentos sueltos
+    tracks = sorted(tracks, key=lambda track: (track.forced, not track.default))
+    
+    for language in languages or []:
+        for track in tracks:
+            if track.language.lower() == language.lower():
+                return track
+    
+    return tracks[0]
 
-def extract_subtitles(filepath, temp_dir):
+def extract_subtitles(filepath, probe=None, languages=None, max_cues=DEFAULT_SUBTITLE_MAX_CUES,
+                      max_seconds=DEFAULT_SUBTITLE_MAX_SECONDS):
     """
-    Extrae subtítulos incrustados del video
+    Extrae el comienzo de los subtítulos incrustados del video
+    
+    Solo se ejecuta si el video tiene una pista de subtítulos de texto, y
+    la lectura se detiene tras `max_cues` cues o al pasar de `max_seconds`.
     
     Args:
         filepath: Ruta al archivo de video
-        temp_dir: Directorio para archivos temporales
+        probe: Información del video (ver probe_video)
+        languages: Códigos de idioma por orden de preferencia
+        max_cues: Número máximo de cues a leer
+        max_seconds: Segundo del video a partir del cual se deja de leer
         
     Returns:
-        Texto de los subtítulos o cadena vacía si no hay subtítulos
+        Texto de los cues separados por una línea en blanco, o cadena vacía
+        si no hay subtítulos
     """
-    subtitles_file = os.path.join(temp_dir, "subtitles.srt")
+    probe = probe or probe_video(filepath)
+    track = select_subtitle_track(probe, languages)
+    
+    # Sin pistas de texto no hay nada que leer (PGS/VobSub son imágenes)
+    if track is None:
+        log_print(f"No se encontraron subtítulos de texto en {filepath}", logging.DEBUG)
+        return ""
     
+    log_print(f"Leyendo subtítulos de la pista {track.index} ({track.language or 'sin idioma'}, {track.codec})",
+              logging.DEBUG)
+    
+    cues = []
     try:
-        subprocess.run([
-            "ffmpeg", "-i", filepath, "-map", "s:0", subtitles_file
-        ], capture_output=True)
-        
-        if not os.path.exists(subtitles_file):
-            log_print(f"No se encontraron subtítulos en {filepath}", logging.DEBUG)
-            return ""
-            
-        with open(subtitles_file, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+        for start, _, text in iter_subtitle_cues(filepath, track.index):
+            if max_seconds and start > max_seconds:
+                break
+            cues.append(text)
+            if max_cues and len(cues) >= max_cues:
+                break
     except Exception as e:
         log_print(f"Error extrayendo subtítulos de {filepath}: {e}", logging.ERROR)
-        return ""
-    finally:
-        if os.path.exists(subtitles_file):
-            try:
-                os.remove(subtitles_file)
-            except Exception:
-                pass
+    
+    return "\n\n".join(cues)
+
+def get_default_timestamps(duration):
+    """
+    Calcula los tiempos predeterminados de los fotogramas a analizar
+    
+    Args:
+        duration: Duración del video en segundos
+        
+    Returns:
+        Lista ordenada de segundos (enteros) dentro del video
+    """
+    if not duration:
+        return []
+    
+    # Para videos cortos (menos de 5 min)
+    if duration < 300:
+        timestamps = [
+            30,                 # Inicio (posible título)
+            duration * 0.25,    # 25%
+            duration * 0.5,     # Mitad
+            duration * 0.75,    # 75%
+            max(0, duration - 60)  # Final (posibles créditos)
+        ]
+    else:
+        timestamps = [
+            30,                  # Inicio
+            120,                 # 2 minutos
+            300,                 # 5 minutos
+            600,                 # 10 minutos
+            duration * 0.25,     # 25%
+            duration * 0.5,      # Mitad
+            duration * 0.75,     # 75%
+            max(0, duration - 300),  # 5 min antes del final
+            max(0, duration - 60)    # 1 min antes del final
+        ]
+    
+    # Filtrar tiempos válidos y eliminar duplicados
+    return sorted(list(set([int(t) for t in timestamps if t < duration])))
 
-def extract_frames(filepath, temp_dir, timestamps=None):
+def get_video_resolution(filepath):
     """
-    Extrae fotogramas específicos del video
+    Obtiene el ancho y alto del primer flujo de video
     
     Args:
         filepath: Ruta al archivo de video
-        temp_dir: Directorio para guardar los fotogramas
-        timestamps: Lista de tiempos (en segundos) para extraer fotogramas. 
-                   Si es None, se usan tiempos predeterminados
+        
+    Returns:
+        Tupla (ancho, alto) o None si hay error
+    """
+    probe = probe_video(filepath)
+    return probe.resolution if probe else None
+
+def _run_rawvideo(filepath, timestamps, width, height):
+    """
+    Decodifica un fotograma por tiempo en un solo proceso de ffmpeg
+    
+    Cada tiempo es una entrada con búsqueda rápida (-ss antes de -i); el
+    primer fotograma de cada una se concatena y sale por stdout como BGR
+    sin comprimir. La salida se lee fotograma a fotograma en un mismo búfer
+    y cada imagen se copia al consumirla, sin acumular toda la salida.
+    
+    Returns:
+        Lista de imágenes (matrices numpy) en el orden recibido de ffmpeg
+    """
+    cmd = ["ffmpeg", "-v", "error"]
+    for t in timestamps:
+        cmd.extend(["-noautorotate", "-ss", str(t), "-i", filepath])
+    
+    filters = [f"[{i}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS[v{i}]" for i in range(len(timestamps))]
+    inputs = "".join(f"[v{i}]" for i in range(len(timestamps)))
+    filters.append(f"{inputs}concat=n={len(timestamps)}:v=1:a=0[out]")
     
+    cmd.extend(["-filter_complex", ";".join(filters), "-map", "[out]",
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"])
+    
+    frame_size = width * height * 3
+    buffer = bytearray(frame_size)
+    view = memoryview(buffer)
+    images = []
+    
+    # stderr va a un temporal para que ffmpeg no se bloquee si escribe mucho
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                filled = 0
+                while filled < frame_size:
+                    read = process.stdout.readinto(view[filled:])
+                    if not read:
+                        break
+                    filled += read
+                if filled < frame_size:
+                    break
+                images.append(np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3).copy())
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+        
+        if process.returncode != 0:
+            stderr.seek(0)
+            log_print(f"ffmpeg no pudo decodificar los fotogramas: "
+                      f"{stderr.read().decode('utf-8', errors='ignore').strip()}", logging.DEBUG)
+    
+    return images
+
+def read_frames(filepath, timestamps=None, duration=None):
+    """
+    Decodifica fotogramas del video directamente en memoria (sin archivos)
+    
+    Args:
+        filepath: Ruta al archivo de video
+        timestamps: Lista de tiempos en segundos (None para los predeterminados)
+        duration: Duración del video si ya se conoce (evita otra llamada a ffprobe)
+        
     Returns:
-        Lista de rutas a los fotogramas extraídos
+        Lista de tuplas (segundo, imagen BGR)
     """
     if not os.path.exists(filepath):
         log_print(f"El archivo {filepath} no existe", logging.ERROR)
         return []
     
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    # Si no se especifican tiempos, calcular automáticamente
     if timestamps is None:
-        duration = get_video_duration(filepath)
-        if not duration:
-            return []
-        
-        # Para videos cortos (menos de 5 min)
-        if duration < 300:
-            timestamps = [
-                30,                 # Inicio (posible título)
-                duration * 0.25,    # 25%
-                duration * 0.5,     # Mitad
-                duration * 0.75,    # 75%
-                max(0, duration - 60)  # Final (posibles créditos)
-            ]
-        else:
-            timestamps = [
-                30,                  # Inicio
-                120,                 # 2 minutos
-                300,                 # 5 minutos
-                600,                 # 10 minutos
-                duration * 0.25,     # 25%
-                duration * 0.5,      # Mitad
-                duration * 0.75,     # 75%
-                max(0, duration - 300),  # 5 min antes del final
-                max(0, duration - 60)    # 1 min antes del final
-            ]
-        
-        # Filtrar tiempos válidos y eliminar duplicados
-        timestamps = sorted(list(set([int(t) for t in timestamps if t < duration])))
-    
-    # Extraer cada fotograma
-    frame_files = []
-    for t in timestamps:
-        frame_file = os.path.join(temp_dir, f"frame_{t}.png")
+        timestamps = get_default_timestamps(duration or get_video_duration(filepath))
+    if not timestamps:
+        return []
+    
+    resolution = get_video_resolution(filepath)
+    if not resolution:
+        return []
+    width, height = resolution
+    
+    try:
+        images = _run_rawvideo(filepath, timestamps, width, height)
+        if len(images) == len(timestamps):
+            return list(zip(timestamps, images))
         
-        try:
-            result = subprocess.run([
-                "ffmpeg", "-i", filepath, "-ss", str(t), "-vframes", "1", frame_file
-            ], capture_output=True)
-            
-            if os.path.exists(frame_file) and os.path.getsize(frame_file) > 0:
-                frame_files.append(frame_file)
+        # Algún tiempo no produjo fotograma: sin saber cuál, se repite uno a uno
+        log_print(f"ffmpeg devolvió {len(images)} de {len(timestamps)} fotogramas; "
+                  f"decodificando por separado", logging.DEBUG)
+        frames = []
+        for t in timestamps:
+            images = _run_rawvideo(filepath, [t], width, height)
+            if images:
+                frames.append((t, images[0]))
             else:
                 log_print(f"No se pudo extraer fotograma en {t}s", logging.WARNING)
-        except Exception as e:
-            log_print(f"Error extrayendo fotograma en {t}s: {e}", logging.ERROR)
+        return frames
+    except Exception as e:
+        log_print(f"Error extrayendo fotogramas de {filepath}: {e}", logging.ERROR)
+        return []
+
+def save_frames(frames, temp_dir):
+    """
+    Guarda fotogramas en memoria como PNG (frame_<segundo>.png)
+    
+    Args:
+        frames: Lista de tuplas (segundo, imagen)
+        temp_dir: Directorio donde guardarlos
+        
+    Returns:
+        Lista de rutas a los fotogramas guardados
+    """
+    if not CV2_AVAILABLE:
+        return []
+    
+    os.makedirs(temp_dir, exist_ok=True)
+    
+    frame_files = []
+    for t, image in frames:
+        frame_file = os.path.join(temp_dir, f"frame_{t}.png")
+        if cv2.imwrite(frame_file, image):
+            frame_files.append(frame_file)
     
     return frame_files
 
+def get_frame_timestamp(frame):
+    """
+    Obtiene el segundo del video de un fotograma
+    
+    Args:
+        frame: Tupla (segundo, imagen) de read_frames o ruta a un fotograma
+               guardado con save_frames (frame_<segundo>.png)
+        
+    Returns:
+        Segundo como float o None si el nombre no sigue el formato
+    """
+    if isinstance(frame, tuple):
+        return float(frame[0])
+    
+    match = re.match(r'frame_(\d+(?:\.\d+)?)\.png$', os.path.basename(frame))
+    return float(match.group(1)) if match else None
+
+def load_frame_image(frame):
+    """
+    Obtiene la imagen BGR de un fotograma
+    
+    Args:
+        frame: Tupla (segundo, imagen) de read_frames o ruta a un archivo
+        
+    Returns:
+        Imagen (matriz numpy) o None si no se puede leer
+    """
+    if isinstance(frame, tuple):
+        return frame[1]
+    return cv2.imread(frame) if CV2_AVAILABLE else None
+
+def get_frame_name(frame):
+    """Devuelve el nombre de archivo de un fotograma (frame_<segundo>.png)"""
+    if isinstance(frame, tuple):
+        return f"frame_{frame[0]}.png"
+    return os.path.basename(frame)
+
 def extract_audio_sample(filepath, temp_dir, start_time=30, duration=10):
     """
     Extrae una muestra de audio del video
@@ -216,12 +605,12 @@ def extract_audio_sample(filepath, temp_dir, start_time=30, duration=10):
         log_print(f"Error extrayendo audio: {e}", logging.ERROR)
         return None
 
-def perform_ocr_on_frames(frame_files):
+def perform_ocr_on_frames(frames):
     """
     Realiza OCR en los fotogramas extraídos
     
     Args:
-        frame_files: Lista de rutas a los fotogramas
+        frames: Lista de fotogramas en memoria (segundo, imagen) o rutas a archivos
         
     Returns:
         Texto extraído de los fotogramas
@@ -231,10 +620,10 @@ def perform_ocr_on_frames(frame_files):
     
     extracted_text = []
     
-    for frame_file in frame_files:
+    for frame in frames:
         try:
-            # Cargar imagen
-            img = cv2.imread(frame_file)
+            # Cargar imagen (si no está ya en memoria)
+            img = load_frame_image(frame)
             if img is None:
                 continue
             
@@ -265,7 +654,7 @@ def perform_ocr_on_frames(frame_files):
                 extracted_text.append(' '.join(useful_lines))
         
         except Exception as e:
-            log_print(f"Error en OCR para {frame_file}: {e}", logging.ERROR)
+            log_print(f"Error en OCR para {get_frame_name(frame)}: {e}", logging.ERROR)
     
     return " ".join(extracted_text)
 
@@ -286,32 +675,40 @@ def analyze_video_content(filepath, temp_dir, config):
         "ocr_text": "",
         "audio_text": "",
         "duration": 0,
-        "quality": "Unknown"
+        "quality": "Unknown",
+        "frames": [],
+        "probe": None
     }
     
     try:
         # Crear directorio temporal si no existe
         os.makedirs(temp_dir, exist_ok=True)
         
-        # Obtener calidad y duración
-        results["quality"] = get_video_quality(filepath)
-        results["duration"] = get_video_duration(filepath) or 0
+        # Una sola llamada a ffprobe para calidad, duración, resolución y pistas
+        probe = probe_video(filepath)
+        results["probe"] = probe
+        if probe:
+            results["quality"] = probe.quality
+            results["duration"] = probe.duration
         
-        # Extraer subtítulos
-        results["subtitles_text"] = extract_subtitles(filepath, temp_dir)
+        # Leer el comienzo de los subtítulos (solo si hay pista de texto)
+        processing = config["processing"]
+        results["subtitles_text"] = extract_subtitles(
+            filepath, probe,
+            languages=processing.get("subtitle_languages", DEFAULT_SUBTITLE_LANGUAGES),
+            max_cues=processing.get("subtitle_max_cues", DEFAULT_SUBTITLE_MAX_CUES),
+            max_seconds=processing.get("subtitle_max_seconds", DEFAULT_SUBTITLE_MAX_SECONDS)
+        )
         
-        # Extraer y analizar fotogramas
-        if config["processing"]["capture_frames"] and CV2_AVAILABLE and PYTESSERACT_AVAILABLE:
-            frame_files = extract_frames(filepath, temp_dir)
-            results["ocr_text"] = perform_ocr_on_frames(frame_files)
+        # Decodificar los fotogramas una sola vez, en memoria, para OCR,
+        # estudios y actores
+        if config["processing"]["capture_frames"] and CV2_AVAILABLE:
+            results["frames"] = read_frames(filepath, duration=results["duration"])
+            results["ocr_text"] = perform_ocr_on_frames(results["frames"])
             
-            # Limpiar fotogramas después de procesar
-            if not config["processing"]["debug"]:
-                for frame_file in frame_files:
-                    try:
-                        os.remove(frame_file)
-                    except:
-                        pass
+            # Guardar los fotogramas como imágenes solo para depuración
+            if config["processing"]["debug"]:
+                save_frames(results["frames"], temp_dir)
         
         # Extraer y analizar audio (sería necesario un módulo para reconocimiento de voz)
         # Esta parte requeriría integración con un servicio como Whisper de OpenAI